@@ -2,12 +2,14 @@ from flask import Flask
 from flask_cors import CORS
 from flask_sqlalchemy import SQLAlchemy
 from flask_compress import Compress
+from flask_migrate import Migrate
 from functools import lru_cache
 from config import Config
 
 db = SQLAlchemy()
+migrate = Migrate()  # schema changes: flask --app app db upgrade (see migrations/)
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, warm_caches=False):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
@@ -19,12 +21,19 @@ def create_app(config_class=Config):
          supports_credentials=True)
     Compress(app)  # Enable GZIP compression
     db.init_app(app)
+    migrate.init_app(app, db)
     
     # Register blueprints (routes will be added here later)
     with app.app_context():
         try:
-            import models  # Create tables if not exist
-            db.create_all()
+            import models
+            if app.config['SQLITE_CREATE_ALL'] and db.engine.dialect.name == 'sqlite':
+                db.create_all()  # dev/test shortcut; other databases get their schema from `flask db upgrade`
+            import search
+            search.ensure_index()
+            if warm_caches:  # servers only; scripts and cron jobs start cold
+                import question_cache
+                question_cache.warm()
         except Exception as e:
             print(f"Warning: Database error: {e}")
         
@@ -34,5 +43,5 @@ def create_app(config_class=Config):
     return app
 
 if __name__ == '__main__':
-    app = create_app()
+    app = create_app(warm_caches=True)
     app.run(debug=True, port=5000, host='0.0.0.0')
@@ -0,0 +1,279 @@
+"""
+Time-based archival of UserAttempt rows into compressed Parquet files.
+
+Attempts older than ARCHIVE_AFTER_DAYS are moved out of MySQL into
+month-partitioned files under ARCHIVE_DIR:
+
+    archive/month=2026-01/part-000000001000-000000001999.parquet
+
+Per-user/per-question totals are kept in the attempt_rollups table so
+nothing that only needs counts has to touch the archive. load_attempts()
+and iter_attempts() merge archived and hot rows for exports and analytics.
+"""
+import os
+import glob
+from datetime import datetime, timedelta, timezone
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from app import db
+from config import Config
+from models import UserAttempt, AttemptRollup
+
+ATTEMPT_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('user_id', pa.string()),
+    ('question_id', pa.int64()),
+    ('is_correct', pa.bool_()),
+    ('time_taken', pa.int32()),
+    ('attempted_at', pa.timestamp('us')),
+])
+
+PENDING_SUFFIX = '.pending'
+
+
+def _archive_dir():
+    return Config.ARCHIVE_DIR
+
+
+def _month_key(dt):
+    return dt.strftime('%Y-%m')
+
+
+def _naive_utc(dt):
+    """DateTime columns are stored without tzinfo; compare in naive UTC."""
+    if dt is not None and dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _rows_to_table(rows):
+    return pa.Table.from_pydict({
+        'id': [r.id for r in rows],
+        'user_id': [r.user_id for r in rows],
+        'question_id': [r.question_id for r in rows],
+        'is_correct': [bool(r.is_correct) for r in rows],
+        'time_taken': [r.time_taken or 0 for r in rows],
+        'attempted_at': [_naive_utc(r.attempted_at) for r in rows],
+    }, schema=ATTEMPT_SCHEMA)
+
+
+def _write_pending(rows):
+    """Write one batch as pending part files (one per month). Returns their paths."""
+    by_month = {}
+    for r in rows:
+        by_month.setdefault(_month_key(r.attempted_at), []).append(r)
+
+    paths = []
+    for month, month_rows in by_month.items():
+        part_dir = os.path.join(_archive_dir(), f'month={month}')
+        os.makedirs(part_dir, exist_ok=True)
+        name = f'part-{month_rows[0].id:012d}-{month_rows[-1].id:012d}.parquet'
+        path = os.path.join(part_dir, name + PENDING_SUFFIX)
+        tmp = path + '.tmp'
+        pq.write_table(_rows_to_table(month_rows), tmp, compression='zstd')
+        os.replace(tmp, path)
+        paths.append(path)
+    return paths
+
+
+def _promote(paths):
+    for path in paths:
+        os.replace(path, path[:-len(PENDING_SUFFIX)])
+
+
+def recover_pending():
+    """
+    Resolve part files left behind by a crashed run.
+    The DB delete is atomic, so a pending file's ids are either all still in
+    user_attempts (commit never happened: discard the file) or all gone
+    (commit happened: promote the file).
+    """
+    promoted = discarded = 0
+    for path in glob.glob(os.path.join(_archive_dir(), 'month=*', '*' + PENDING_SUFFIX)):
+        ids = pq.read_table(path, columns=['id']).column('id').to_pylist()
+        still_hot = UserAttempt.query.filter(UserAttempt.id.in_(ids)).count() if ids else 0
+        if still_hot:
+            os.remove(path)
+            discarded += 1
+        else:
+            _promote([path])
+            promoted += 1
+    return promoted, discarded
+
+
+def _apply_rollups(rows):
+    """Fold a batch of attempts into attempt_rollups (caller commits)."""
+    agg = {}
+    for r in rows:
+        key = (r.user_id, r.question_id)
+        a = agg.get(key)
+        if a is None:
+            a = agg[key] = {'attempts': 0, 'correct': 0, 'total_time': 0,
+                            'first': r.attempted_at, 'last': r.attempted_at}
+        a['attempts'] += 1
+        a['correct'] += 1 if r.is_correct else 0
+        a['total_time'] += r.time_taken or 0
+        a['first'] = min(a['first'], r.attempted_at)
+        a['last'] = max(a['last'], r.attempted_at)
+
+    user_ids = {k[0] for k in agg}
+    question_ids = {k[1] for k in agg}
+    existing = {
+        (ru.user_id, ru.question_id): ru
+        for ru in AttemptRollup.query.filter(
+            AttemptRollup.user_id.in_(user_ids),
+            AttemptRollup.question_id.in_(question_ids)
+        ).all()
+    }
+
+    for key, a in agg.items():
+        ru = existing.get(key)
+        if ru is None:
+            ru = AttemptRollup(user_id=key[0], question_id=key[1], attempts=0, correct=0, total_time=0,
+                               first_attempted_at=a['first'], last_attempted_at=a['last'])
+            db.session.add(ru)
+        ru.attempts += a['attempts']
+        ru.correct += a['correct']
+        ru.total_time += a['total_time']
+        ru.first_attempted_at = min(ru.first_attempted_at or a['first'], a['first'])
+        ru.last_attempted_at = max(ru.last_attempted_at or a['last'], a['last'])
+
+
+def archive_attempts(older_than_days=None, batch_size=5000):
+    """
+    Move attempts older than N days to Parquet, batch by batch.
+    Each batch: write pending files -> update rollups + delete rows in one
+    transaction -> promote files. Safe to re-run after a crash.
+    Must be called inside an app context.
+    """
+    days = older_than_days if older_than_days is not None else Config.ARCHIVE_AFTER_DAYS
+    cutoff = _naive_utc(datetime.now(timezone.utc) - timedelta(days=days))
+
+    recover_pending()
+
+    archived = 0
+    last_id = 0
+    while True:
+        rows = UserAttempt.query.filter(
+            UserAttempt.attempted_at < cutoff,
+            UserAttempt.id > last_id
+        ).order_by(UserAttempt.id).limit(batch_size).all()
+        if not rows:
+            break
+
+        ids = [r.id for r in rows]
+        paths = _write_pending(rows)
+        try:
+            _apply_rollups(rows)
+            UserAttempt.query.filter(UserAttempt.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            for path in paths:
+                os.remove(path)
+            raise
+        _promote(paths)
+
+        archived += len(ids)
+        last_id = ids[-1]
+
+    print(f"Archived {archived} attempts older than {days} days to {_archive_dir()}")
+    return archived
+
+
+# --- READER API ---
+def _archived_files(start=None, end=None):
+    """Committed part files, pruned to the months overlapping [start, end]."""
+    lo = _month_key(start) if start else None
+    hi = _month_key(end) if end else None
+    files = []
+    for part_dir in sorted(glob.glob(os.path.join(_archive_dir(), 'month=*'))):
+        month = os.path.basename(part_dir).split('=', 1)[1]
+        if (lo and month < lo) or (hi and month > hi):
+            continue
+        files.extend(sorted(glob.glob(os.path.join(part_dir, '*.parquet'))))
+    return files
+
+
+def _archive_filter(user_id, start, end):
+    conditions = []
+    if user_id is not None:
+        conditions.append(ds.field('user_id') == user_id)
+    if start is not None:
+        conditions.append(ds.field('attempted_at') >= pa.scalar(start, pa.timestamp('us')))
+    if end is not None:
+        conditions.append(ds.field('attempted_at') < pa.scalar(end, pa.timestamp('us')))
+    expr = None
+    for c in conditions:
+        expr = c if expr is None else expr & c
+    return expr
+
+
+def _hot_query(user_id, start, end):
+    q = UserAttempt.query
+    if user_id is not None:
+        q = q.filter(UserAttempt.user_id == user_id)
+    if start is not None:
+        q = q.filter(UserAttempt.attempted_at >= start)
+    if end is not None:
+        q = q.filter(UserAttempt.attempted_at < end)
+    return q
+
+
+def _archived_dataset(start, end):
+    files = _archived_files(start, end)
+    return ds.dataset(files, schema=ATTEMPT_SCHEMA, format='parquet') if files else None
+
+
+def load_attempts(user_id=None, start=None, end=None):
+    """
+    Return archived + hot attempts as a single pyarrow Table sorted by id.
+    start is inclusive, end exclusive. Rows present in both (left by an
+    interrupted archival run) are taken from the DB.
+    """
+    start, end = _naive_utc(start), _naive_utc(end)
+    hot = _rows_to_table(_hot_query(user_id, start, end).order_by(UserAttempt.id).all())
+
+    dataset = _archived_dataset(start, end)
+    if dataset is None:
+        return hot
+    cold = dataset.to_table(filter=_archive_filter(user_id, start, end))
+    if hot.num_rows:
+        cold = cold.filter(~ds.field('id').isin(hot.column('id')))
+    return pa.concat_tables([cold, hot]).sort_by('id')
+
+
+def iter_attempts(user_id=None, start=None, end=None, batch_size=5000):
+    """Stream archived then hot attempts as dicts, without loading everything."""
+    start, end = _naive_utc(start), _naive_utc(end)
+    hot_q = _hot_query(user_id, start, end)
+    hot_ids = {i for (i,) in hot_q.with_entities(UserAttempt.id)}
+
+    dataset = _archived_dataset(start, end)
+    if dataset is not None:
+        for batch in dataset.to_batches(filter=_archive_filter(user_id, start, end), batch_size=batch_size):
+            for row in batch.to_pylist():
+                if row['id'] not in hot_ids:
+                    yield row
+
+    for r in hot_q.order_by(UserAttempt.id).yield_per(batch_size):
+        yield {
+            'id': r.id,
+            'user_id': r.user_id,
+            'question_id': r.question_id,
+            'is_correct': bool(r.is_correct),
+            'time_taken': r.time_taken or 0,
+            'attempted_at': _naive_utc(r.attempted_at),
+        }
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        archive_attempts(int(sys.argv[1]) if len(sys.argv) > 1 else None)
@@ -0,0 +1,60 @@
+"""
+Login throughput benchmark: logins/second (and per core) with hashing inline
+vs. on the password process pool.
+
+    python bench_logins.py [--users 20] [--logins 200] [--threads 8]
+
+Runs against a throwaway SQLite database, so it needs no MySQL.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def run(workers, users, logins, threads):
+    os.environ['PASSWORD_HASH_WORKERS'] = str(workers)
+    os.environ['PASSWORD_HASH_MAX_PENDING'] = str(max(threads, 1) * 2)
+    db_path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+
+    # Config is read at import time, so each configuration gets a fresh interpreter
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+
+    emails = [f'bench{i}@example.com' for i in range(users)]
+    for email in emails:
+        client.post('/api/v1/auth/register', json={'email': email, 'password': 'bench-password'})
+
+    def login(i):
+        return client.post('/api/v1/auth/login', json={'email': emails[i % users], 'password': 'bench-password'}).status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        codes = list(ex.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+
+    ok = codes.count(200)
+    cores = workers or 1
+    print(f"hash workers={workers:<2} threads={threads:<3} ok={ok:<5} 429={codes.count(429):<5} "
+          f"{ok / elapsed:8.1f} logins/s  {ok / elapsed / cores:8.1f} logins/s/core")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=None, help='run a single configuration')
+    args = parser.parse_args()
+
+    if args.workers is not None:
+        run(args.workers, args.users, args.logins, args.threads)
+    else:
+        import subprocess
+        for workers in sorted({0, 1, 2, os.cpu_count() or 2}):
+            subprocess.run([sys.executable, __file__, '--workers', str(workers), '--users', str(args.users),
+                            '--logins', str(args.logins), '--threads', str(args.threads)], check=True)
@@ -0,0 +1,54 @@
+"""
+Microbenchmark: encode time per practice response at 10/50/100 questions,
+jsonify + to_dict() vs. cached fragments (serializers.questions_response).
+
+    python bench_serialization.py [--rounds 2000]
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from flask import jsonify
+from app import create_app
+from models import Question
+import serializers
+
+
+def make_questions(n):
+    return [
+        Question(
+            id=i + 1, topic='Python', difficulty='intermediate',
+            question_text=f'Question {i}: what does `sorted(d.items(), key=lambda kv: kv[1])` return for a dict of {i} items?',
+            options={'A': 'A list of tuples sorted by value', 'B': 'A dict sorted by key',
+                     'C': 'A generator of keys', 'D': 'A TypeError'},
+            correct_option='A', explanation='sorted() always returns a list.'
+        )
+        for i in range(n)
+    ]
+
+
+def bench(fn, rounds):
+    fn()  # warm up (and fill the fragment cache)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds * 1e6
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+
+    app = create_app()
+    print(f"encoder: {serializers.ENCODER}")
+    print(f"{'questions':>9}  {'jsonify':>12}  {'fragments':>12}  speedup")
+    with app.test_request_context():
+        for n in (10, 50, 100):
+            questions = make_questions(n)
+            serializers.clear()
+            baseline = bench(lambda: jsonify({'questions': [q.to_dict() for q in questions]}).get_data(), args.rounds)
+            cached = bench(lambda: serializers.questions_response(questions).get_data(), args.rounds)
+            print(f"{n:>9}  {baseline:>9.1f} us  {cached:>9.1f} us  {baseline / cached:6.1f}x")
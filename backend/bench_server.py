@@ -0,0 +1,166 @@
+"""
+Server benchmark: sync vs. gthread vs. gevent gunicorn workers under a load
+that is mostly waiting on an upstream API.
+
+    python bench_server.py [--requests 400] [--clients 32] [--workers 2] [--delay 0.2]
+
+Each configuration runs `gunicorn -c gunicorn.conf.py wsgi:app` against a
+throwaway SQLite database. Half the requests create a Stripe checkout
+session, with Stripe pointed (STRIPE_API_BASE) at a local fake that answers
+after --delay seconds, the way a Gemini or Stripe call would. The other half
+are cached GET /dashboard/stats. Reports requests/s and p50/p95 latency per
+route. gevent is skipped if it isn't installed.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_fake_stripe(delay):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            time.sleep(delay)
+            body = json.dumps({'id': 'cs_test_bench', 'object': 'checkout.session',
+                               'url': 'https://checkout.stripe.com/bench'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', free_port()), Handler)
+    server.daemon_threads = True
+    Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def seed(db_url, users):
+    """Create users in the throwaway DB and return a token for each."""
+    os.environ['DATABASE_URL'] = db_url
+    import jwt
+    from app import create_app, db
+    from config import Config
+    from models import User
+
+    app = create_app()
+    with app.app_context():
+        rows = [User(email=f'bench{i}@example.com', password_hash='x') for i in range(users)]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [jwt.encode({'user_id': u.id}, Config.JWT_SECRET_KEY, algorithm='HS256') for u in rows]
+
+
+def call(base, method, path, token):
+    req = urllib.request.Request(base + path, method=method, data=b'{}' if method == 'POST' else None,
+                                 headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=120) as resp:
+            resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError:
+        status = 0
+    return path, status, time.perf_counter() - start
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0
+
+
+def run(worker_class, env, tokens, requests, clients, workers):
+    port = free_port()
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class, WEB_CONCURRENCY=str(workers))
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{port}', 'wsgi:app'],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}/api/v1'
+    try:
+        for _ in range(300):
+            try:
+                urllib.request.urlopen(base + '/health', timeout=1).read()
+                break
+            except OSError:
+                time.sleep(0.1)
+        else:
+            print(f"{worker_class:<8} server did not start")
+            return
+
+        plan = [('POST', '/payments/create-checkout-session') if i % 2 else ('GET', '/dashboard/stats')
+                for i in range(requests)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as ex:
+            results = list(ex.map(lambda i: call(base, *plan[i], tokens[i % len(tokens)]), range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    ok = sum(1 for _, status, _ in results if status == 200)
+    by_path = {}
+    for path, _, seconds in results:
+        by_path.setdefault(path, []).append(seconds)
+    checkout = by_path.get('/payments/create-checkout-session', [])
+    stats = by_path.get('/dashboard/stats', [])
+    per_worker = concurrency_of(worker_class, env)
+    print(f"{worker_class:<8} {workers}x{per_worker:<4} ok={ok:<5} {ok / elapsed:7.1f} req/s  "
+          f"checkout p50={pct(checkout, 0.5):6.0f} p95={pct(checkout, 0.95):6.0f} ms  "
+          f"stats p50={pct(stats, 0.5):6.0f} p95={pct(stats, 0.95):6.0f} ms")
+
+
+def concurrency_of(worker_class, env):
+    if worker_class == 'gthread':
+        return int(env.get('GUNICORN_THREADS') or 8)
+    if worker_class == 'gevent':
+        return int(env.get('GUNICORN_WORKER_CONNECTIONS') or 200)
+    return 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--delay', type=float, default=0.2, help='seconds the fake upstream takes to answer')
+    parser.add_argument('--users', type=int, default=20)
+    args = parser.parse_args()
+
+    db_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    env = dict(os.environ, DATABASE_URL=db_url, PASSWORD_HASH_WORKERS='0',
+               STRIPE_API_BASE=start_fake_stripe(args.delay),
+               GUNICORN_ALLOW_MEMORY_BACKENDS='1')  # neither route under test needs state shared by workers
+    tokens = seed(db_url, args.users)
+
+    classes = ['sync', 'gthread']
+    try:
+        import gevent  # noqa: F401
+        classes.append('gevent')
+    except ImportError:
+        print("gevent not installed: skipping the gevent configuration")
+    print(f"{args.requests} requests from {args.clients} clients, upstream delay {args.delay * 1000:.0f} ms")
+    for worker_class in classes:
+        run(worker_class, env, tokens, args.requests, args.clients, args.workers)
@@ -0,0 +1,377 @@
+"""
+Platform-wide engagement analytics for admins.
+
+The reports cover every user, so instead of ad-hoc SQL the source tables are
+pulled in keyset chunks of ANALYTICS_CHUNK_SIZE rows, only the needed
+columns, into pyarrow/numpy arrays. Each report is then a handful of
+vectorized operations over those arrays:
+
+- retention: weekly signup cohorts x weeks since signup, plus D1/D7/D30
+- topics: per-topic funnel (started, came back on another day, mastered)
+  and churn (users whose last practice was that topic and who then went
+  quiet for ANALYTICS_CHURN_DAYS)
+- streaks: current and longest streak distributions
+
+Results are stored in analytics_reports, one row per report per UTC day, so
+only the first request of the day computes (cron.py precomputes them
+nightly). Retention is measured on DailyLog, whose dates are the user's
+local days; the topic report includes archived attempts (archive.py).
+Deleted users are left out.
+
+    python cohort_analytics.py [retention|topics|streaks]   # recompute and print
+"""
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from flask import Response
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+import archive
+import serializers
+from app import db
+from config import Config
+from models import User, DailyLog, UserAttempt, Question, AnalyticsReport, JobRun
+
+EPOCH = date(1970, 1, 1)  # a Thursday
+RETENTION_WEEKS = 12
+RETENTION_DAYS = (1, 7, 30)
+STREAK_BUCKETS = [(0, '0'), (1, '1'), (2, '2'), (3, '3-6'), (7, '7-13'), (14, '14-29'),
+                  (30, '30-59'), (60, '60-99'), (100, '100+')]  # (lower bound, label)
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+# --- EXTRACTION ---
+def _extract(columns, schema, *filters):
+    """
+    Stream `columns` (the first must be the primary key) in keyset chunks into
+    one pyarrow Table with the given schema.
+    """
+    key = columns[0]
+    conn = db.session.connection()  # Core rows: no ORM result processing per row
+    chunks = []
+    last = None
+    while True:
+        q = select(*columns).order_by(key).limit(Config.ANALYTICS_CHUNK_SIZE)
+        for f in filters:
+            q = q.where(f)
+        if last is not None:
+            q = q.where(key > last)
+        rows = conn.execute(q).fetchall()
+        if not rows:
+            break
+        chunks.append(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for field, values in zip(schema, zip(*rows))], schema=schema))
+        last = rows[-1][0]
+    return pa.concat_tables(chunks) if chunks else schema.empty_table()
+
+
+def _days(arr):
+    """date32 or timestamp array -> int32 days since 1970-01-01."""
+    if pa.types.is_timestamp(arr.type):
+        arr = pc.cast(arr, pa.date32())
+    return pc.cast(arr, pa.int32())
+
+
+def _numpy(arr, fill):
+    return pc.fill_null(arr, fill).to_numpy(zero_copy_only=False)
+
+
+def _load_users(today):
+    t = _extract(
+        [User.id, User.created_at, User.current_streak, User.longest_streak],
+        pa.schema([('id', pa.string()), ('created_at', pa.timestamp('us')),
+                   ('current_streak', pa.int32()), ('longest_streak', pa.int32())]),
+        User.deleted_at.is_(None),
+    )
+    return {
+        'ids': t['id'],
+        'signup': _numpy(_days(t['created_at']), today),
+        'current_streak': _numpy(t['current_streak'], 0),
+        'longest_streak': _numpy(t['longest_streak'], 0),
+        'rows': t.num_rows,
+    }
+
+
+def _user_index(users, user_ids):
+    """Position of each user id in users['ids'], -1 for users left out (deleted)."""
+    return _numpy(pc.index_in(user_ids, value_set=users['ids']), -1)
+
+
+def _load_logs(users):
+    t = _extract(
+        [DailyLog.id, DailyLog.user_id, DailyLog.date, DailyLog.questions_attempted],
+        pa.schema([('id', pa.int64()), ('user_id', pa.string()), ('date', pa.date32()),
+                   ('questions_attempted', pa.int32())]),
+    )
+    return {
+        'user': _user_index(users, t['user_id']),
+        'day': _numpy(_days(t['date']), 0),
+        'active': _numpy(t['questions_attempted'], 0) > 0,
+        'rows': t.num_rows,
+    }
+
+
+def _load_attempts(users):
+    schema = pa.schema([('id', pa.int64()), ('user_id', pa.string()), ('question_id', pa.int64()),
+                        ('is_correct', pa.bool_()), ('attempted_at', pa.timestamp('us'))])
+    hot = _extract([UserAttempt.id, UserAttempt.user_id, UserAttempt.question_id,
+                    UserAttempt.is_correct, UserAttempt.attempted_at], schema)
+    tables = [hot]
+    dataset = archive._archived_dataset(None, None)
+    if dataset is not None:
+        for batch in dataset.to_batches(columns=schema.names, batch_size=Config.ANALYTICS_CHUNK_SIZE):
+            cold = pa.Table.from_batches([batch]).cast(schema)
+            if hot.num_rows:
+                # Left behind by an interrupted archival run; the DB copy wins
+                cold = cold.filter(pc.invert(pc.is_in(cold['id'], value_set=hot['id'])))
+            tables.append(cold)
+    t = pa.concat_tables(tables)
+    questions = _extract([Question.id, Question.topic], pa.schema([('id', pa.int64()), ('topic', pa.string())]))
+    return {
+        'user': _user_index(users, t['user_id']),
+        'question': _numpy(t['question_id'], 0),
+        'correct': _numpy(t['is_correct'], False),
+        'day': _numpy(_days(t['attempted_at']), 0),
+        'ts': _numpy(pc.cast(t['attempted_at'], pa.int64()), 0),
+        'question_ids': _numpy(questions['id'], 0),
+        'question_topics': _numpy(questions['topic'], ''),
+        'rows': t.num_rows + questions.num_rows,
+    }
+
+
+# --- REPORTS ---
+def _pct(part, whole):
+    return round(100.0 * float(part) / float(whole), 1) if whole else None
+
+
+def retention_report(users, logs, today):
+    signup = users['signup']
+    monday = signup - (signup + 3) % 7  # day 0 was a Thursday
+    cohorts, cohort_of = np.unique(monday, return_inverse=True)
+    n_cohorts = len(cohorts)
+    sizes = np.bincount(cohort_of, minlength=n_cohorts)
+
+    keep = (logs['user'] >= 0) & logs['active']
+    user, day = logs['user'][keep], logs['day'][keep]
+    offset = day - signup[user]
+    keep = offset >= 0
+    user, offset = user[keep], offset[keep]
+
+    # Distinct (user, week) pairs -> active users per (cohort, week)
+    week = offset // 7
+    in_range = week < RETENTION_WEEKS
+    pairs = np.unique(user[in_range].astype(np.int64) * RETENTION_WEEKS + week[in_range])
+    cells = cohort_of[pairs // RETENTION_WEEKS] * RETENTION_WEEKS + pairs % RETENTION_WEEKS
+    active = np.bincount(cells, minlength=n_cohorts * RETENTION_WEEKS).reshape(n_cohorts, RETENTION_WEEKS)
+    # Reported once the week has passed for the cohort's last signup day too
+    observed = cohorts[:, None] + 7 * np.arange(RETENTION_WEEKS)[None, :] + 13 <= today
+
+    day_n = {}
+    for n in RETENTION_DAYS:
+        eligible = signup + n < today
+        hit = np.unique(user[offset == n])
+        hit = hit[eligible[hit]]
+        day_n[n] = (np.bincount(cohort_of[hit], minlength=n_cohorts),
+                    np.bincount(cohort_of[eligible], minlength=n_cohorts))
+
+    rows = []
+    for c in range(n_cohorts):
+        row = {
+            'cohort': (EPOCH + timedelta(days=int(cohorts[c]))).isoformat(),
+            'users': int(sizes[c]),
+            'weeks': [_pct(int(active[c, w]), int(sizes[c])) if observed[c, w] else None
+                      for w in range(RETENTION_WEEKS)],
+        }
+        for n, (hits, eligible) in day_n.items():
+            row[f'd{n}'] = _pct(int(hits[c]), int(eligible[c]))
+        rows.append(row)
+    overall = {f'd{n}': _pct(int(hits.sum()), int(eligible.sum())) for n, (hits, eligible) in day_n.items()}
+    return {'weeks': RETENTION_WEEKS, 'cohorts': rows, 'overall': overall}
+
+
+def topic_report(users, attempts, today):
+    # question id -> topic code
+    topics, topic_code = np.unique(attempts['question_topics'], return_inverse=True)
+    n_topics = len(topics)
+    lookup = np.full(int(attempts['question_ids'].max(initial=0)) + 1, -1, dtype=np.int64)
+    lookup[attempts['question_ids']] = topic_code
+
+    question = attempts['question']
+    topic = np.where(question < len(lookup), lookup[np.minimum(question, len(lookup) - 1)], -1)
+    keep = (attempts['user'] >= 0) & (topic >= 0)
+    user = attempts['user'][keep].astype(np.int64)
+    topic, correct = topic[keep], attempts['correct'][keep]
+    day, ts = attempts['day'][keep], attempts['ts'][keep]
+
+    n_attempts = np.bincount(topic, minlength=n_topics)
+    n_correct = np.bincount(topic, weights=correct, minlength=n_topics)
+
+    # Funnel over distinct (user, topic) pairs
+    pairs, pair_of = np.unique(user * n_topics + topic, return_inverse=True)
+    pair_topic = pairs % n_topics
+    started = np.bincount(pair_topic, minlength=n_topics)
+    pair_correct = np.bincount(pair_of, weights=correct, minlength=len(pairs))
+    mastered = np.bincount(pair_topic[pair_correct >= Config.SKILL_MASTERY_CORRECT], minlength=n_topics)
+    span = int(day.max(initial=0)) - int(day.min(initial=0)) + 1
+    pair_days = np.unique(pair_of.astype(np.int64) * span + (day - day.min(initial=0)))
+    days_per_pair = np.bincount(pair_days // span, minlength=len(pairs))
+    returned = np.bincount(pair_topic[days_per_pair >= 2], minlength=n_topics)
+
+    # Churn: each user's last attempt, by time
+    order = np.lexsort((ts, user))
+    last = order[np.r_[user[order][1:] != user[order][:-1], True]] if len(order) else order
+    last_topic = topic[last]
+    churned = day[last] < today - Config.ANALYTICS_CHURN_DAYS
+    ended = np.bincount(last_topic, minlength=n_topics)
+    churned_after = np.bincount(last_topic[churned], minlength=n_topics)
+
+    rows = [{
+        'topic': str(topics[t]),
+        'attempts': int(n_attempts[t]),
+        'accuracy': _pct(n_correct[t], n_attempts[t]),
+        'started': int(started[t]),
+        'returned': int(returned[t]),
+        'mastered': int(mastered[t]),
+        'returned_pct': _pct(int(returned[t]), int(started[t])),
+        'mastered_pct': _pct(int(mastered[t]), int(started[t])),
+        'last_topic_users': int(ended[t]),
+        'churned': int(churned_after[t]),
+        'churn_pct': _pct(int(churned_after[t]), int(ended[t])),
+    } for t in range(n_topics) if n_attempts[t]]
+    rows.sort(key=lambda r: r['started'], reverse=True)
+    return {'churn_days': Config.ANALYTICS_CHURN_DAYS, 'mastery_correct': Config.SKILL_MASTERY_CORRECT,
+            'topics': rows}
+
+
+def _distribution(values):
+    bounds = np.array([b for b, _ in STREAK_BUCKETS])
+    counts = np.bincount(np.searchsorted(bounds, values, side='right') - 1, minlength=len(bounds))
+    p50, p90, p99 = np.percentile(values, [50, 90, 99]) if len(values) else (0, 0, 0)
+    return {
+        'buckets': [{'streak': label, 'users': int(n)} for (_, label), n in zip(STREAK_BUCKETS, counts)],
+        'mean': round(float(values.mean()), 2) if len(values) else 0,
+        'p50': round(float(p50), 2), 'p90': round(float(p90), 2), 'p99': round(float(p99), 2),
+        'max': int(values.max(initial=0)),
+    }
+
+
+def streak_report(users, today):
+    current, longest = users['current_streak'], users['longest_streak']
+    return {
+        'users': int(len(current)),
+        'on_streak_pct': _pct(int((current > 0).sum()), len(current)),
+        'week_plus_pct': _pct(int((current >= 7).sum()), len(current)),
+        'current': _distribution(current),
+        'longest': _distribution(longest),
+    }
+
+
+def compute(name, day):
+    """Run one report over the whole platform. Returns (data, rows scanned)."""
+    today = (day - EPOCH).days
+    users = _load_users(today)
+    if name == 'retention':
+        logs = _load_logs(users)
+        return retention_report(users, logs, today), users['rows'] + logs['rows']
+    if name == 'topics':
+        attempts = _load_attempts(users)
+        return topic_report(users, attempts, today), users['rows'] + attempts['rows']
+    return streak_report(users, today), users['rows']
+
+
+REPORTS = ('retention', 'topics', 'streaks')
+
+
+# --- DAILY CACHE ---
+def _lock_for(name):
+    with _locks_guard:
+        return _locks.setdefault(name, threading.Lock())
+
+
+def _store(name, day, data, rows, duration_ms):
+    report = AnalyticsReport.query.filter_by(name=name, day=day).first()
+    if report is None:
+        report = AnalyticsReport(name=name, day=day)
+        db.session.add(report)
+    report.payload = serializers.dumps(data).decode('utf-8')
+    report.rows_scanned = rows
+    report.duration_ms = duration_ms
+    report.created_at = datetime.now(timezone.utc)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker stored the same day first; theirs is as good
+        db.session.rollback()
+        report = AnalyticsReport.query.filter_by(name=name, day=day).first()
+    return report
+
+
+def get_report(name, refresh=False, day=None):
+    """Today's AnalyticsReport for `name`, computed on the first request of the UTC day."""
+    day = day or datetime.now(timezone.utc).date()
+    if not refresh:
+        report = AnalyticsReport.query.filter_by(name=name, day=day).first()
+        if report:
+            return report
+    with _lock_for(name):
+        db.session.commit()  # end the read snapshot so a report stored while we waited is visible
+        if not refresh:
+            report = AnalyticsReport.query.filter_by(name=name, day=day).first()
+            if report:
+                return report
+        started = time.perf_counter()
+        data, rows = compute(name, day)
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        print(f"Analytics report {name} for {day}: {rows} rows in {duration_ms} ms")
+        return _store(name, day, data, rows, duration_ms)
+
+
+def report_response(report):
+    """The stored payload goes out as-is, without decoding and re-encoding it."""
+    meta = serializers.dumps(report.to_dict())
+    body = meta[:-1] + b',"data":' + report.payload.encode('utf-8') + b'}'
+    return Response(body, status=200, mimetype='application/json')
+
+
+def precompute_reports(day=None):
+    """Nightly job: compute every report for the day so admins never wait. Records a JobRun."""
+    run = JobRun(job_name='analytics_reports', status='running')
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    rows = 0
+    try:
+        for name in REPORTS:
+            rows += get_report(name, refresh=True, day=day).rows_scanned or 0
+        run.status = 'success'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        raise
+    finally:
+        run.rows_examined = rows
+        run.rows_affected = len(REPORTS) if run.status == 'success' else 0
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.now(timezone.utc)
+        db.session.add(run)
+        db.session.commit()
+    return run
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        for name in sys.argv[1:] or REPORTS:
+            print(get_report(name, refresh=True).payload)
@@ -5,6 +5,13 @@ import smtplib
 from email.message import EmailMessage
 from app import create_app, db
 from models import User, DailyLog
+from archive import archive_attempts
+from streaks import local_today, rollover_streaks
+from sprint_packs import build_upcoming_packs
+from deletions import purge_deleted
+from cohort_analytics import precompute_reports
+from streak_segments import verify_streaks
+import learning_events
 
 # Create the scheduler
 scheduler = BlockingScheduler()
@@ -29,10 +36,7 @@ def check_daily_habits():
     # We must run this within a Flask application context to access the database
     app = create_app()
     with app.app_context():
-        # Find time relative to right now. In a real app, this runs at specific local times per user.
-        today = datetime.now(timezone.utc).date()
-        
-        users = User.query.all()
+        users = User.query.filter_by(deleted_at=None).all()
         for user in users:
             # Skip users with no goals set
             if not user.goals:
@@ -40,16 +44,80 @@ def check_daily_habits():
                 
             active_topic = user.goals[0].topic
             
-            # Did they practice today?
+            # Did they practice today (in their own timezone)?
+            today = local_today(user.timezone)
             log = DailyLog.query.filter_by(user_id=user.id, date=today).first()
             if not log or not log.streak_maintained:
                 # User hasn't maintained streak today, send reminder!
                 send_reminder_email(user.email, user.current_streak, active_topic)
 
+def archive_old_attempts():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Archiving old attempts...")
+    app = create_app()
+    with app.app_context():
+        archive_attempts()
+
+def run_streak_rollover():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Rolling over missed streaks...")
+    app = create_app()
+    with app.app_context():
+        rollover_streaks()
+
+def build_sprint_packs():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Building upcoming sprint packs...")
+    app = create_app()
+    with app.app_context():
+        build_upcoming_packs()
+
+def run_purge_deleted():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Purging deleted users, habits and skills...")
+    app = create_app()
+    with app.app_context():
+        purge_deleted()
+
+def run_analytics_reports():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Precomputing platform analytics reports...")
+    app = create_app()
+    with app.app_context():
+        precompute_reports()
+
+def run_streak_verify():
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Verifying streak counters against streak segments...")
+    app = create_app()
+    with app.app_context():
+        verify_streaks(fix=True)
+
+def run_learning_events():
+    app = create_app()
+    with app.app_context():
+        for name in learning_events.CONSUMERS:
+            try:
+                n = learning_events.drain(name)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Learning event consumer {name} failed, will retry: {e}")
+                continue
+            if n:
+                print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {name}: applied {n} learning events")
+
 # Schedule the job to run every day at 6:00 PM (18:00)
 # For the sake of this testing environment, we'll configure it to run every 1 minute if you uncomment the second line
 scheduler.add_job(check_daily_habits, 'cron', hour=18, minute=0)
 # scheduler.add_job(check_daily_habits, 'interval', minutes=1)
+# Move old attempts to the Parquet archive during off-peak hours
+scheduler.add_job(archive_old_attempts, 'cron', hour=3, minute=0)
+# Hourly, so every timezone's streaks roll over shortly after its local midnight
+scheduler.add_job(run_streak_rollover, 'cron', minute=5)
+# Hourly, so each timezone's packs for tomorrow are built during its evening and night
+scheduler.add_job(build_sprint_packs, 'cron', minute=20)
+# Hourly safety net for purges a restart interrupted; deletes normally finish right after the request
+scheduler.add_job(run_purge_deleted, 'cron', minute=40)
+# Shortly after midnight UTC, when the daily report cache rolls over
+scheduler.add_job(run_analytics_reports, 'cron', hour=0, minute=15, timezone='UTC')
+# Daily audit of current/longest streaks, clear of the hourly rollover at :05
+scheduler.add_job(run_streak_verify, 'cron', hour=4, minute=30)
+# Skill progress and question stats follow the learning event log; `python learning_events.py` polls every second instead
+scheduler.add_job(run_learning_events, 'interval', seconds=30, max_instances=1, coalesce=True)
 
 if __name__ == '__main__':
     print("SkillSprint Cron Job Scheduler Started. Press Ctrl+C to exit.")
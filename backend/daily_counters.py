@@ -0,0 +1,106 @@
+"""
+Atomic DailyLog counters.
+
+submit_practice used to read the day's DailyLog, create it if missing and
+increment it in Python, so two concurrent submits could create duplicate
+rows or lose an increment. Here the increment is a single upsert against the
+unique (user_id, date) key, and the "goal newly met" transition is a
+compare-and-set UPDATE, so exactly one submit per day bumps the streak.
+The caller commits.
+"""
+from sqlalchemy import update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from models import DailyLog, User
+
+
+def _upsert_returning_totals(user_id, day, attempted, correct):
+    """INSERT ... ON CONFLICT/DUPLICATE KEY that adds to the counters. Returns the new row values."""
+    dialect = db.session.get_bind().dialect.name
+    values = dict(user_id=user_id, date=day, questions_attempted=attempted,
+                  questions_correct=correct, streak_maintained=False)
+    columns = (DailyLog.questions_attempted, DailyLog.questions_correct, DailyLog.streak_maintained)
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(DailyLog).values(**values)
+        stmt = stmt.on_duplicate_key_update(
+            questions_attempted=DailyLog.questions_attempted + stmt.inserted.questions_attempted,
+            questions_correct=DailyLog.questions_correct + stmt.inserted.questions_correct,
+        )
+        db.session.execute(stmt)
+        # No RETURNING on MySQL; the row is locked by our upsert until commit
+        return db.session.execute(
+            db.select(*columns).where(DailyLog.user_id == user_id, DailyLog.date == day)
+        ).one()
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(DailyLog).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date'],
+            set_={
+                'questions_attempted': DailyLog.questions_attempted + stmt.excluded.questions_attempted,
+                'questions_correct': DailyLog.questions_correct + stmt.excluded.questions_correct,
+            }
+        ).returning(*columns)
+        return db.session.execute(stmt).one()
+
+    # Other dialects: lock the row and increment in place
+    log = DailyLog.query.filter_by(user_id=user_id, date=day).with_for_update().first()
+    if not log:
+        log = DailyLog(**values)
+        db.session.add(log)
+    else:
+        log.questions_attempted += attempted
+        log.questions_correct += correct
+    db.session.flush()
+    return log.questions_attempted, log.questions_correct, log.streak_maintained
+
+
+def record_daily_progress(user_id, day, attempted, correct, target):
+    """
+    Add a submission to the user's DailyLog for `day`.
+    Returns dict(questions_attempted, questions_correct, streak_maintained,
+    newly_maintained) where newly_maintained is True for exactly one call per
+    day: the one that first reached `target`.
+    """
+    total_attempted, total_correct, maintained = _upsert_returning_totals(user_id, day, attempted, correct)
+
+    newly_maintained = False
+    if not maintained and total_attempted >= target:
+        # Compare-and-set: of concurrent submits crossing the target, only one sees rowcount 1
+        result = db.session.execute(
+            update(DailyLog)
+            .where(DailyLog.user_id == user_id, DailyLog.date == day,
+                   DailyLog.streak_maintained == False,
+                   DailyLog.questions_attempted >= target)
+            .values(streak_maintained=True)
+            .execution_options(synchronize_session=False)
+        )
+        newly_maintained = result.rowcount == 1
+        maintained = True  # if not us, a concurrent submit just set it
+
+    return {
+        'questions_attempted': total_attempted,
+        'questions_correct': total_correct,
+        'streak_maintained': bool(maintained),
+        'newly_maintained': newly_maintained,
+    }
+
+
+def increment_streak(user_id):
+    """current_streak += 1 and raise longest_streak if needed, in one statement."""
+    # longest_streak is assigned first: MySQL evaluates SET left to right with updated values
+    db.session.execute(
+        update(User)
+        .where(User.id == user_id)
+        .ordered_values(
+            (User.longest_streak, db.case(
+                (User.current_streak + 1 > User.longest_streak, User.current_streak + 1),
+                else_=User.longest_streak
+            )),
+            (User.current_streak, User.current_streak + 1),
+        )
+        .execution_options(synchronize_session=False)
+    )
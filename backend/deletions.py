@@ -0,0 +1,158 @@
+"""
+Deferred deletion of users, habits and skills.
+
+The DELETE routes only stamp deleted_at on the parent row and return; every
+read path filters marked rows out. The rows that hang off the parent are then
+removed in the background, DELETE_CHUNK_SIZE rows per transaction, each
+chunk read off the foreign-key index and deleted by primary key:
+
+    SELECT id FROM habit_logs WHERE habit_id = ? LIMIT 1000
+    DELETE FROM habit_logs WHERE id IN (...)
+
+so a large account never holds one long transaction or loads its children
+into the session. There is no ORDER BY id: most foreign-key indexes are
+composite, so it would sort the parent's remaining rows on every chunk.
+The parent row goes last.
+
+Purging is idempotent: the hourly purge_deleted() sweep finishes anything a
+restart interrupted, and also picks up rows written after the mark (e.g. a
+submit that raced a skill delete).
+
+Archived attempts (archive.py) are not touched.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app import db
+from config import Config
+from models import (User, UserGoal, DailyLog, Habit, HabitLog, Skill, Topic, UserSkillProgress,
+                    UserTopicMastery, UserAttempt, AttemptRollup, SprintPack, LearningEvent, StreakSegment,
+                    JobRun)
+
+# Child tables of a user, in delete order (habit_logs before habits)
+USER_CHILDREN = [
+    HabitLog, Habit, UserTopicMastery, UserSkillProgress, UserAttempt, AttemptRollup,
+    SprintPack, DailyLog, StreakSegment, UserGoal, LearningEvent,
+]
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge')
+
+
+def _delete_in_chunks(model, column, value, chunk_size=None):
+    """Delete every `model` row with column == value, chunk_size primary keys per transaction."""
+    chunk_size = chunk_size or Config.DELETE_CHUNK_SIZE
+    pause = Config.DELETE_CHUNK_PAUSE_MS / 1000
+    deleted = 0
+    while True:
+        ids = [i for (i,) in db.session.query(model.id).filter(column == value).limit(chunk_size)]
+        if not ids:
+            return deleted
+        deleted += model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        if pause and len(ids) == chunk_size:
+            time.sleep(pause)  # let replicas and other writers catch up
+
+
+def purge_habit(habit_id, chunk_size=None):
+    """Remove a marked habit and its logs. Returns rows deleted."""
+    deleted = _delete_in_chunks(HabitLog, HabitLog.habit_id, habit_id, chunk_size)
+    deleted += Habit.query.filter(Habit.id == habit_id, Habit.deleted_at.isnot(None)) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def purge_skill(skill_id, chunk_size=None):
+    """Remove a marked skill, its topics and every user's progress on it. Returns rows deleted."""
+    deleted = 0
+    # By topic: user_topic_mastery is indexed on topic_id, not skill_id
+    for (topic_id,) in db.session.query(Topic.id).filter_by(skill_id=skill_id).all():
+        deleted += _delete_in_chunks(UserTopicMastery, UserTopicMastery.topic_id, topic_id, chunk_size)
+    deleted += _delete_in_chunks(UserSkillProgress, UserSkillProgress.skill_id, skill_id, chunk_size)
+    deleted += _delete_in_chunks(Topic, Topic.skill_id, skill_id, chunk_size)
+    deleted += Skill.query.filter(Skill.id == skill_id, Skill.deleted_at.isnot(None)) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def purge_user(user_id, chunk_size=None):
+    """Remove a marked user and everything they own. Returns rows deleted."""
+    deleted = 0
+    for model in USER_CHILDREN:
+        deleted += _delete_in_chunks(model, model.user_id, user_id, chunk_size)
+    deleted += User.query.filter(User.id == user_id, User.deleted_at.isnot(None)) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+PURGERS = {'user': purge_user, 'habit': purge_habit, 'skill': purge_skill}
+
+
+# --- MARKING ---
+def _mark(obj):
+    obj.deleted_at = datetime.now(timezone.utc)
+    db.session.commit()
+
+
+def _run_purge(app, kind, key):
+    with app.app_context():
+        try:
+            PURGERS[kind](key)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Purge of {kind} {key} failed, purge_deleted() will retry: {e}")
+        finally:
+            db.session.remove()
+
+
+def delete_later(app, obj, kind):
+    """Mark obj (a User, Habit or Skill) deleted and queue its purge. Returns at once."""
+    _mark(obj)
+    _executor.submit(_run_purge, app, kind, obj.id)
+
+
+# --- SWEEP ---
+def purge_deleted(chunk_size=None, now=None):
+    """
+    Hourly job: purge every row still marked deleted, e.g. because the process
+    that marked it restarted before its background purge finished. Records a JobRun.
+    Must be called inside an app context.
+    """
+    now = now or datetime.now(timezone.utc)
+    run = JobRun(job_name='purge_deleted', started_at=now, status='running')
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    examined = deleted = 0
+    try:
+        for kind, model in (('habit', Habit), ('skill', Skill), ('user', User)):
+            for (key,) in db.session.query(model.id).filter(model.deleted_at.isnot(None)).all():
+                examined += 1
+                deleted += PURGERS[kind](key, chunk_size)
+        run.status = 'success'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        raise
+    finally:
+        run.rows_examined = examined
+        run.rows_affected = deleted
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.now(timezone.utc)
+        db.session.add(run)
+        db.session.commit()
+        print(f"Purge: {examined} marked parents, {deleted} rows deleted in {run.duration_ms} ms")
+    return run
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        purge_deleted()
@@ -0,0 +1,239 @@
+"""
+Query-plan regression check for the API routes.
+
+Seeds a scratch database from the models, calls every route with the test
+client and records each SQL statement the routes issue. It then runs EXPLAIN
+on every distinct statement and reports full table scans and sorts that
+don't use an index (filesorts). Exits 1 if it finds any that are not in
+ALLOWED, so it can gate CI.
+
+    python explain_check.py                      # throwaway SQLite file
+    python explain_check.py mysql+pymysql://...  # a scratch MySQL database (it writes data!)
+
+Run it after adding a route or changing a query; fix the finding with an
+index in models.py plus a migration (flask --app app db revision), or add
+it to ALLOWED with the reason.
+"""
+import os
+import re
+import sys
+import tempfile
+
+if __name__ == '__main__':
+    # Must be set before config.py is imported
+    os.environ['DATABASE_URL'] = sys.argv[1] if len(sys.argv) > 1 else \
+        'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain_check.db')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ['GEMINI_API_KEY'] = ''
+    os.environ['STRIPE_WEBHOOK_SECRET'] = ''
+    os.environ['ADMIN_EMAILS'] = 'explain0@example.com'  # the user exercise() calls routes as
+    os.environ['LEARNING_EVENT_SETTLE_SECONDS'] = '0'
+
+import jwt
+from datetime import datetime, timedelta, timezone
+from flask import has_request_context, request
+from sqlalchemy import event
+
+# (table, problem) pairs that are expected, with why
+ALLOWED = {
+    ('skills', 'full scan'): 'GET /skills lists every skill',
+    ('topics', 'full scan'): 'skill catalog: every topic of every skill',
+    ('questions', 'sort'): 'ORDER BY random() picks a random sample; no index can serve it',
+    ('question_fts', 'sort'): 'search results are ranked by bm25 over the matched rows only',
+    ('event_consumers', 'full scan'): 'one row per learning_events consumer',
+    ('question_stats', 'full scan'): 'admin report ranking every question by accuracy',
+    ('question_stats', 'sort'): 'admin report: accuracy is computed, so no index can order it',
+}
+SEED_ROWS = 2000  # enough for MySQL's optimizer to prefer indexes over scans
+
+
+def seed():
+    from app import db
+    from models import (User, UserGoal, Question, DailyLog, Habit, HabitLog, Skill, Topic,
+                        UserAttempt, UserSkillProgress)
+    import streak_segments
+    users = [User(email=f'explain{i}@example.com', password_hash='x', timezone='UTC') for i in range(50)]
+    db.session.add_all(users)
+    db.session.flush()
+    user = users[0]
+    db.session.add(UserGoal(user_id=user.id, topic='Python', difficulty='beginner', daily_question_target=5))
+    topics = ['Python', 'SQL', 'Linux', 'AWS', 'JavaScript']
+    questions = [Question(topic=topics[i % 5], difficulty=('beginner', 'intermediate', 'advanced')[i % 3],
+                          question_text=f'Explain check question {i}', options={'A': 'yes', 'B': 'no'},
+                          correct_option='A', explanation='Because') for i in range(SEED_ROWS)]
+    db.session.add_all(questions)
+    skill = Skill(name='Python', icon='P', description='')
+    db.session.add(skill)
+    db.session.flush()
+    db.session.add_all([Topic(skill_id=skill.id, name=n, order=i) for i, n in enumerate(['Basics', 'OOP'])])
+    today = datetime.now(timezone.utc).date()
+    for u in users:
+        habit = Habit(user_id=u.id, name='Read')
+        db.session.add(habit)
+        db.session.flush()
+        for d in range(40):
+            day = today - timedelta(days=d)
+            if u is not user or d:  # the submit below meets today's goal and extends a streak segment
+                db.session.add(DailyLog(user_id=u.id, date=day, questions_attempted=5, questions_correct=3,
+                                        streak_maintained=True))
+            db.session.add(HabitLog(habit_id=habit.id, user_id=u.id, date=day, completed=True))
+        db.session.add(UserSkillProgress(user_id=u.id, skill_id=skill.id))
+    db.session.add_all([UserAttempt(user_id=users[i % 50].id, question_id=questions[i].id, is_correct=True)
+                        for i in range(SEED_ROWS)])
+    db.session.commit()
+    streak_segments.rebuild()
+    return user.id, skill.id, questions[0].id
+
+
+def exercise(client, user_id, skill_id, question_id):
+    import deletions
+    import learning_events
+    import streak_segments
+    from config import Config
+    from models import Habit
+    token = jwt.encode({'user_id': user_id}, Config.JWT_SECRET_KEY, algorithm='HS256')
+    h = {'Authorization': f'Bearer {token}'}
+    habit_id = Habit.query.filter_by(user_id=user_id).first().id
+    calls = [
+        ('get', '/health', None),
+        ('post', '/auth/register', {'email': 'explain-new@example.com', 'password': 'pw'}),
+        ('post', '/auth/login', {'email': 'explain-new@example.com', 'password': 'pw'}),
+        ('get', '/users/me', None),
+        ('put', '/users/goals', {'topic': 'Python', 'difficulty': 'beginner', 'question_count': 1}),
+        ('get', '/practice/daily', None),
+        ('get', '/practice/daily', None),
+        ('post', '/practice/generate', {'topic': 'SQL', 'difficulty': 'beginner', 'count': 5}),
+        ('get', '/practice/limits', None),
+        ('get', '/practice/pack?topic=Python&difficulty=beginner', None),
+        ('get', '/practice/pack?topic=Python&difficulty=beginner&since=1', None),
+        ('post', '/practice/submit', {'answers': [{'question_id': question_id, 'selected_option': 'A'}]}),
+        ('get', '/questions/search?q=explain+question', None),
+        ('get', '/dashboard/stats', None),
+        ('post', '/payments/webhook', {'id': 'evt_explain', 'type': 'invoice.paid', 'created': 0,
+                                       'data': {'object': {'customer': 'cus_none'}}}),
+        ('get', '/habits', None),
+        ('post', '/habits', {'name': 'Walk'}),
+        ('put', f'/habits/{habit_id}', {'name': 'Read more'}),
+        ('post', f'/habits/{habit_id}/log', None),
+        ('get', '/habits/heatmap', None),
+        ('get', '/skills', None),
+        ('post', f'/skills/{skill_id}/topics', {'name': 'Async'}),
+        ('get', f'/skills/{skill_id}/progress', None),
+        ('get', '/analytics/summary', None),
+        ('get', '/leaderboard', None),
+        ('get', '/leaderboard?topic=Python', None),
+        ('get', '/live', None),  # the snapshot queries; the stream body is never read
+        ('get', '/admin/events', None),
+        ('get', '/admin/questions/stats', None),
+        ('delete', f'/habits/{habit_id}', None),
+        ('delete', f'/skills/{skill_id}', None),
+        ('delete', '/users/me', None),
+    ]
+    for method, path, body in calls:
+        resp = getattr(client, method)('/api/v1' + path, json=body, headers=h)
+        if resp.status_code >= 500:
+            print(f"  ! {method.upper()} {path} -> {resp.status_code}")
+        resp.close()  # ends streamed responses (/live) and their request context
+        if path == '/habits/heatmap':
+            learning_events.drain()  # the consumers' queries, while the user still exists
+            streak_segments.verify_streaks()  # the nightly audit's queries
+    deletions._executor.submit(lambda: None).result()  # let the queued purges run while capturing
+
+
+def _sqlite_plan(conn, statement, params):
+    findings = []
+    for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, params).fetchall():
+        detail = row[-1]
+        m = re.match(r'SCAN (\w+)', detail)
+        if m and 'USING' not in detail and 'VIRTUAL TABLE' not in detail:
+            findings.append((m.group(1), 'full scan'))
+        if 'USE TEMP B-TREE FOR ORDER BY' in detail:
+            findings.append((_first_table(statement), 'sort'))
+    return findings
+
+
+def _mysql_plan(conn, statement, params):
+    findings = []
+    result = conn.exec_driver_sql('EXPLAIN ' + statement, params)
+    cols = list(result.keys())
+    for row in result.fetchall():
+        r = dict(zip(cols, row))
+        if r.get('type') == 'ALL':
+            findings.append((r.get('table'), 'full scan'))
+        if 'Using filesort' in (r.get('Extra') or ''):
+            findings.append((r.get('table'), 'sort'))
+    return findings
+
+
+def _postgres_plan(conn, statement, params):
+    findings = []
+    for (line,) in conn.exec_driver_sql('EXPLAIN ' + statement, params).fetchall():
+        m = re.search(r'Seq Scan on (\w+)', line)
+        if m:
+            findings.append((m.group(1), 'full scan'))
+        if re.search(r'->\s+Sort|^Sort', line.strip()):
+            findings.append((_first_table(statement), 'sort'))
+    return findings
+
+
+def _first_table(statement):
+    m = re.search(r'FROM\s+[`"]?(\w+)', statement, re.IGNORECASE)
+    return m.group(1) if m else '?'
+
+
+PLANNERS = {'sqlite': _sqlite_plan, 'mysql': _mysql_plan, 'postgresql': _postgres_plan}
+
+
+def main():
+    from app import create_app, db
+    app = create_app()
+    captured = {}  # statement -> (params, set of routes)
+
+    with app.app_context():
+        user_id, skill_id, question_id = seed()
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if executemany or not re.match(r'\s*(SELECT|UPDATE|DELETE)\b', statement, re.IGNORECASE):
+                return
+            route = f"{request.method} {request.path}" if has_request_context() else '(outside request)'
+            captured.setdefault(statement, (parameters, set()))[1].add(route)
+
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        with app.test_client() as client:
+            exercise(client, user_id, skill_id, question_id)
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+        planner = PLANNERS.get(db.engine.dialect.name)
+        if planner is None:
+            print(f"No EXPLAIN support for {db.engine.dialect.name}")
+            return 2
+        if db.engine.dialect.name == 'mysql':
+            with db.engine.begin() as conn:
+                for table in db.metadata.tables:
+                    conn.exec_driver_sql(f'ANALYZE TABLE `{table}`')
+
+        problems = allowed = 0
+        with db.engine.connect() as conn:
+            for statement, (params, routes) in captured.items():
+                try:
+                    findings = planner(conn, statement, params)
+                except Exception as e:
+                    print(f"? could not EXPLAIN ({e.__class__.__name__}): {' '.join(statement.split())[:120]}")
+                    continue
+                for table, problem in findings:
+                    reason = ALLOWED.get((table, problem))
+                    marker = 'ok' if reason else 'FAIL'
+                    if reason:
+                        allowed += 1
+                    else:
+                        problems += 1
+                    print(f"[{marker}] {problem} on {table} from {', '.join(sorted(routes))}"
+                          + (f" ({reason})" if reason else ''))
+                    print(f"       {' '.join(statement.split())[:200]}")
+
+        print(f"\n{len(captured)} statements checked: {problems} problems, {allowed} allowed")
+        return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
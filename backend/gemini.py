@@ -0,0 +1,345 @@
+"""
+Gemini helpers shared by the blocking and streaming question generators.
+
+Calls go through one process-wide model client, a circuit breaker with a hard
+timeout, and a single-flight + TTL cache so concurrent requests for the same
+prompt share one generation. When the breaker is open callers get [] at once
+and fall back to the built-in bank. Every call also holds one of the
+service-wide Gemini slots from rate_limits.py while it runs.
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import google.generativeai as genai
+from config import Config
+import rate_limits
+
+MODEL_NAME = 'gemini-2.5-flash'
+REQUIRED_KEYS = ('question_text', 'options', 'correct_option', 'explanation')
+
+_model = None
+_model_lock = threading.Lock()
+_call_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='gemini-call')
+
+
+def is_configured():
+    return bool(Config.GEMINI_API_KEY) and Config.GEMINI_API_KEY != 'your_api_key_here'
+
+
+def build_prompt(topic, difficulty, count):
+    return f"""Generate {count} multiple choice questions about {topic} at a {difficulty} level.
+Return ONLY a raw JSON array of objects. No markdown formatting, no code blocks, just the JSON.
+Each object must have exactly these keys:
+- "question_text": The question string
+- "options": An object with exactly 4 string keys "A", "B", "C", "D" mapping to the 4 choices
+- "correct_option": A string "A", "B", "C", or "D"
+- "explanation": A brief string explaining why the answer is correct
+"""
+
+
+def get_model():
+    """Configure the SDK once and reuse a single GenerativeModel."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                if Config.GEMINI_TRANSPORT:
+                    genai.configure(api_key=Config.GEMINI_API_KEY, transport=Config.GEMINI_TRANSPORT)
+                else:
+                    genai.configure(api_key=Config.GEMINI_API_KEY)
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+def parse_questions(text):
+    """Parse a complete response body, tolerating a markdown code fence."""
+    text = text.strip()
+    if text.startswith('```json'): text = text[7:]
+    if text.startswith('```'): text = text[3:]
+    if text.endswith('```'): text = text[:-3]
+    return json.loads(text.strip())
+
+
+def is_valid_question(q):
+    return isinstance(q, dict) and all(k in q for k in REQUIRED_KEYS)
+
+
+class JSONArrayStreamParser:
+    """
+    Pull complete top-level objects out of a JSON array as it arrives.
+    Anything before the opening '[' (e.g. a ```json fence) is skipped, and
+    objects that fail to decode are dropped instead of aborting the stream.
+    """
+
+    def __init__(self):
+        self._buf = ''
+        self._pos = 0
+        self._started = False
+        self._done = False
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._obj_start = None
+
+    def feed(self, chunk):
+        """Add a chunk of text and return the objects completed by it."""
+        if self._done:
+            return []
+        buf = self._buf + chunk
+        i = self._pos
+        out = []
+        while i < len(buf):
+            c = buf[i]
+            if not self._started:
+                self._started = c == '['
+            elif self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._in_str = False
+            elif c == '"':
+                self._in_str = True
+            elif c in '{[':
+                if self._depth == 0 and c == '{':
+                    self._obj_start = i
+                self._depth += 1
+            elif c in '}]':
+                if self._depth == 0:
+                    self._done = True
+                    break
+                self._depth -= 1
+                if self._depth == 0 and self._obj_start is not None:
+                    try:
+                        out.append(json.loads(buf[self._obj_start:i + 1]))
+                    except ValueError:
+                        pass
+                    self._obj_start = None
+            i += 1
+
+        # Only keep the unfinished object in the buffer
+        if self._obj_start is None:
+            self._buf, self._pos = '', 0
+        else:
+            self._buf, self._pos = buf[self._obj_start:], i - self._obj_start
+            self._obj_start = 0
+        return out
+
+
+class CircuitBreaker:
+    """
+    Closed -> open after `threshold` consecutive failures; while open every
+    call is refused until `cooldown` seconds pass, then one trial call is let
+    through (half-open) and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self.opened_at >= self.cooldown else 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+
+
+class SingleFlight:
+    """Concurrent do(key, fn) calls for the same key share one execution of fn."""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.value = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
+
+
+class TTLCache:
+    def __init__(self, ttl, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            value, expires = hit
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                # Drop the entry closest to expiry
+                del self._data[min(self._data, key=lambda k: self._data[k][1])]
+            self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+breaker = CircuitBreaker(Config.GEMINI_BREAKER_THRESHOLD, Config.GEMINI_BREAKER_COOLDOWN)
+_flight = SingleFlight()
+_results = TTLCache(Config.GEMINI_CACHE_TTL)
+
+
+def generate_questions(topic, difficulty, count, model=None):
+    """
+    One blocking generation guarded by the breaker and a hard timeout.
+    Returns a list of validated question dicts, or [] if the call was refused,
+    timed out or failed.
+    """
+    model = model or get_model()
+    try:
+        slot = rate_limits.acquire_llm_slot()
+    except rate_limits.LLMSaturated as e:
+        print(f"Gemini busy, skipping generation: {e}")
+        return []
+    if not breaker.allow():
+        rate_limits.release_llm_slot(slot)
+        print("Gemini circuit open, skipping generation.")
+        return []
+    future = _call_pool.submit(model.generate_content, build_prompt(topic, difficulty, count))
+    # Free the slot when the call really ends, not when we stop waiting for it
+    future.add_done_callback(lambda _: rate_limits.release_llm_slot(slot))
+    try:
+        q_data = parse_questions(future.result(timeout=Config.GEMINI_TIMEOUT).text)
+    except FutureTimeout:
+        breaker.record_failure()
+        print(f"Gemini generation timed out after {Config.GEMINI_TIMEOUT}s")
+        return []
+    except Exception as e:
+        breaker.record_failure()
+        print(f"Gemini generation failed: {e}")
+        return []
+    breaker.record_success()
+    return [q for q in q_data if is_valid_question(q)][:count]
+
+
+def coalesced(key, fn):
+    """
+    Return the cached result for key, or run fn once for all concurrent
+    callers with that key. Empty results are not cached so a later call can
+    retry once the API recovers.
+    """
+    hit = _results.get(key)
+    if hit is not None:
+        return hit
+
+    def run():
+        value = fn()
+        if value:
+            _results.set(key, value)
+        return value
+    return _flight.do(key, run)
+
+
+def stream_questions(topic, difficulty, count, model=None):
+    """
+    Yield validated question dicts as soon as each one has streamed in. Each
+    request and the whole stream are bounded by GEMINI_TIMEOUT; a stream that
+    runs past it stops early and counts as a failure for the breaker.
+    """
+    model = model or get_model()
+    try:
+        slot = rate_limits.acquire_llm_slot()
+    except rate_limits.LLMSaturated as e:
+        print(f"Gemini busy, skipping streaming generation: {e}")
+        return
+    if not breaker.allow():
+        rate_limits.release_llm_slot(slot)
+        print("Gemini circuit open, skipping streaming generation.")
+        return
+    deadline = time.monotonic() + Config.GEMINI_TIMEOUT
+    try:
+        response = model.generate_content(build_prompt(topic, difficulty, count), stream=True,
+                                          request_options={'timeout': Config.GEMINI_TIMEOUT})
+        parser = JSONArrayStreamParser()
+        emitted = 0
+        for chunk in response:
+            if time.monotonic() > deadline:
+                breaker.record_failure()
+                print(f"Gemini stream ran past {Config.GEMINI_TIMEOUT}s, stopping after {emitted} questions")
+                return
+            for q in parser.feed(chunk.text):
+                if is_valid_question(q):
+                    yield q
+                    emitted += 1
+                    if emitted >= count:
+                        break
+            if emitted >= count:
+                break
+    except GeneratorExit:
+        # The consumer stopped reading; that says nothing about the API
+        breaker.record_success()
+        raise
+    except Exception:
+        breaker.record_failure()
+        raise
+    finally:
+        rate_limits.release_llm_slot(slot)
+    breaker.record_success()
@@ -0,0 +1,64 @@
+"""
+gunicorn settings, read from Config (see config.py):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+GUNICORN_WORKER_CLASS picks how a worker waits on slow I/O (Gemini, Stripe,
+SSE streams from /live and practice jobs):
+  gthread  (default) GUNICORN_THREADS requests per worker on OS threads
+  gevent   GUNICORN_WORKER_CONNECTIONS requests per worker on greenlets;
+           needs `pip install gevent`. Everything is monkey-patched here,
+           before the app is preloaded, and Gemini switches to its REST
+           transport because gRPC calls don't yield to other greenlets.
+  sync     one request per worker; a request waiting on Gemini or holding
+           an SSE stream blocks the whole worker
+
+With more than one worker, live updates, leaderboards, generation quotas and
+practice jobs must be shared through Redis (LIVE_UPDATES_BACKEND,
+LEADERBOARD_BACKEND, RATE_LIMIT_BACKEND and PRACTICE_JOBS_BACKEND = redis).
+With a memory backend each worker only sees its own state, so the server
+refuses to start unless WEB_CONCURRENCY=1 or GUNICORN_ALLOW_MEMORY_BACKENDS=1,
+which downgrades it to a warning.
+
+The dashboard stats cache (routes.cache_stats) stays per worker: a submit only
+invalidates the cache of the worker that handled it, so another worker can
+serve stats up to 5 minutes old. /live pushes the changes in the meantime.
+
+Binds to 0.0.0.0:$PORT when PORT is set (gunicorn's default), else use -b.
+bench_server.py compares the worker classes under an I/O-bound load.
+"""
+from config import Config
+
+worker_class = Config.GUNICORN_WORKER_CLASS
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+    if not Config.GEMINI_TRANSPORT:
+        Config.GEMINI_TRANSPORT = 'rest'
+
+workers = Config.GUNICORN_WORKERS
+_per_worker = [name for name in ('LIVE_UPDATES_BACKEND', 'LEADERBOARD_BACKEND', 'RATE_LIMIT_BACKEND',
+                                 'PRACTICE_JOBS_BACKEND')
+               if getattr(Config, name) != 'redis']
+if workers > 1 and _per_worker:
+    _problem = (f"{workers} workers with {', '.join(_per_worker)}=memory: each worker keeps its own live "
+                f"update streams, leaderboard, generation quotas and practice jobs. Set them to redis "
+                f"(with REDIS_URL) or WEB_CONCURRENCY=1.")
+    if not Config.GUNICORN_ALLOW_MEMORY_BACKENDS:
+        raise SystemExit(f"Refusing to start: {_problem}")
+    print(f"Warning: {_problem}")
+if worker_class == 'gthread':
+    threads = Config.GUNICORN_THREADS  # gunicorn silently turns sync into gthread if threads > 1
+elif worker_class == 'gevent':
+    worker_connections = Config.GUNICORN_WORKER_CONNECTIONS
+
+# Build the app and warm its caches once, in the master, before forking
+preload_app = True
+timeout = Config.GUNICORN_TIMEOUT
+graceful_timeout = 30
+keepalive = 5
+
+
+def post_fork(server, worker):
+    from wsgi import init_worker
+    init_worker()
@@ -0,0 +1,356 @@
+"""
+Bulk import of skills, topics and questions.
+
+    python importer.py catalog.jsonl questions.csv [--batch-size 5000] [--workers 4]
+
+Each input file is either JSON Lines or CSV (by extension) and is streamed,
+so file size doesn't matter. A record is one of:
+
+    skill     {"kind": "skill", "name": "Python", "icon": "...", "description": "..."}
+    topic     {"kind": "topic", "skill": "Python", "name": "OOP", "description": "...", "order": 3}
+    question  {"kind": "question", "topic": "Python - OOP", "difficulty": "beginner",
+               "question_text": "...", "options": {"A": "...", "B": "..."},
+               "correct_option": "A", "explanation": "..."}
+
+"kind" may be omitted when the fields make it obvious. CSV question rows
+can give options as option_a..option_f columns or as an "options" JSON
+column. A topic's skill must be in the database or earlier in the input.
+
+Batches are validated in a process pool and inserted with one executemany
+per table. Records already present are skipped, judged by their natural
+keys: skill name, (skill, topic name), and (topic, difficulty, question
+text). After every committed batch the file's line number goes into a
+checkpoint file (<input>.checkpoint), so a re-run after a failure continues
+where it stopped. Delete the checkpoint to re-scan a file from the top.
+"""
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import insert
+
+from app import db
+from models import Skill, Topic, Question
+import question_cache
+
+DIFFICULTIES = ('beginner', 'intermediate', 'advanced')
+OPTION_KEYS = ('A', 'B', 'C', 'D', 'E', 'F')
+
+
+# --- READING ---
+def read_records(path, start_line=0):
+    """Yield (line_no, record dict) from a .jsonl/.ndjson or .csv file, skipping lines <= start_line."""
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for line_no, row in enumerate(csv.DictReader(f), 1):  # line_no counts data rows
+                if line_no > start_line:
+                    yield line_no, row
+        return
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if line_no <= start_line or not line.strip():
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                yield line_no, {'_error': f'invalid JSON: {e}'}
+                continue
+            yield line_no, rec if isinstance(rec, dict) else {'_error': 'record must be a JSON object'}
+
+
+# --- VALIDATION (runs in worker processes) ---
+def _text(rec, field, max_len=None, required=True):
+    value = rec.get(field)
+    value = value.strip() if isinstance(value, str) else value
+    if not value:
+        if required:
+            raise ValueError(f'{field} is required')
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{field} must be a string')
+    if max_len and len(value) > max_len:
+        raise ValueError(f'{field} longer than {max_len} characters')
+    return value
+
+
+def _options(rec):
+    options = rec.get('options')
+    if isinstance(options, str) and options.strip():
+        options = json.loads(options)
+    if not options:
+        options = {k: rec.get(f'option_{k.lower()}') for k in OPTION_KEYS}
+    if not isinstance(options, dict):
+        raise ValueError('options must be an object of letter -> text')
+    options = {str(k).strip().upper(): str(v).strip() for k, v in options.items() if v not in (None, '')}
+    if len(options) < 2:
+        raise ValueError('a question needs at least two options')
+    return options
+
+
+def _detect_kind(rec):
+    kind = (rec.get('kind') or '').strip().lower()
+    if kind:
+        return kind
+    if rec.get('question_text'):
+        return 'question'
+    if rec.get('skill'):
+        return 'topic'
+    return 'skill'
+
+
+def validate_record(rec):
+    """Normalize one raw record. Returns (kind, fields) or raises ValueError."""
+    if '_error' in rec:
+        raise ValueError(rec['_error'])
+    kind = _detect_kind(rec)
+    if kind == 'skill':
+        return kind, {
+            'name': _text(rec, 'name', 100),
+            'icon': _text(rec, 'icon', 50, required=False) or 'BookOpen',
+            'description': _text(rec, 'description', required=False),
+        }
+    if kind == 'topic':
+        order = rec.get('order')
+        return kind, {
+            'skill': _text(rec, 'skill', 100),
+            'name': _text(rec, 'name', 100),
+            'description': _text(rec, 'description', required=False),
+            'order': int(order) if order not in (None, '') else None,
+        }
+    if kind == 'question':
+        difficulty = _text(rec, 'difficulty', 20).lower()
+        if difficulty not in DIFFICULTIES:
+            raise ValueError(f'difficulty must be one of {", ".join(DIFFICULTIES)}')
+        options = _options(rec)
+        correct = _text(rec, 'correct_option', 10).upper()
+        if correct not in options:
+            raise ValueError(f'correct_option {correct} is not one of the options')
+        return kind, {
+            'topic': _text(rec, 'topic', 50),
+            'difficulty': difficulty,
+            'question_text': _text(rec, 'question_text'),
+            'options': options,
+            'correct_option': correct,
+            'explanation': _text(rec, 'explanation', required=False),
+        }
+    raise ValueError(f'unknown kind {kind!r}')
+
+
+def validate_chunk(chunk):
+    """[(line_no, raw)] -> [(line_no, kind, fields, error)]"""
+    out = []
+    for line_no, rec in chunk:
+        try:
+            kind, fields = validate_record(rec)
+            out.append((line_no, kind, fields, None))
+        except (ValueError, TypeError, AttributeError) as e:  # AttributeError: e.g. a non-string kind
+            out.append((line_no, None, None, str(e)))
+    return out
+
+
+# --- NATURAL KEYS ---
+def question_key(topic, difficulty, question_text):
+    normalized = ' '.join(question_text.lower().split())
+    return hashlib.sha1(f'{topic.lower()}\x1f{difficulty}\x1f{normalized}'.encode('utf-8')).digest()
+
+
+class Importer:
+    """Holds the natural keys already in the database and inserts validated batches."""
+
+    def __init__(self):
+        self.skills = {name.lower(): sid for sid, name in db.session.query(Skill.id, Skill.name)}
+        self.topics = set()
+        self.next_order = {}
+        for skill_id, name, order in db.session.query(Topic.skill_id, Topic.name, Topic.order):
+            self.topics.add((skill_id, name.lower()))
+            self.next_order[skill_id] = max(self.next_order.get(skill_id, 1), (order or 0) + 1)
+        self.questions = set()
+        for topic, difficulty, text in db.session.query(
+                Question.topic, Question.difficulty, Question.question_text).yield_per(10000):
+            self.questions.add(question_key(topic, difficulty, text))
+        self.stats = {'skills': 0, 'topics': 0, 'questions': 0, 'duplicates': 0, 'errors': 0}
+
+    def insert_batch(self, validated):
+        """Insert one validated batch and commit. Returns a list of (line_no, error)."""
+        errors = []
+        skills, topics, questions = [], [], []
+        for line_no, kind, fields, error in validated:
+            if error:
+                errors.append((line_no, error))
+            elif kind == 'skill':
+                skills.append(fields)
+            elif kind == 'topic':
+                topics.append((line_no, fields))
+            else:
+                questions.append(fields)
+
+        new_skills = []
+        for s in skills:
+            if s['name'].lower() in self.skills or any(n['name'].lower() == s['name'].lower() for n in new_skills):
+                self.stats['duplicates'] += 1
+            else:
+                new_skills.append(s)
+        if new_skills:
+            db.session.execute(insert(Skill.__table__), new_skills)
+            names = [s['name'] for s in new_skills]
+            for sid, name in db.session.query(Skill.id, Skill.name).filter(Skill.name.in_(names)):
+                self.skills[name.lower()] = sid
+            self.stats['skills'] += len(new_skills)
+
+        new_topics = []
+        for line_no, t in topics:
+            skill_id = self.skills.get(t['skill'].lower())
+            if skill_id is None:
+                errors.append((line_no, f"unknown skill {t['skill']!r}"))
+                continue
+            key = (skill_id, t['name'].lower())
+            if key in self.topics:
+                self.stats['duplicates'] += 1
+                continue
+            self.topics.add(key)
+            order = t['order'] if t['order'] is not None else self.next_order.get(skill_id, 1)
+            self.next_order[skill_id] = max(self.next_order.get(skill_id, 1), order + 1)
+            new_topics.append({'skill_id': skill_id, 'name': t['name'], 'description': t['description'], 'order': order})
+        if new_topics:
+            db.session.execute(insert(Topic.__table__), new_topics)
+            self.stats['topics'] += len(new_topics)
+
+        new_questions = []
+        for q in questions:
+            key = question_key(q['topic'], q['difficulty'], q['question_text'])
+            if key in self.questions:
+                self.stats['duplicates'] += 1
+                continue
+            self.questions.add(key)
+            new_questions.append(q)
+        if new_questions:
+            db.session.execute(insert(Question.__table__), new_questions)
+            self.stats['questions'] += len(new_questions)
+
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if new_questions:
+            question_cache.notify_inserted()  # a Core insert: the ORM commit hook doesn't see it
+        self.stats['errors'] += len(errors)
+        return errors
+
+
+# --- CHECKPOINTS ---
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get('line', 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def save_checkpoint(path, line_no):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'line': line_no, 'updated_at': time.time()}, f)
+    os.replace(tmp, path)
+
+
+# --- PIPELINE ---
+def _batches(records, batch_size):
+    batch = []
+    for item in records:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validated_batches(batches, workers):
+    """Validate batches in a process pool, in order, keeping at most 2 per worker in flight."""
+    if not workers:
+        for batch in batches:
+            yield batch[-1][0], validate_chunk(batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch[-1][0], pool.submit(validate_chunk, batch)))
+            if len(pending) >= workers * 2:
+                last_line, fut = pending.popleft()
+                yield last_line, fut.result()
+        while pending:
+            last_line, fut = pending.popleft()
+            yield last_line, fut.result()
+
+
+def import_file(path, importer=None, batch_size=5000, workers=None, checkpoint_path=None):
+    """Stream one file into the database. Returns the importer's running stats."""
+    importer = importer or Importer()
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    checkpoint_path = checkpoint_path or path + '.checkpoint'
+    start_line = load_checkpoint(checkpoint_path)
+    if start_line:
+        print(f"{path}: resuming after line {start_line}")
+
+    started = time.perf_counter()
+    rows = 0
+    for last_line, validated in _validated_batches(_batches(read_records(path, start_line), batch_size), workers):
+        for line_no, error in importer.insert_batch(validated):
+            print(f"{path}:{line_no}: skipped, {error}")
+        save_checkpoint(checkpoint_path, last_line)
+        rows += len(validated)
+        elapsed = time.perf_counter() - started
+        print(f"{path}: {rows} rows through line {last_line}, {rows / elapsed:,.0f} rows/s")
+
+    elapsed = time.perf_counter() - started
+    print(f"{path}: done, {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    return importer.stats
+
+
+def import_records(records, batch_size=5000):
+    """Import an in-memory list of record dicts (no checkpoint, validated inline)."""
+    importer = Importer()
+    for batch in _batches(list(enumerate(records, 1)), batch_size):
+        for line_no, error in importer.insert_batch(validate_chunk(batch)):
+            print(f"record {line_no}: skipped, {error}")
+    _after_import(importer.stats)
+    return importer.stats
+
+
+def _after_import(stats):
+    if stats['questions']:
+        # Bulk inserts bypass the ORM insert hook that feeds question search
+        import search
+        search.rebuild()
+    if stats['skills'] or stats['topics']:
+        import skill_progress
+        skill_progress.invalidate()
+
+
+def main(argv):
+    import argparse
+    parser = argparse.ArgumentParser(description='Bulk import skills, topics and questions')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=None, help='validation processes (0 = inline)')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        importer = Importer()
+        for path in args.files:
+            import_file(path, importer, batch_size=args.batch_size, workers=args.workers)
+        _after_import(importer.stats)
+        print(f"Imported {importer.stats}")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,289 @@
+"""
+Streak leaderboards: one global board plus one per goal topic.
+
+Users with current_streak > 0 are ranked by streak. Ties share a rank, so
+"you are #N" means 1 + the number of users with a strictly longer streak.
+The boards are kept in an ordered index, so top-N reads and rank lookups
+are O(log n) instead of ORDER BY ... LIMIT plus a COUNT(*) per request.
+
+LEADERBOARD_BACKEND picks the index:
+  memory  per process: sorted arrays of (-streak, user_id) searched with bisect (default)
+  redis   sorted sets in REDIS_URL, shared by every worker and by cron.py
+
+Boards are updated where streaks change: submit_practice after its commit,
+goal topic changes, account deletion and rollover_streaks resets. The memory
+backend builds itself from the DB on first use in each process. It then
+re-syncs every LEADERBOARD_RESYNC_SECONDS, which picks up resets done by the
+cron process. The redis backend is built once, by the first process that
+finds it empty.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from app import db
+from config import Config
+from models import User, UserGoal
+
+GLOBAL = None  # board key of the all-topics board
+
+
+def _load_rows(chunk_size=10000):
+    """(user_id, streak, goal topic) for every user on a streak: a streamed range scan of ix_users_current_streak."""
+    return db.session.query(User.id, User.current_streak, UserGoal.topic) \
+        .outerjoin(UserGoal, UserGoal.user_id == User.id) \
+        .filter(User.current_streak > 0, User.deleted_at.is_(None)) \
+        .yield_per(chunk_size)
+
+
+# --- IN-PROCESS BACKEND ---
+class _Board:
+    def __init__(self):
+        self.keys = []  # sorted (-streak, user_id): longest streak first
+        self.streaks = {}  # user_id -> streak
+
+    def set(self, user_id, streak):
+        old = self.streaks.pop(user_id, None)
+        if old is not None:
+            del self.keys[bisect_left(self.keys, (-old, user_id))]
+        if streak > 0:
+            insort(self.keys, (-streak, user_id))
+            self.streaks[user_id] = streak
+
+    def rank(self, user_id):
+        streak = self.streaks.get(user_id)
+        if streak is None:
+            return None, 0
+        # (-streak,) sorts before every (-streak, user_id): counts strictly longer streaks
+        return bisect_left(self.keys, (-streak,)) + 1, streak
+
+    def top(self, n):
+        return [(user_id, -neg) for neg, user_id in self.keys[:n]]
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {GLOBAL: _Board()}
+        self._topics = {}  # user_id -> topic
+        self._loaded_at = None
+        self._rebuilding = None  # updates made while a rebuild reads the DB, replayed after the swap
+        self._rebuild_lock = threading.Lock()
+
+    def _apply(self, boards, topics, user_id, streak, topic):
+        old_topic = topics.get(user_id)
+        if old_topic is not None and old_topic != topic:
+            boards[old_topic].set(user_id, 0)
+        boards[GLOBAL].set(user_id, streak)
+        if topic is not None:
+            boards.setdefault(topic, _Board()).set(user_id, streak)
+        if streak > 0 and topic is not None:
+            topics[user_id] = topic
+        else:
+            topics.pop(user_id, None)
+
+    def update(self, user_id, streak, topic):
+        with self._lock:
+            if self._rebuilding is not None:
+                self._rebuilding.append((user_id, streak, topic))
+            self._apply(self._boards, self._topics, user_id, streak, topic)
+
+    def streak_of(self, user_id):
+        with self._lock:
+            return self._boards[GLOBAL].streaks.get(user_id, 0)
+
+    def _stale(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > Config.LEADERBOARD_RESYNC_SECONDS
+
+    def _rebuild(self):
+        """Re-read every streak from the DB and swap the boards in atomically. Hold _rebuild_lock."""
+        with self._lock:
+            self._rebuilding = []
+        try:
+            boards, topics = {GLOBAL: _Board()}, {}
+            for user_id, streak, topic in _load_rows():
+                self._apply(boards, topics, user_id, streak, topic)
+        except Exception:
+            with self._lock:
+                self._rebuilding = None
+            raise
+        with self._lock:
+            for update in self._rebuilding:
+                self._apply(boards, topics, *update)
+            self._boards, self._topics = boards, topics
+            self._rebuilding = None
+            self._loaded_at = time.monotonic()
+
+    def rebuild(self):
+        with self._rebuild_lock:
+            self._rebuild()
+
+    def ensure_fresh(self):
+        if not self._stale():
+            return
+        # Only the first build blocks; a re-sync in progress keeps serving the current boards
+        if not self._rebuild_lock.acquire(blocking=self._loaded_at is None):
+            return
+        try:
+            if self._stale():
+                self._rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    def forget(self, user_ids):
+        with self._lock:
+            if self._loaded_at is None:
+                return  # nothing built in this process (e.g. cron.py)
+            for user_id in user_ids:
+                self._apply(self._boards, self._topics, user_id, 0, None)
+                if self._rebuilding is not None:
+                    self._rebuilding.append((user_id, 0, None))
+
+    def top(self, topic, n):
+        with self._lock:
+            board = self._boards.get(topic)
+            return board.top(n) if board else []
+
+    def rank(self, topic, user_id):
+        with self._lock:
+            board = self._boards.get(topic)
+            return board.rank(user_id) if board else (None, 0)
+
+    def size(self, topic):
+        with self._lock:
+            board = self._boards.get(topic)
+            return len(board.keys) if board else 0
+
+
+# --- SHARED (REDIS) BACKEND ---
+class RedisBackend:
+    PREFIX = 'skillsprint:lb:'
+
+    def __init__(self, url):
+        import redis  # only needed for the shared backend
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._topics_key = self.PREFIX + 'topics'  # hash user_id -> topic
+        self._checked = False
+
+    def _key(self, topic):
+        return self.PREFIX + ('global' if topic is GLOBAL else 'topic:' + topic)
+
+    def _apply(self, pipe, user_id, streak, topic, old_topic):
+        if old_topic is not None and old_topic != topic:
+            pipe.zrem(self._key(old_topic), user_id)
+        for board in (GLOBAL, topic) if topic is not None else (GLOBAL,):
+            if streak > 0:
+                pipe.zadd(self._key(board), {user_id: streak})
+            else:
+                pipe.zrem(self._key(board), user_id)
+        if streak > 0 and topic is not None:
+            pipe.hset(self._topics_key, user_id, topic)
+        else:
+            pipe.hdel(self._topics_key, user_id)
+
+    def update(self, user_id, streak, topic):
+        old_topic = self._redis.hget(self._topics_key, user_id)
+        pipe = self._redis.pipeline()
+        self._apply(pipe, user_id, streak, topic, old_topic)
+        pipe.execute()
+
+    def streak_of(self, user_id):
+        return int(self._redis.zscore(self._key(GLOBAL), user_id) or 0)
+
+    def rebuild(self):
+        old_keys = list(self._redis.scan_iter(self.PREFIX + '*'))
+        pipe = self._redis.pipeline()  # MULTI/EXEC: readers never see a half-built board
+        if old_keys:
+            pipe.delete(*old_keys)
+        pipe.set(self.PREFIX + 'built', int(time.time()))
+        for user_id, streak, topic in _load_rows():
+            self._apply(pipe, user_id, streak, topic, None)
+        pipe.execute()
+
+    def ensure_fresh(self):
+        if not self._checked:
+            if not self._redis.exists(self.PREFIX + 'built'):
+                self.rebuild()
+            self._checked = True
+
+    def forget(self, user_ids):
+        if not user_ids:
+            return
+        topics = self._redis.hmget(self._topics_key, list(user_ids))
+        pipe = self._redis.pipeline()
+        for user_id, topic in zip(user_ids, topics):
+            self._apply(pipe, user_id, 0, None, topic)
+        pipe.execute()
+
+    def top(self, topic, n):
+        return [(user_id, int(score)) for user_id, score in
+                self._redis.zrevrange(self._key(topic), 0, n - 1, withscores=True)]
+
+    def rank(self, topic, user_id):
+        key = self._key(topic)
+        score = self._redis.zscore(key, user_id)
+        if score is None:
+            return None, 0
+        return self._redis.zcount(key, f'({score}', '+inf') + 1, int(score)
+
+    def size(self, topic):
+        return self._redis.zcard(self._key(topic))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = RedisBackend(Config.REDIS_URL) if Config.LEADERBOARD_BACKEND == 'redis' else MemoryBackend()
+    return _backend
+
+
+# --- PUBLIC API ---
+def record_streak(user_id, streak, topic):
+    """After a commit that changed the user's streak or goal topic."""
+    b = backend()
+    b.ensure_fresh()
+    b.update(user_id, streak, topic)
+
+
+def set_topic(user_id, topic):
+    """Move a user's entry to the board of their new goal topic."""
+    b = backend()
+    b.ensure_fresh()
+    b.update(user_id, b.streak_of(user_id), topic)
+
+
+def forget(user_ids):
+    """Drop users whose streak was reset or whose account was deleted."""
+    backend().forget(list(user_ids))
+
+
+def standings(user_id, topic=GLOBAL, limit=20):
+    """Top `limit` entries of a board as [(rank, user_id, streak)], plus the user's (rank, streak)."""
+    b = backend()
+    b.ensure_fresh()
+    entries = []
+    for i, (entry_id, streak) in enumerate(b.top(topic, limit)):
+        rank = entries[-1][0] if entries and entries[-1][2] == streak else i + 1
+        entries.append((rank, entry_id, streak))
+    return entries, b.rank(topic, user_id), b.size(topic)
+
+
+def rebuild():
+    backend().rebuild()
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        rebuild()
+        print(f"Rebuilt {Config.LEADERBOARD_BACKEND} leaderboard: {backend().size(GLOBAL)} users "
+              f"in {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,282 @@
+"""
+Learning event log (outbox).
+
+submit_practice and log_habit append one compact event per change to
+learning_events, in the same transaction as the change itself:
+
+    attempts  {"day": "2026-10-19", "q": [[question_id, correct 0/1, seconds], ...]}
+    goal_met  {"day": "2026-10-19"}
+    habit     {"habit_id": 3, "day": "2026-10-19", "done": 1}
+
+Derived views are consumers. Each one reads the log in id order, in batches,
+from its own position in event_consumers. A consumer's writes and its new
+position commit together, so each event is applied exactly once per
+consumer. Adding a consumer adds nothing to the request path.
+
+    skill_progress  topic mastery and skill progress (skill_progress.record_attempts)
+    question_stats  per-question attempts, accuracy and answer time
+
+    python learning_events.py                        # run the consumer loop
+    (or cron.py, which drains every consumer every 30 seconds)
+    python learning_events.py replay question_stats  # rebuild a view from the whole log
+
+Only events older than LEARNING_EVENT_SETTLE_SECONDS are read. Ids are
+allocated at insert, so a slow transaction can commit a lower id after a
+higher one has been read past.
+
+When a batch fails it is re-applied one event at a time, up to the failing
+event. Each further attempt at that event counts in event_consumers.failures.
+After LEARNING_EVENT_MAX_ATTEMPTS failures it is moved to event_dead_letters,
+and the consumer goes on with the next event. run_worker backs off between
+attempts, so a short outage doesn't use them all up.
+
+Replay empties a view and re-reads the log from the start. That needs a
+reset hook and a log covering the view's whole history. skill_progress has
+neither, since its history predates the log; rebuild it from attempts with
+`python skill_progress.py rebuild`. Per-process state (the dashboard stats
+cache, live updates) is still updated by the routes, because a consumer
+process can't reach it.
+"""
+import json
+import sys
+import time
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from config import Config
+from models import LearningEvent, EventConsumer, EventDeadLetter, QuestionStat, User
+import question_cache
+import skill_progress
+
+Event = namedtuple('Event', 'id user_id type data')
+
+
+# --- WRITING ---
+def append(user_id, type, data):
+    """Add an event to the current transaction; the caller commits."""
+    db.session.add(LearningEvent(user_id=user_id, type=type, payload=json.dumps(data, separators=(',', ':'))))
+
+
+def attempts_graded(user_id, day, answers):
+    """answers: iterable of (question_id, is_correct, seconds taken)"""
+    append(user_id, 'attempts', {
+        'day': day.isoformat(),
+        'q': [[question_id, int(bool(correct)), int(seconds or 0)] for question_id, correct, seconds in answers],
+    })
+
+
+def goal_met(user_id, day):
+    append(user_id, 'goal_met', {'day': day.isoformat()})
+
+
+def habit_toggled(user_id, habit_id, day, done):
+    append(user_id, 'habit', {'habit_id': habit_id, 'day': day.isoformat(), 'done': int(done)})
+
+
+# --- CONSUMERS ---
+class Consumer:
+    def __init__(self, name, types, apply, reset=None):
+        self.name = name
+        self.types = types  # event types it reads; others just advance its position
+        self.apply = apply  # apply(events): write the view; the caller commits
+        self.reset = reset  # empty the view before a replay; None if it can't be replayed
+
+
+def _live_users(user_ids):
+    """Events outlive accounts until the purge: skip deleted users."""
+    return {uid for (uid,) in db.session.query(User.id).filter(User.id.in_(user_ids), User.deleted_at.is_(None))}
+
+
+def _apply_skill_progress(events):
+    users = _live_users({e.user_id for e in events})
+    questions = question_cache.get_many({q[0] for e in events for q in e.data['q']})
+    for e in events:
+        if e.user_id in users:
+            skill_progress.record_attempts(
+                e.user_id, [(questions[qid], correct) for qid, correct, _ in e.data['q'] if qid in questions]
+            )
+
+
+def _apply_question_stats(events):
+    totals = defaultdict(lambda: [0, 0, 0])  # question_id -> [attempts, correct, seconds]
+    for e in events:
+        for question_id, correct, seconds in e.data['q']:
+            t = totals[question_id]
+            t[0] += 1
+            t[1] += correct
+            t[2] += seconds
+    # Sorted so concurrent consumers (e.g. during a replay) lock rows in the same order
+    for question_id, (attempts, correct, seconds) in sorted(totals.items()):
+        skill_progress.upsert_add(
+            QuestionStat,
+            keys={'question_id': question_id},
+            increments={'attempts': attempts, 'correct': correct, 'total_time': seconds},
+            index_elements=['question_id'],
+            returning=('attempts',)
+        )
+
+
+def _reset_question_stats():
+    QuestionStat.query.delete(synchronize_session=False)
+
+
+CONSUMERS = {c.name: c for c in (
+    Consumer('skill_progress', ('attempts',), _apply_skill_progress),
+    Consumer('question_stats', ('attempts',), _apply_question_stats, _reset_question_stats),
+)}
+
+
+# --- PROCESSING ---
+def _lock_state(name):
+    """The consumer's row, locked for this transaction; created at position 0 on first use."""
+    state = EventConsumer.query.filter_by(name=name).with_for_update().first()
+    if state is None:
+        db.session.add(EventConsumer(name=name, position=0, events_applied=0, failures=0))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # another worker registered it first
+        state = EventConsumer.query.filter_by(name=name).with_for_update().first()
+    return state
+
+
+def process(name, batch_size=None):
+    """Apply the next batch of settled events to one consumer. Returns events read."""
+    consumer = CONSUMERS[name]
+    batch_size = batch_size or Config.LEARNING_EVENT_BATCH_SIZE
+    now = datetime.now(timezone.utc)
+    cutoff = (now - timedelta(seconds=Config.LEARNING_EVENT_SETTLE_SECONDS)).replace(tzinfo=None)
+
+    state = _lock_state(name)
+    if state.failures:
+        batch_size = 1  # the next event has failed before: try it on its own
+    rows = db.session.query(LearningEvent.id, LearningEvent.user_id, LearningEvent.type,
+                            LearningEvent.payload, LearningEvent.created_at) \
+        .filter(LearningEvent.id > state.position).order_by(LearningEvent.id).limit(batch_size).all()
+    settled = []
+    for row in rows:
+        if row.created_at is not None and row.created_at.replace(tzinfo=None) > cutoff:
+            break  # this one and everything after it may still have gaps below
+        settled.append(row)
+    if not settled:
+        db.session.rollback()  # releases the row lock
+        return 0
+
+    try:
+        events = [Event(r.id, r.user_id, r.type, json.loads(r.payload)) for r in settled if r.type in consumer.types]
+        if events:
+            consumer.apply(events)
+        state.position = settled[-1].id
+        state.events_applied += len(events)
+        state.failures = 0
+        state.last_error = None
+        state.updated_at = now
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        if len(settled) > 1:
+            # Apply the good events before the failing one; it raises at that one
+            return sum(process(name, 1) for _ in settled)
+        if _record_failure(name, settled[0].id, e, now):
+            return 1  # moved aside; the consumer goes on
+        raise
+    return len(settled)
+
+
+def _record_failure(name, event_id, error, now):
+    """Count a failed attempt at one event. After the last one, dead-letter it, move past it and return True."""
+    state = _lock_state(name)
+    state.failures += 1
+    state.updated_at = now
+    if state.failures < Config.LEARNING_EVENT_MAX_ATTEMPTS:
+        state.last_error = f"event {event_id}, attempt {state.failures}: {error}"
+        db.session.commit()
+        return False
+    db.session.add(EventDeadLetter(consumer=name, event_id=event_id, error=str(error)))
+    state.position = event_id
+    state.failures = 0
+    state.last_error = f"event {event_id} dead-lettered after {Config.LEARNING_EVENT_MAX_ATTEMPTS} attempts: {error}"
+    db.session.commit()
+    print(f"Learning event consumer {name}: {state.last_error}")
+    return True
+
+
+def drain(name=None, batch_size=None):
+    """Process until the named consumer (or every consumer) is caught up. Returns events read."""
+    total = 0
+    for consumer_name in [name] if name else CONSUMERS:
+        while True:
+            n = process(consumer_name, batch_size)
+            if not n:
+                break
+            total += n
+    return total
+
+
+def run_worker(poll_interval=1.0, max_backoff=60):
+    print("Learning event consumers started. Press Ctrl+C to exit.")
+    retry_at = {}  # name -> (monotonic time of the next attempt, seconds waited last)
+    while True:
+        busy = False
+        for name in CONSUMERS:
+            if name in retry_at and time.monotonic() < retry_at[name][0]:
+                continue
+            try:
+                busy = process(name) > 0 or busy
+                retry_at.pop(name, None)
+            except Exception as e:
+                db.session.rollback()
+                wait = min(max_backoff, retry_at[name][1] * 2 if name in retry_at else poll_interval)
+                retry_at[name] = (time.monotonic() + wait, wait)
+                print(f"Learning event consumer {name} failed, retrying in {wait:.0f}s: {e}")
+        if not busy:
+            time.sleep(poll_interval)
+
+
+def replay(name):
+    """Empty a consumer's view and apply the whole log again."""
+    consumer = CONSUMERS[name]
+    if consumer.reset is None:
+        raise ValueError(f"{name} can't be replayed from the log")
+    state = _lock_state(name)
+    consumer.reset()
+    state.position = 0
+    state.events_applied = 0
+    state.failures = 0
+    state.last_error = None
+    db.session.commit()
+    started = time.perf_counter()
+    n = drain(name)
+    print(f"Replayed {n} events into {name} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def status():
+    """Each consumer's position, how many events it is behind and how many it dead-lettered."""
+    latest = db.session.query(func.max(LearningEvent.id)).scalar() or 0
+    states = {s.name: s for s in EventConsumer.query.all()}
+    dead = dict(db.session.query(EventDeadLetter.consumer, func.count(EventDeadLetter.id))
+                .group_by(EventDeadLetter.consumer))
+    result = []
+    for name in CONSUMERS:
+        state = states.get(name)
+        entry = state.to_dict() if state else {'name': name, 'position': 0, 'events_applied': 0, 'failures': 0,
+                                                'last_error': None, 'updated_at': None}
+        entry['lag'] = latest - entry['position']
+        entry['dead_letters'] = dead.get(name, 0)
+        result.append(entry)
+    return result
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 2 and sys.argv[1] == 'replay':
+            replay(sys.argv[2])
+        else:
+            run_worker()
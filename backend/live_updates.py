@@ -0,0 +1,258 @@
+"""
+Per-user live updates over Server-Sent Events.
+
+GET /live opens one SSE stream per browser tab. It first sends a `snapshot`
+event (streak and today's counts), then small deltas as they happen:
+
+  practice  today's counters after submit_practice commits
+  streak    current/longest streak changed (goal met, or reset by rollover)
+  habit     a habit was checked or unchecked (habit id, date, completed)
+
+The frontend's Dashboard.jsx (streaks, today's counts) and HabitTracker.jsx
+(done today, habit streaks, heatmap) apply these deltas to what they fetched
+from /dashboard/stats, /habits and /habits/heatmap on load, instead of
+fetching again. The 30-day accuracy and /analytics/summary are not pushed and
+refresh on the next load.
+
+Events are not stored: a client that reconnects gets a fresh snapshot instead
+of a replay. So the route subscribes first and only then reads the snapshot: an event
+published in between is queued for the stream rather than lost. Every delta
+carries absolute values, so one the snapshot already reflects is harmless.
+
+publish() is called after the commit and fans the event out to every
+subscriber of the user. LIVE_UPDATES_BACKEND picks how:
+  memory  in-process queues; only streams held by the same process see it
+  redis   Redis pub/sub through REDIS_URL, across workers and cron.py.
+          Each process keeps one connection and subscribes only to the
+          users that have a stream open on it.
+"""
+import json
+import queue
+import threading
+import time
+
+from config import Config
+
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments while idle
+QUEUE_SIZE = 100  # per stream; a stalled client loses its oldest events
+
+
+class Subscription:
+    def __init__(self, user_id, on_close):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._on_close = on_close
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(message)
+
+    def get(self, timeout):
+        """Next (event, data) or None after timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close(self)
+
+
+# --- IN-PROCESS BACKEND ---
+class MemoryBackend:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}  # user_id -> set of Subscription
+
+    def subscribe(self, user_id):
+        sub = Subscription(user_id, self._remove)
+        with self._lock:
+            self._subs.setdefault(user_id, set()).add(sub)
+        return sub
+
+    def _remove(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+
+    def _dispatch(self, user_id, message):
+        with self._lock:
+            subs = list(self._subs.get(user_id, ()))
+        for sub in subs:
+            sub.deliver(message)
+
+    def publish(self, user_id, event, data):
+        self._dispatch(user_id, (event, data))
+
+    def stream_count(self):
+        with self._lock:
+            return sum(len(s) for s in self._subs.values())
+
+
+# --- SHARED (REDIS) BACKEND ---
+class RedisBackend(MemoryBackend):
+    PREFIX = 'skillsprint:live:'
+    POLL_INTERVAL = 0.2  # how long the listener blocks before applying (un)subscribes
+    SUBSCRIBE_TIMEOUT = 2  # seconds subscribe() waits for Redis to confirm the channel
+
+    def __init__(self, url):
+        super().__init__()
+        import redis  # only needed for the shared backend
+        self._redis = redis.Redis.from_url(url)
+        self._changes = queue.Queue()  # ('subscribe' | 'unsubscribe', channel), applied by the listener
+        self._ready = {}  # channel -> threading.Event, set once Redis confirms the subscribe
+        self._listener = None
+
+    def _channel(self, user_id):
+        return f'{self.PREFIX}user:{user_id}'
+
+    def subscribe(self, user_id):
+        """Returns once Redis has confirmed the user's channel, so no later publish is missed."""
+        channel = self._channel(user_id)
+        sub = Subscription(user_id, self._remove)
+        with self._lock:
+            first = user_id not in self._subs
+            self._subs.setdefault(user_id, set()).add(sub)
+            if first:
+                self._ready[channel] = threading.Event()
+            ready = self._ready[channel]
+        if first:
+            self._changes.put(('subscribe', channel))
+        self._ensure_listener()
+        if not ready.wait(self.SUBSCRIBE_TIMEOUT):
+            print(f"Live updates: no subscribe confirmation for {channel} yet, streaming anyway")
+        return sub
+
+    def _remove(self, sub):
+        channel = self._channel(sub.user_id)
+        with self._lock:
+            subs = self._subs.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.user_id]
+            last = sub.user_id not in self._subs
+            if last:
+                self._ready.pop(channel, None)
+        if last:
+            self._changes.put(('unsubscribe', channel))
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='live-updates', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        """One thread per process owns the PubSub connection: it applies (un)subscribes and dispatches."""
+        while True:
+            try:
+                self._listen_once()
+            except Exception as e:
+                print(f"Live updates listener lost Redis, reconnecting: {e}")
+                time.sleep(1)
+
+    def _listen_once(self):
+        prefix = self.PREFIX + 'user:'
+        pubsub = self._redis.pubsub()  # subscribe confirmations release waiting subscribe() calls
+        try:
+            with self._lock:
+                channels = [self._channel(user_id) for user_id in self._subs]
+            if channels:
+                pubsub.subscribe(*channels)  # after a reconnect: everyone still streaming
+            while True:
+                try:
+                    while True:
+                        action, channel = self._changes.get_nowait()
+                        with self._lock:
+                            wanted = channel[len(prefix):] in self._subs
+                        if action == 'subscribe' and wanted:
+                            pubsub.subscribe(channel)
+                        elif action == 'unsubscribe' and not wanted and pubsub.subscribed:
+                            pubsub.unsubscribe(channel)
+                except queue.Empty:
+                    pass
+                if not pubsub.subscribed:
+                    time.sleep(self.POLL_INTERVAL)
+                    continue
+                message = pubsub.get_message(timeout=self.POLL_INTERVAL)
+                if not message:
+                    continue
+                if message['type'] == 'subscribe':
+                    with self._lock:
+                        ready = self._ready.get(message['channel'].decode())
+                    if ready is not None:
+                        ready.set()
+                elif message['type'] == 'message':
+                    event, data = json.loads(message['data'])
+                    self._dispatch(message['channel'].decode()[len(prefix):], (event, data))
+        finally:
+            pubsub.close()
+
+    def publish(self, user_id, event, data):
+        self._redis.publish(self._channel(user_id), json.dumps([event, data]))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = RedisBackend(Config.REDIS_URL) if Config.LIVE_UPDATES_BACKEND == 'redis' else MemoryBackend()
+    return _backend
+
+
+# --- PUBLIC API ---
+def publish(user_id, event, data):
+    """Push an event to the user's open streams. Call after the commit; never raises."""
+    try:
+        backend().publish(user_id, event, data)
+    except Exception as e:
+        print(f"Live update {event} for {user_id} not sent: {e}")
+
+
+def publish_streak_resets(user_ids):
+    for user_id in user_ids:
+        publish(user_id, 'streak', {'current_streak': 0})
+
+
+def subscribe(user_id):
+    """Start receiving the user's events; take the snapshot after this returns."""
+    return backend().subscribe(user_id)
+
+
+def _sse(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def sse_stream(sub, snapshot):
+    """Yield SSE frames for a subscription until the client leaves or LIVE_STREAM_MAX_SECONDS pass."""
+    deadline = time.monotonic() + Config.LIVE_STREAM_MAX_SECONDS
+    event_id = 1
+    try:
+        yield "retry: 3000\n" + _sse(event_id, 'snapshot', snapshot)
+        while time.monotonic() < deadline:
+            message = sub.get(min(KEEPALIVE_INTERVAL, max(0.0, deadline - time.monotonic())))
+            if message is None:
+                yield ": keepalive\n\n"
+                continue
+            event_id += 1
+            yield _sse(event_id, *message)
+        # EventSource reconnects on its own and gets a fresh snapshot
+    finally:
+        sub.close()
@@ -0,0 +1,310 @@
+"""Baseline: create the schema, or bring a db.create_all() database up to date
+
+The tables are spelled out as they stood at this revision, so later revisions
+apply on top of them and this file never changes with models.py.
+
+Before migrations existed the schema only came from db.create_all(), which
+creates missing tables but never alters existing ones. On such a database this
+revision creates the missing tables and applies the in-place changes that
+create_all skipped:
+
+- daily_logs: one row per (user_id, date); duplicates are merged first
+- user_skill_progress: one row per (user_id, skill_id) and a mastery_points column
+- users.stripe_customer_id index
+
+Every step checks the live schema first, so it is safe on both old and fresh databases.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _inspector():
+    return sa.inspect(op.get_bind())
+
+
+def _has_index(table, name):
+    insp = _inspector()
+    return any(i['name'] == name for i in insp.get_indexes(table)) or \
+        any(u['name'] == name for u in insp.get_unique_constraints(table))
+
+
+def _has_column(table, column):
+    return any(c['name'] == column for c in _inspector().get_columns(table))
+
+
+def _create_unique_index(table, name, columns):
+    """The uq_ keys are unique indexes, as in models.py. A database created by
+    db.create_all() before this revision may have them as named UNIQUE
+    constraints, which only SQLite reports differently; rebuild those."""
+    insp = _inspector()
+    if any(i['name'] == name for i in insp.get_indexes(table)):
+        return
+    if any(u['name'] == name for u in insp.get_unique_constraints(table)):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
+    op.create_index(name, table, columns, unique=True)
+
+
+def _drop_index_if_exists(table, name):
+    if any(i['name'] == name for i in _inspector().get_indexes(table)):
+        op.drop_index(name, table_name=table)
+
+
+def _create_baseline_tables():
+    """The schema as it stood at this revision, for tables the database doesn't have yet."""
+    existing = set(_inspector().get_table_names())
+
+    if 'users' not in existing:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.String(36), primary_key=True),
+            sa.Column('email', sa.String(120), nullable=False),
+            sa.Column('password_hash', sa.String(255), nullable=False),
+            sa.Column('current_streak', sa.Integer(), nullable=True),
+            sa.Column('longest_streak', sa.Integer(), nullable=True),
+            sa.Column('timezone', sa.String(50), nullable=True),
+            sa.Column('is_pro', sa.Boolean(), nullable=True),
+            sa.Column('stripe_customer_id', sa.String(255), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_users_email', 'users', ['email'], unique=True)
+        op.create_index('ix_users_stripe_customer_id', 'users', ['stripe_customer_id'])
+    if 'questions' not in existing:
+        op.create_table(
+            'questions',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('topic', sa.String(50), nullable=False),
+            sa.Column('difficulty', sa.String(20), nullable=False),
+            sa.Column('question_text', sa.Text(), nullable=False),
+            sa.Column('options', sa.JSON(), nullable=False),
+            sa.Column('correct_option', sa.String(10), nullable=False),
+            sa.Column('explanation', sa.Text(), nullable=True),
+        )
+        op.create_index('ix_questions_topic', 'questions', ['topic'])
+        op.create_index('ix_questions_difficulty', 'questions', ['difficulty'])
+    if 'skills' not in existing:
+        op.create_table(
+            'skills',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('name', sa.String(100), nullable=False, unique=True),
+            sa.Column('icon', sa.String(50), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+        )
+    if 'job_runs' not in existing:
+        op.create_table(
+            'job_runs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('job_name', sa.String(50), nullable=False),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('started_at', sa.DateTime(), nullable=True),
+            sa.Column('finished_at', sa.DateTime(), nullable=True),
+            sa.Column('duration_ms', sa.Integer(), nullable=True),
+            sa.Column('rows_examined', sa.Integer(), nullable=True),
+            sa.Column('rows_affected', sa.Integer(), nullable=True),
+            sa.Column('error', sa.Text(), nullable=True),
+        )
+        op.create_index('idx_job_runs_name_started', 'job_runs', ['job_name', 'started_at'])
+    if 'stripe_events' not in existing:
+        op.create_table(
+            'stripe_events',
+            sa.Column('id', sa.String(255), primary_key=True),
+            sa.Column('type', sa.String(100), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('stripe_created', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(20), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('claimed_by', sa.String(36), nullable=True),
+            sa.Column('claimed_at', sa.DateTime(), nullable=True),
+            sa.Column('received_at', sa.DateTime(), nullable=True),
+            sa.Column('processed_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('idx_stripe_status_created', 'stripe_events', ['status', 'stripe_created'])
+    if 'user_goals' not in existing:
+        op.create_table(
+            'user_goals',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('topic', sa.String(50), nullable=False),
+            sa.Column('difficulty', sa.String(20), nullable=False),
+            sa.Column('daily_question_target', sa.Integer(), nullable=True),
+        )
+    if 'daily_logs' not in existing:
+        op.create_table(
+            'daily_logs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('questions_attempted', sa.Integer(), nullable=True),
+            sa.Column('questions_correct', sa.Integer(), nullable=True),
+            sa.Column('streak_maintained', sa.Boolean(), nullable=True),
+        )
+        op.create_index('ix_daily_logs_user_id', 'daily_logs', ['user_id'])
+        op.create_index('ix_daily_logs_date', 'daily_logs', ['date'])
+    if 'habits' not in existing:
+        op.create_table(
+            'habits',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('name', sa.String(100), nullable=False),
+            sa.Column('frequency', sa.String(20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_habits_user_id', 'habits', ['user_id'])
+    if 'habit_logs' not in existing:
+        op.create_table(
+            'habit_logs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('habit_id', sa.Integer(), sa.ForeignKey('habits.id'), nullable=False),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('completed', sa.Boolean(), nullable=True),
+        )
+        op.create_index('ix_habit_logs_habit_id', 'habit_logs', ['habit_id'])
+        op.create_index('ix_habit_logs_user_id', 'habit_logs', ['user_id'])
+    if 'topics' not in existing:
+        op.create_table(
+            'topics',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('skill_id', sa.Integer(), sa.ForeignKey('skills.id'), nullable=False),
+            sa.Column('name', sa.String(100), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('order', sa.Integer(), nullable=True),
+        )
+        op.create_index('ix_topics_skill_id', 'topics', ['skill_id'])
+    if 'user_skill_progress' not in existing:
+        op.create_table(
+            'user_skill_progress',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('skill_id', sa.Integer(), sa.ForeignKey('skills.id'), nullable=False),
+            sa.Column('completion_pct', sa.Float(), nullable=True),
+            sa.Column('topics_done', sa.Integer(), nullable=True),
+            sa.Column('mastery_points', sa.Integer(), nullable=True, server_default='0'),
+        )
+        op.create_index('ix_user_skill_progress_user_id', 'user_skill_progress', ['user_id'])
+        op.create_index('ix_user_skill_progress_skill_id', 'user_skill_progress', ['skill_id'])
+    if 'user_topic_mastery' not in existing:
+        op.create_table(
+            'user_topic_mastery',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('topic_id', sa.Integer(), sa.ForeignKey('topics.id'), nullable=False),
+            sa.Column('skill_id', sa.Integer(), sa.ForeignKey('skills.id'), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('correct', sa.Integer(), nullable=True),
+            sa.UniqueConstraint('user_id', 'topic_id', name='uq_topic_mastery_user_topic'),
+        )
+        op.create_index('ix_user_topic_mastery_topic_id', 'user_topic_mastery', ['topic_id'])
+        op.create_index('idx_topic_mastery_user_skill', 'user_topic_mastery', ['user_id', 'skill_id'])
+    if 'user_attempts' not in existing:
+        op.create_table(
+            'user_attempts',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('question_id', sa.Integer(), sa.ForeignKey('questions.id'), nullable=False),
+            sa.Column('is_correct', sa.Boolean(), nullable=True),
+            sa.Column('time_taken', sa.Integer(), nullable=True),
+            sa.Column('attempted_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_user_attempts_user_id', 'user_attempts', ['user_id'])
+        op.create_index('ix_user_attempts_question_id', 'user_attempts', ['question_id'])
+    if 'attempt_rollups' not in existing:
+        op.create_table(
+            'attempt_rollups',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('question_id', sa.Integer(), sa.ForeignKey('questions.id'), nullable=False),
+            sa.Column('attempts', sa.Integer(), nullable=True),
+            sa.Column('correct', sa.Integer(), nullable=True),
+            sa.Column('total_time', sa.Integer(), nullable=True),
+            sa.Column('first_attempted_at', sa.DateTime(), nullable=True),
+            sa.Column('last_attempted_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('user_id', 'question_id', name='uq_rollup_user_question'),
+        )
+        op.create_index('ix_attempt_rollups_question_id', 'attempt_rollups', ['question_id'])
+    if 'question_search_docs' not in existing:
+        # The MySQL FULLTEXT index on body is created by search.ensure_index()
+        op.create_table(
+            'question_search_docs',
+            sa.Column('question_id', sa.Integer(), sa.ForeignKey('questions.id'), primary_key=True, autoincrement=False),
+            sa.Column('topic', sa.String(50), nullable=False),
+            sa.Column('difficulty', sa.String(20), nullable=False),
+            sa.Column('body', sa.Text(), nullable=False),
+        )
+    if 'sprint_packs' not in existing:
+        op.create_table(
+            'sprint_packs',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('date', sa.Date(), nullable=False),
+            sa.Column('topic', sa.String(50), nullable=False),
+            sa.Column('difficulty', sa.String(20), nullable=False),
+            sa.Column('question_count', sa.Integer(), nullable=False),
+            sa.Column('question_ids', sa.JSON(), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('source', sa.String(20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.UniqueConstraint('user_id', 'date', name='uq_sprint_pack_user_date'),
+        )
+        op.create_index('idx_sprint_pack_date', 'sprint_packs', ['date'])
+
+
+BASELINE_TABLES = [  # dependency order
+    'users', 'questions', 'skills', 'job_runs', 'stripe_events', 'user_goals', 'daily_logs', 'habits',
+    'habit_logs', 'topics', 'user_skill_progress', 'user_topic_mastery', 'user_attempts', 'attempt_rollups',
+    'question_search_docs', 'sprint_packs',
+]
+
+
+def upgrade():
+    # Fresh database: every table; old db.create_all() database: the ones added since
+    _create_baseline_tables()
+
+    # daily_logs: merge duplicate days left by the old read-modify-write submit
+    bind = op.get_bind()
+    duplicates = bind.execute(sa.text("""
+        SELECT user_id, date, MIN(id), SUM(questions_attempted), SUM(questions_correct), MAX(streak_maintained)
+        FROM daily_logs GROUP BY user_id, date HAVING COUNT(*) > 1
+    """)).fetchall()
+    for user_id, day, keep_id, attempted, correct, maintained in duplicates:
+        bind.execute(sa.text(
+            "UPDATE daily_logs SET questions_attempted = :a, questions_correct = :c, streak_maintained = :m WHERE id = :id"
+        ), {'a': attempted, 'c': correct, 'm': maintained, 'id': keep_id})
+        bind.execute(sa.text(
+            "DELETE FROM daily_logs WHERE user_id = :u AND date = :d AND id <> :id"
+        ), {'u': user_id, 'd': day, 'id': keep_id})
+    _create_unique_index('daily_logs', 'uq_daily_log_user_date', ['user_id', 'date'])
+    _drop_index_if_exists('daily_logs', 'idx_user_date')
+
+    # user_skill_progress: keep the first row per user and skill; values are
+    # re-derived by `python skill_progress.py rebuild`
+    if not _has_column('user_skill_progress', 'mastery_points'):
+        op.add_column('user_skill_progress', sa.Column('mastery_points', sa.Integer(), nullable=True, server_default='0'))
+    op.execute("""
+        DELETE FROM user_skill_progress WHERE id NOT IN (SELECT keep_id FROM (
+            SELECT MIN(id) AS keep_id FROM user_skill_progress GROUP BY user_id, skill_id
+        ) keep)
+    """)
+    _create_unique_index('user_skill_progress', 'uq_skill_progress_user_skill', ['user_id', 'skill_id'])
+
+    if not _has_index('users', 'ix_users_stripe_customer_id'):
+        op.create_index('ix_users_stripe_customer_id', 'users', ['stripe_customer_id'])
+
+
+def downgrade():
+    # Back to an empty database; merged and deleted duplicate rows cannot be restored
+    for table in reversed(BASELINE_TABLES):
+        op.drop_table(table)
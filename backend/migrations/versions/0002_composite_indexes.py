@@ -0,0 +1,92 @@
+"""Composite indexes for the hot route queries
+
+Found by explain_check.py:
+
+- questions (topic, difficulty) replaces the two single-column indexes
+- habit_logs: unique (habit_id, user_id, date) for the done-today/streak
+  lookups and the log toggle, plus (user_id, date) for the heatmap;
+  duplicates are dropped first
+- user_attempts (user_id, attempted_at) for per-user history, and
+  (attempted_at) for the archive cutoff
+- user_goals (user_id): every goal lookup was a full scan
+
+Single-column indexes that became a prefix of a new one are dropped.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 12:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _create_index(name, table, columns, unique=False):
+    insp = sa.inspect(op.get_bind())
+    if any(i['name'] == name for i in insp.get_indexes(table)):
+        return
+    if any(u['name'] == name for u in insp.get_unique_constraints(table)):
+        # A named UNIQUE constraint from db.create_all() (SQLite only reports
+        # it apart from indexes); models.py declares the uq_ keys as unique indexes
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='unique')
+    op.create_index(name, table, columns, unique=unique)
+
+
+def _drop_index(name, table):
+    # New indexes are created before old ones are dropped, so MySQL always
+    # has an index left for the foreign key
+    if any(i['name'] == name for i in sa.inspect(op.get_bind()).get_indexes(table)):
+        op.drop_index(name, table_name=table)
+
+
+def upgrade():
+    _create_index('idx_question_topic_difficulty', 'questions', ['topic', 'difficulty'])
+    _drop_index('ix_questions_topic', 'questions')
+    _drop_index('ix_questions_difficulty', 'questions')
+
+    op.execute("""
+        DELETE FROM habit_logs WHERE id NOT IN (SELECT keep_id FROM (
+            SELECT MIN(id) AS keep_id FROM habit_logs GROUP BY habit_id, user_id, date
+        ) keep)
+    """)
+    _create_index('uq_habit_log_habit_user_date', 'habit_logs', ['habit_id', 'user_id', 'date'], unique=True)
+    _create_index('idx_habit_log_user_date', 'habit_logs', ['user_id', 'date'])
+    _drop_index('ix_habit_logs_habit_id', 'habit_logs')
+    _drop_index('ix_habit_logs_user_id', 'habit_logs')
+
+    _create_index('idx_attempt_user_time', 'user_attempts', ['user_id', 'attempted_at'])
+    _create_index('idx_attempt_time', 'user_attempts', ['attempted_at'])
+    _drop_index('ix_user_attempts_user_id', 'user_attempts')
+
+    _create_index('ix_user_goals_user_id', 'user_goals', ['user_id'])
+
+    # Prefixes of the unique keys added in 0001
+    _drop_index('ix_daily_logs_user_id', 'daily_logs')
+    _drop_index('ix_user_skill_progress_user_id', 'user_skill_progress')
+
+
+def downgrade():
+    _drop_index('ix_user_goals_user_id', 'user_goals')
+    _create_index('ix_user_skill_progress_user_id', 'user_skill_progress', ['user_id'])
+    _create_index('ix_daily_logs_user_id', 'daily_logs', ['user_id'])
+
+    _create_index('ix_user_attempts_user_id', 'user_attempts', ['user_id'])
+    _drop_index('idx_attempt_time', 'user_attempts')
+    _drop_index('idx_attempt_user_time', 'user_attempts')
+
+    _create_index('ix_habit_logs_user_id', 'habit_logs', ['user_id'])
+    _create_index('ix_habit_logs_habit_id', 'habit_logs', ['habit_id'])
+    _drop_index('idx_habit_log_user_date', 'habit_logs')
+    _drop_index('uq_habit_log_habit_user_date', 'habit_logs')
+
+    _create_index('ix_questions_difficulty', 'questions', ['difficulty'])
+    _create_index('ix_questions_topic', 'questions', ['topic'])
+    _drop_index('idx_question_topic_difficulty', 'questions')
@@ -0,0 +1,36 @@
+"""deleted_at marks for deferred deletion of users, habits and skills
+
+See deletions.py.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 14:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+TABLES = ['users', 'habits', 'skills']
+
+
+def upgrade():
+    insp = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if not any(c['name'] == 'deleted_at' for c in insp.get_columns(table)):
+            op.add_column(table, sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        if not any(i['name'] == f'ix_{table}_deleted_at' for i in insp.get_indexes(table)):
+            op.create_index(f'ix_{table}_deleted_at', table, ['deleted_at'])
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(f'ix_{table}_deleted_at', table_name=table)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('deleted_at')
@@ -0,0 +1,39 @@
+"""analytics_reports: daily cache of the admin platform reports
+
+See cohort_analytics.py.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('analytics_reports'):
+        return  # created by db.create_all() on a fresh database
+    op.create_table(
+        'analytics_reports',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('name', sa.String(50), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('payload', sa.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=False),
+        sa.Column('rows_scanned', sa.Integer(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.UniqueConstraint('name', 'day', name='uq_analytics_report_name_day'),
+    )
+
+
+def downgrade():
+    op.drop_table('analytics_reports')
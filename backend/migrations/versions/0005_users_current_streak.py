@@ -0,0 +1,27 @@
+"""users.current_streak index for loading the streak leaderboard
+
+See leaderboard.py.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 16:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not any(i['name'] == 'ix_users_current_streak' for i in sa.inspect(op.get_bind()).get_indexes('users')):
+        op.create_index('ix_users_current_streak', 'users', ['current_streak'])
+
+
+def downgrade():
+    op.drop_index('ix_users_current_streak', table_name='users')
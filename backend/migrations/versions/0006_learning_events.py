@@ -0,0 +1,56 @@
+"""learning_events log, event_consumers positions and the question_stats view
+
+See learning_events.py.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())  # tables already there were created by db.create_all()
+    if not inspector.has_table('learning_events'):
+        op.create_table(
+            'learning_events',
+            sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), nullable=False),
+            sa.Column('type', sa.String(20), nullable=False),
+            sa.Column('payload', sa.Text(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_learning_events_user_id', 'learning_events', ['user_id'])
+    if not inspector.has_table('event_consumers'):
+        op.create_table(
+            'event_consumers',
+            sa.Column('name', sa.String(50), primary_key=True),
+            sa.Column('position', sa.BigInteger(), nullable=False),
+            sa.Column('events_applied', sa.BigInteger(), nullable=False),
+            sa.Column('last_error', sa.Text(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+        )
+    if not inspector.has_table('question_stats'):
+        op.create_table(
+            'question_stats',
+            sa.Column('question_id', sa.Integer(), primary_key=True, autoincrement=False),
+            sa.Column('attempts', sa.Integer(), nullable=False),
+            sa.Column('correct', sa.Integer(), nullable=False),
+            sa.Column('total_time', sa.Integer(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table('question_stats')
+    op.drop_table('event_consumers')
+    op.drop_index('ix_learning_events_user_id', table_name='learning_events')
+    op.drop_table('learning_events')
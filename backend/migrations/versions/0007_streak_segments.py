@@ -0,0 +1,37 @@
+"""streak_segments: runs of consecutive goal-met days per user
+
+See streak_segments.py. Backfill with `python streak_segments.py rebuild`.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())  # tables already there were created by db.create_all()
+    if not inspector.has_table('streak_segments'):
+        op.create_table(
+            'streak_segments',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('user_id', sa.String(36), sa.ForeignKey('users.id'), nullable=False),
+            sa.Column('start_date', sa.Date(), nullable=False),
+            sa.Column('end_date', sa.Date(), nullable=False),
+            sa.UniqueConstraint('user_id', 'start_date', name='uq_streak_segment_user_start'),
+        )
+        op.create_index('idx_streak_segment_user_end', 'streak_segments', ['user_id', 'end_date'])
+
+
+def downgrade():
+    op.drop_index('idx_streak_segment_user_end', table_name='streak_segments')
+    op.drop_table('streak_segments')
@@ -0,0 +1,42 @@
+"""event_consumers.failures and event_dead_letters for learning events that keep failing
+
+See learning_events.py.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())  # tables already there were created by db.create_all()
+    if 'failures' not in {c['name'] for c in inspector.get_columns('event_consumers')}:
+        with op.batch_alter_table('event_consumers') as batch_op:
+            batch_op.add_column(sa.Column('failures', sa.Integer(), nullable=False, server_default='0'))
+    if not inspector.has_table('event_dead_letters'):
+        op.create_table(
+            'event_dead_letters',
+            sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column('consumer', sa.String(50), nullable=False),
+            sa.Column('event_id', sa.BigInteger(), nullable=False),
+            sa.Column('error', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+        )
+        op.create_index('ix_event_dead_letters_consumer', 'event_dead_letters', ['consumer'])
+
+
+def downgrade():
+    op.drop_index('ix_event_dead_letters_consumer', table_name='event_dead_letters')
+    op.drop_table('event_dead_letters')
+    with op.batch_alter_table('event_consumers') as batch_op:
+        batch_op.drop_column('failures')
@@ -1,8 +1,9 @@
 from datetime import datetime, timezone
 import uuid
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects import mysql
 from app import db
 import json
+import passwords
 
 def get_uuid():
     return str(uuid.uuid4())
@@ -12,21 +13,23 @@ class User(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=get_uuid)
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    current_streak = db.Column(db.Integer, default=0)
+    current_streak = db.Column(db.Integer, default=0, index=True)  # leaderboard.py loads streaks > 0
     longest_streak = db.Column(db.Integer, default=0)
     timezone = db.Column(db.String(50), default='UTC')
     is_pro = db.Column(db.Boolean, default=False)
-    stripe_customer_id = db.Column(db.String(255), nullable=True)
+    stripe_customer_id = db.Column(db.String(255), nullable=True, index=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    # Set by DELETE /users/me; deletions.py removes the account's rows in the background
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)
 
     goals = db.relationship('UserGoal', backref='user', lazy=True, cascade='all, delete-orphan')
     logs = db.relationship('DailyLog', backref='user', lazy=True, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.verify_password(self.password_hash, password)
         
     def to_dict(self):
         return {
@@ -42,7 +45,7 @@ class User(db.Model):
 class UserGoal(db.Model):
     __tablename__ = 'user_goals'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
     topic = db.Column(db.String(50), nullable=False)
     difficulty = db.Column(db.String(20), nullable=False, default='beginner')
     daily_question_target = db.Column(db.Integer, default=5)
@@ -58,12 +61,17 @@ class UserGoal(db.Model):
 class Question(db.Model):
     __tablename__ = 'questions'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    topic = db.Column(db.String(50), nullable=False, index=True)
-    difficulty = db.Column(db.String(20), nullable=False, index=True)
+    topic = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False)
     question_text = db.Column(db.Text, nullable=False)
     options = db.Column(db.JSON, nullable=False) # e.g. {"A": "ans1", "B": "ans2"}
     correct_option = db.Column(db.String(10), nullable=False) # 'A', 'B', etc.
     explanation = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        # Every practice lookup filters on both
+        db.Index('idx_question_topic_difficulty', 'topic', 'difficulty'),
+    )
     
     def to_dict(self):
         # We don't send correct_option and explanation directly to the user when playing
@@ -78,14 +86,16 @@ class Question(db.Model):
 class DailyLog(db.Model):
     __tablename__ = 'daily_logs'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     date = db.Column(db.Date, nullable=False, index=True)
     questions_attempted = db.Column(db.Integer, default=0)
     questions_correct = db.Column(db.Integer, default=0)
     streak_maintained = db.Column(db.Boolean, default=False)
     
     __table_args__ = (
-        db.Index('idx_user_date', 'user_id', 'date'),  # Composite index for common queries
+        # One row per user per day; also the key daily_counters.py upserts against.
+        # A unique index, as migrations 0001/0002 create the uq_ keys on existing tables
+        db.Index('uq_daily_log_user_date', 'user_id', 'date', unique=True),
     )
     
     def to_dict(self):
@@ -96,6 +106,31 @@ class DailyLog(db.Model):
             'streak_maintained': self.streak_maintained
         }
 
+class StreakSegment(db.Model):
+    """A run of consecutive goal-met days (DailyLog.streak_maintained) of one user; see streak_segments.py"""
+    __tablename__ = 'streak_segments'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)  # inclusive
+
+    __table_args__ = (
+        # Runs never overlap, so each is found by seeking either end
+        db.UniqueConstraint('user_id', 'start_date', name='uq_streak_segment_user_start'),
+        db.Index('idx_streak_segment_user_end', 'user_id', 'end_date'),
+    )
+
+    @property
+    def length(self):
+        return (self.end_date - self.start_date).days + 1
+
+    def to_dict(self):
+        return {
+            'start_date': self.start_date.isoformat(),
+            'end_date': self.end_date.isoformat(),
+            'length': self.length
+        }
+
 class Habit(db.Model):
     __tablename__ = 'habits'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
@@ -103,6 +138,7 @@ class Habit(db.Model):
     name = db.Column(db.String(100), nullable=False)
     frequency = db.Column(db.String(20), default='daily')  # daily, weekly
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)  # pending purge by deletions.py
 
     logs = db.relationship('HabitLog', backref='habit', lazy=True, cascade='all, delete-orphan')
 
@@ -117,11 +153,17 @@ class Habit(db.Model):
 class HabitLog(db.Model):
     __tablename__ = 'habit_logs'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), nullable=False, index=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    habit_id = db.Column(db.Integer, db.ForeignKey('habits.id'), nullable=False)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     date = db.Column(db.Date, nullable=False)
     completed = db.Column(db.Boolean, default=True)
 
+    __table_args__ = (
+        # Logging toggles one row per habit per day
+        db.Index('uq_habit_log_habit_user_date', 'habit_id', 'user_id', 'date', unique=True),
+        db.Index('idx_habit_log_user_date', 'user_id', 'date'),  # heatmap
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -136,6 +178,7 @@ class Skill(db.Model):
     name = db.Column(db.String(100), nullable=False, unique=True)
     icon = db.Column(db.String(50), default='BookOpen')
     description = db.Column(db.Text, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True, index=True)  # pending purge by deletions.py
 
     topics = db.relationship('Topic', backref='skill', lazy=True, cascade='all, delete-orphan')
 
@@ -168,10 +211,16 @@ class Topic(db.Model):
 class UserSkillProgress(db.Model):
     __tablename__ = 'user_skill_progress'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     skill_id = db.Column(db.Integer, db.ForeignKey('skills.id'), nullable=False, index=True)
     completion_pct = db.Column(db.Float, default=0.0)
     topics_done = db.Column(db.Integer, default=0)
+    # Sum over topics of min(correct answers, SKILL_MASTERY_CORRECT); maintained by skill_progress.py
+    mastery_points = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.Index('uq_skill_progress_user_skill', 'user_id', 'skill_id', unique=True),
+    )
 
     def to_dict(self):
         return {
@@ -182,15 +231,43 @@ class UserSkillProgress(db.Model):
             'topics_done': self.topics_done
         }
 
+class UserTopicMastery(db.Model):
+    """Per-user practice counters for one Topic, updated by skill_progress.py on every submit"""
+    __tablename__ = 'user_topic_mastery'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    topic_id = db.Column(db.Integer, db.ForeignKey('topics.id'), nullable=False, index=True)
+    skill_id = db.Column(db.Integer, db.ForeignKey('skills.id'), nullable=False)
+    attempts = db.Column(db.Integer, default=0)
+    correct = db.Column(db.Integer, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'topic_id', name='uq_topic_mastery_user_topic'),
+        db.Index('idx_topic_mastery_user_skill', 'user_id', 'skill_id'),
+    )
+
+    def to_dict(self):
+        return {
+            'topic_id': self.topic_id,
+            'skill_id': self.skill_id,
+            'attempts': self.attempts,
+            'correct': self.correct
+        }
+
 class UserAttempt(db.Model):
     __tablename__ = 'user_attempts'
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False, index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False, index=True)
     is_correct = db.Column(db.Boolean, default=False)
     time_taken = db.Column(db.Integer, default=0)  # seconds
     attempted_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
 
+    __table_args__ = (
+        db.Index('idx_attempt_user_time', 'user_id', 'attempted_at'),
+        db.Index('idx_attempt_time', 'attempted_at'),  # archive.py's age cutoff
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -199,3 +276,226 @@ class UserAttempt(db.Model):
             'time_taken': self.time_taken,
             'attempted_at': self.attempted_at.isoformat()
         }
+
+class AttemptRollup(db.Model):
+    __tablename__ = 'attempt_rollups'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), nullable=False, index=True)
+    attempts = db.Column(db.Integer, default=0)
+    correct = db.Column(db.Integer, default=0)
+    total_time = db.Column(db.Integer, default=0)  # seconds
+    first_attempted_at = db.Column(db.DateTime, nullable=True)
+    last_attempted_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'question_id', name='uq_rollup_user_question'),
+    )
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'question_id': self.question_id,
+            'attempts': self.attempts,
+            'correct': self.correct,
+            'total_time': self.total_time,
+            'first_attempted_at': self.first_attempted_at.isoformat() if self.first_attempted_at else None,
+            'last_attempted_at': self.last_attempted_at.isoformat() if self.last_attempted_at else None
+        }
+
+class StripeEvent(db.Model):
+    """Webhook inbox: one row per Stripe event id, processed by stripe_inbox.py"""
+    __tablename__ = 'stripe_events'
+    id = db.Column(db.String(255), primary_key=True)  # Stripe event id, e.g. evt_...
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    stripe_created = db.Column(db.Integer, nullable=True)  # unix timestamp from Stripe
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, processing, processed, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    claimed_by = db.Column(db.String(36), nullable=True)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    received_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_stripe_status_created', 'status', 'stripe_created'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'type': self.type,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'received_at': self.received_at.isoformat() if self.received_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
+
+class JobRun(db.Model):
+    """One row per execution of a batch job, for monitoring and post-crash checks"""
+    __tablename__ = 'job_runs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    job_name = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='running')  # running, success, failed
+    started_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    finished_at = db.Column(db.DateTime, nullable=True)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    rows_examined = db.Column(db.Integer, default=0)
+    rows_affected = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('idx_job_runs_name_started', 'job_name', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_name': self.job_name,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'rows_examined': self.rows_examined,
+            'rows_affected': self.rows_affected,
+            'error': self.error
+        }
+
+class QuestionSearchDoc(db.Model):
+    """Flattened searchable text of a question, maintained by search.py on insert"""
+    __tablename__ = 'question_search_docs'
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True, autoincrement=False)
+    topic = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False)
+    body = db.Column(db.Text, nullable=False)  # question_text + option texts + explanation
+
+    __table_args__ = (
+        db.Index('ft_question_search_body', 'body', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+    )
+
+class SprintPack(db.Model):
+    """A user's daily practice set for one local date, built ahead of time by sprint_packs.py"""
+    __tablename__ = 'sprint_packs'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)  # in the user's timezone
+    topic = db.Column(db.String(50), nullable=False)
+    difficulty = db.Column(db.String(20), nullable=False)
+    question_count = db.Column(db.Integer, nullable=False)  # the goal's target when built
+    question_ids = db.Column(db.JSON, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # encoded JSON array of Question.to_dict()
+    source = db.Column(db.String(20), nullable=True)  # db, gemini, builtin, mixed
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='uq_sprint_pack_user_date'),
+        db.Index('idx_sprint_pack_date', 'date'),
+    )
+
+    def to_dict(self):
+        return {
+            'date': self.date.isoformat(),
+            'topic': self.topic,
+            'difficulty': self.difficulty,
+            'question_ids': self.question_ids,
+            'source': self.source,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class AnalyticsReport(db.Model):
+    """A platform analytics report computed by cohort_analytics.py, cached for one UTC day"""
+    __tablename__ = 'analytics_reports'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(50), nullable=False)  # retention, topics, streaks
+    day = db.Column(db.Date, nullable=False)
+    payload = db.Column(db.Text().with_variant(mysql.MEDIUMTEXT(), 'mysql'), nullable=False)  # encoded JSON
+    rows_scanned = db.Column(db.Integer, default=0)
+    duration_ms = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        db.UniqueConstraint('name', 'day', name='uq_analytics_report_name_day'),
+    )
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'day': self.day.isoformat(),
+            'rows_scanned': self.rows_scanned,
+            'duration_ms': self.duration_ms,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class LearningEvent(db.Model):
+    """Append-only log of learning activity, written in the request's transaction; see learning_events.py"""
+    __tablename__ = 'learning_events'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    user_id = db.Column(db.String(36), nullable=False, index=True)  # purged with the user by deletions.py
+    type = db.Column(db.String(20), nullable=False)  # attempts, goal_met, habit
+    payload = db.Column(db.Text, nullable=False)  # compact JSON
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'type': self.type,
+            'payload': self.payload,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class EventConsumer(db.Model):
+    """How far one learning_events consumer has read"""
+    __tablename__ = 'event_consumers'
+    name = db.Column(db.String(50), primary_key=True)
+    position = db.Column(db.BigInteger, nullable=False, default=0)  # last event id applied
+    events_applied = db.Column(db.BigInteger, nullable=False, default=0)
+    failures = db.Column(db.Integer, nullable=False, default=0)  # failed attempts at the event after position
+    last_error = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=True)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'position': self.position,
+            'events_applied': self.events_applied,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class EventDeadLetter(db.Model):
+    """A learning event a consumer skipped after LEARNING_EVENT_MAX_ATTEMPTS failures"""
+    __tablename__ = 'event_dead_letters'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    consumer = db.Column(db.String(50), nullable=False, index=True)
+    event_id = db.Column(db.BigInteger, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        return {
+            'consumer': self.consumer,
+            'event_id': self.event_id,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class QuestionStat(db.Model):
+    """Per-question answer totals, maintained from learning_events"""
+    __tablename__ = 'question_stats'
+    question_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    correct = db.Column(db.Integer, nullable=False, default=0)
+    total_time = db.Column(db.Integer, nullable=False, default=0)  # seconds
+
+    def to_dict(self):
+        return {
+            'question_id': self.question_id,
+            'attempts': self.attempts,
+            'correct': self.correct,
+            'accuracy': round(self.correct * 100.0 / self.attempts, 1) if self.attempts else None,
+            'avg_time': round(self.total_time / self.attempts, 1) if self.attempts else None
+        }
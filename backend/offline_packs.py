@@ -0,0 +1,103 @@
+"""
+Offline question packs.
+
+A pack is every question of one (topic, difficulty), as the public JSON
+(Question.to_dict(): no answers or explanations). The client downloads it
+once, practices from it locally and only calls the server to grade:
+
+    GET /practice/pack?topic=Python&difficulty=beginner             full pack
+    GET /practice/pack?topic=Python&difficulty=beginner&since=812   delta
+
+Questions are only ever added, so a pack's version is its highest question
+id at or below question_cache.settled_id(), and the delta since version v is
+every question with id > v. A slow transaction can commit a lower id after a
+higher one, but never below the settled id, so no question is skipped. A
+delta can repeat questions the client already has: clients merge by id. The
+response always carries the pool's current version and count: a client whose
+count doesn't match after merging a delta (a question was removed) downloads
+the full pack again.
+
+Full packs are built from question_cache's pools, gzip-compressed once per
+version and kept per process, up to the OFFLINE_PACKS_MAX most recently
+served. They are served with an ETag so an unchanged pack is a 304. A topic
+and difficulty without questions is a 404 and builds nothing. Deltas are small and are joined from serializers' cached
+fragments on each request.
+"""
+import gzip
+import threading
+from collections import OrderedDict
+
+from flask import Response, jsonify
+
+from config import Config
+import question_cache
+import serializers
+
+COMPRESS_LEVEL = 6
+
+_lock = threading.Lock()
+_packs = OrderedDict()  # (topic, difficulty) -> (version, count, gzipped body), least recently used first
+
+
+def _body(topic, difficulty, version, count, questions, full):
+    header = serializers.dumps({'topic': topic, 'difficulty': difficulty, 'version': version,
+                                'count': count, 'full': full})
+    return header[:-1] + b',"questions":' + serializers.questions_array(questions) + b'}'
+
+
+def current(topic, difficulty):
+    """(version, sorted questions) of the pool; version is 0 until one of its questions has settled."""
+    settled = question_cache.settled_id()
+    questions = sorted(question_cache.pool(topic, difficulty), key=lambda q: q.id)
+    version = max((q.id for q in questions if q.id <= settled), default=0)
+    return version, questions
+
+
+def full_pack(topic, difficulty):
+    """(version, count, gzipped body) of the whole pool, built once per version."""
+    version, questions = current(topic, difficulty)
+    key = (topic, difficulty)
+    with _lock:
+        pack = _packs.get(key)
+        if pack is not None:
+            _packs.move_to_end(key)
+    if pack is not None and pack[0] == version and pack[1] == len(questions):
+        return pack
+    body = _body(topic, difficulty, version, len(questions), questions, True)
+    pack = (version, len(questions), gzip.compress(body, COMPRESS_LEVEL))
+    with _lock:
+        _packs[key] = pack
+        _packs.move_to_end(key)
+        while len(_packs) > Config.OFFLINE_PACKS_MAX:
+            _packs.popitem(last=False)
+    return pack
+
+
+def delta(topic, difficulty, since):
+    """Body with the questions added after version `since`, or None if a full pack is needed."""
+    version, questions = current(topic, difficulty)
+    if since > version:
+        return None  # not a version of this pool
+    added = [q for q in questions if q.id > since]
+    return _body(topic, difficulty, version, len(questions), added, False)
+
+
+def pack_response(request, topic, difficulty, since=None):
+    """Response for GET /practice/pack: a delta if `since` is usable, else the (conditional, gzipped) full pack."""
+    if not question_cache.pool(topic, difficulty):
+        return jsonify({'message': 'No questions for this topic and difficulty'}), 404
+    if since is not None:
+        body = delta(topic, difficulty, since)
+        if body is not None:
+            return Response(body, status=200, mimetype='application/json')
+
+    version, count, gz = full_pack(topic, difficulty)
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = Response(gz, status=200, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'  # also keeps Flask-Compress from compressing again
+    else:
+        response = Response(gzip.decompress(gz), status=200, mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'private, no-cache'  # revalidate with the ETag
+    response.set_etag(f'{version}-{count}')
+    return response.make_conditional(request)
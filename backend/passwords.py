@@ -0,0 +1,89 @@
+"""
+Password hashing off the request thread.
+
+werkzeug's KDFs are deliberately slow, so hashing and verification run in a
+small process pool instead of the web worker. At most PASSWORD_HASH_MAX_PENDING
+jobs may be queued or running per web process; beyond that PasswordHasherBusy
+is raised and the route answers 429 instead of piling up.
+
+PASSWORD_HASH_WORKERS=0 hashes inline (scripts, local debugging).
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import Config
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+_method_prefix = None
+
+
+class PasswordHasherBusy(Exception):
+    """Too many hash jobs queued in this process; caller should retry later."""
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a threaded web worker is unsafe, and it is the only option on Windows
+                _pool = ProcessPoolExecutor(
+                    max_workers=Config.PASSWORD_HASH_WORKERS,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pool
+
+
+def _run(fn, *args):
+    global _pending
+    if not Config.PASSWORD_HASH_WORKERS:
+        return fn(*args)
+
+    with _pending_lock:
+        if _pending >= Config.PASSWORD_HASH_MAX_PENDING:
+            raise PasswordHasherBusy()
+        _pending += 1
+    try:
+        return _get_pool().submit(fn, *args).result()
+    finally:
+        with _pending_lock:
+            _pending -= 1
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def hash_password(password):
+    return _run(_hash, password, Config.PASSWORD_HASH_METHOD, Config.PASSWORD_SALT_LENGTH)
+
+
+def verify_password(pw_hash, password):
+    return _run(check_password_hash, pw_hash, password)
+
+
+def _current_prefix():
+    """Method + parameters werkzeug writes for the configured method, e.g. 'scrypt:32768:8:1'."""
+    global _method_prefix
+    if _method_prefix is None:
+        # Hash a throwaway value once so werkzeug fills in its default parameters
+        _method_prefix = generate_password_hash('', method=Config.PASSWORD_HASH_METHOD).split('$', 1)[0]
+    return _method_prefix
+
+
+def needs_rehash(pw_hash):
+    """True if pw_hash was made with a different method or parameters than configured."""
+    return pw_hash.split('$', 1)[0] != _current_prefix()
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
@@ -0,0 +1,290 @@
+"""
+Background practice generation jobs streamed to the client over SSE.
+
+POST /practice/generate with {"async": true} starts a job and returns its id
+immediately; GET /practice/jobs/<id>/stream then pushes each question as soon
+as it is available (DB hit, streamed Gemini object or built-in fallback).
+Like the blocking endpoint, a job is charged to the user's generation quota
+only when the DB can't fill it and it goes to Gemini.
+
+A job runs in the process that accepted the POST. PRACTICE_JOBS_BACKEND picks
+where its status and events are kept for the GET endpoints:
+  memory  in that process only; a stream request that reaches another worker
+          gets a 404, so it needs a single worker
+  redis   in REDIS_URL, so any worker can stream it (polling every
+          POLL_INTERVAL while it waits)
+Either way a job is dropped JOB_TTL seconds after finishing.
+"""
+import json
+import math
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import gemini
+import question_cache
+import rate_limits
+import serializers
+from app import db
+from config import Config
+from models import Question, User
+from question_bank import get_builtin_questions
+
+JOB_TTL = 600  # seconds a finished job stays readable
+KEEPALIVE_INTERVAL = 15  # seconds between SSE comments while idle
+
+_executor = ThreadPoolExecutor(max_workers=Config.PRACTICE_JOB_WORKERS, thread_name_prefix='practice-job')
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class PracticeJob:
+    def __init__(self, user_id, topic, difficulty, count):
+        self.id = str(uuid.uuid4())
+        self.user_id = user_id
+        self.topic = topic
+        self.difficulty = difficulty
+        self.count = count
+        self.status = 'pending'  # pending, running, done, failed
+        self.source = None
+        self.events = []  # [(event, data)], index + 1 is the SSE event id; question data is pre-encoded JSON
+        self.finished_at = None
+        self._cond = threading.Condition()
+
+    def emit(self, event, data):
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def finish(self, status):
+        with self._cond:
+            self.status = status
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def wait_for_events(self, since, timeout):
+        """Return (events after index `since`, finished) waiting up to timeout."""
+        with self._cond:
+            if len(self.events) <= since and not self.finished:
+                self._cond.wait(timeout)
+            return self.events[since:], self.finished
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'source': self.source,
+            'topic': self.topic,
+            'difficulty': self.difficulty,
+            'count': self.count,
+            'questions': [json.loads(data) for event, data in self.events if event == 'question']
+        }
+
+
+# --- SHARED (REDIS) JOBS ---
+class RedisPracticeJob(PracticeJob):
+    """A job whose status and events are written through to Redis. Each reader loads its own copy."""
+    PREFIX = 'skillsprint:job:'
+    POLL_INTERVAL = 0.2  # seconds between reads while a stream waits for events
+
+    def __init__(self, redis_client, user_id, topic, difficulty, count, job_id=None):
+        super().__init__(user_id, topic, difficulty, count)
+        self._redis = redis_client
+        if job_id:
+            self.id = job_id
+
+    def _key(self, suffix=''):
+        return f'{self.PREFIX}{self.id}{suffix}'
+
+    def save(self, event=None, data=None):
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key(), mapping={
+            'user_id': self.user_id, 'topic': self.topic, 'difficulty': self.difficulty,
+            'count': self.count, 'status': self.status, 'source': self.source or '',
+        })
+        if event is not None:
+            payload = data.decode('utf-8') if isinstance(data, bytes) else json.dumps(data)
+            pipe.rpush(self._key(':events'), json.dumps([event, payload]))
+        pipe.expire(self._key(), JOB_TTL)
+        pipe.expire(self._key(':events'), JOB_TTL)
+        pipe.execute()
+
+    def emit(self, event, data):
+        super().emit(event, data)
+        self.save(event, data)
+
+    def finish(self, status):
+        super().finish(status)
+        self.save()
+
+    @classmethod
+    def load(cls, redis_client, job_id):
+        fields = redis_client.hgetall(cls.PREFIX + job_id)
+        if not fields:
+            return None
+        job = cls(redis_client, fields['user_id'], fields['topic'], fields['difficulty'], int(fields['count']),
+                  job_id=job_id)
+        job._refresh(fields)
+        return job
+
+    def _refresh(self, fields=None):
+        # Status before events: finish() is written after the last emit(), so a
+        # finished status always comes with every event
+        fields = fields or self._redis.hgetall(self._key())
+        self.status = fields.get('status', self.status)
+        self.source = fields.get('source') or None
+        for raw in self._redis.lrange(self._key(':events'), len(self.events), -1):
+            event, payload = json.loads(raw)
+            self.events.append((event, payload.encode('utf-8')))
+
+    def wait_for_events(self, since, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            self._refresh()
+            if len(self.events) > since or self.finished or time.monotonic() >= deadline:
+                return self.events[since:], self.finished
+            time.sleep(self.POLL_INTERVAL)
+
+
+_redis = None
+
+
+def _redis_client():
+    global _redis
+    if _redis is None:
+        import redis  # only needed for the shared backend
+        _redis = redis.Redis.from_url(Config.REDIS_URL, decode_responses=True)
+    return _redis
+
+
+def _prune_jobs():
+    now = time.monotonic()
+    with _jobs_lock:
+        expired = [jid for jid, j in _jobs.items() if j.finished_at and now - j.finished_at > JOB_TTL]
+        for jid in expired:
+            del _jobs[jid]
+
+
+def start_job(app, user_id, topic, difficulty, count, model=None):
+    """Queue a generation job. `model` lets tests inject a fake streaming model."""
+    if Config.PRACTICE_JOBS_BACKEND == 'redis':
+        job = RedisPracticeJob(_redis_client(), user_id, topic, difficulty, count)
+        job.save()  # expires on its own
+    else:
+        _prune_jobs()
+        job = PracticeJob(user_id, topic, difficulty, count)
+        with _jobs_lock:
+            _jobs[job.id] = job
+    _executor.submit(_run_job, app, job, model)
+    return job
+
+
+def get_job(job_id, user_id):
+    if Config.PRACTICE_JOBS_BACKEND == 'redis':
+        job = RedisPracticeJob.load(_redis_client(), job_id)
+    else:
+        with _jobs_lock:
+            job = _jobs.get(job_id)
+    return job if job and job.user_id == user_id else None
+
+
+def _save_question(q, topic, difficulty):
+    new_q = Question(
+        topic=topic, difficulty=difficulty,
+        question_text=q['question_text'], options=q['options'],
+        correct_option=q['correct_option'], explanation=q['explanation']
+    )
+    db.session.add(new_q)
+    db.session.commit()  # commit per question so the client can submit it right away
+    return new_q
+
+
+def _charge_generation(job):
+    """Charge a Gemini call to the user's generation quota, as the blocking endpoint does.
+    If they're out of it, end the job with an error carrying retry_after and return False."""
+    user = db.session.get(User, job.user_id)
+    allowed, retry_after = rate_limits.check_generation(user)
+    if allowed:
+        return True
+    job.emit('error', {'message': 'Question generation limit reached, please retry later',
+                       'code': 'rate_limited', 'tier': rate_limits.tier_of(user),
+                       'retry_after': max(1, math.ceil(retry_after))})
+    job.finish('failed')
+    return False
+
+
+def _run_job(app, job, model):
+    """Same fallback order as the blocking endpoint: DB -> Gemini -> built-in bank -> partial DB."""
+    with app.app_context():
+        job.status = 'running'  # saved by the first emit() for Redis jobs
+        try:
+            existing = question_cache.sample(job.topic, job.difficulty, job.count)
+            if len(existing) >= job.count:
+                job.source = 'db'
+                for q in existing:
+                    job.emit('question', serializers.question_fragment(q))
+                job.finish('done')
+                return
+
+            sent = 0
+            if gemini.is_configured() and not _charge_generation(job):
+                return  # out of quota: the job already ended with a rate_limited error
+            if gemini.is_configured() or model is not None:
+                job.source = 'gemini'
+                try:
+                    for q in gemini.stream_questions(job.topic, job.difficulty, job.count, model=model):
+                        job.emit('question', serializers.question_fragment(_save_question(q, job.topic, job.difficulty)))
+                        sent += 1
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Gemini streaming failed: {e}")
+
+            if not sent:
+                builtin = get_builtin_questions(job.topic, job.difficulty, job.count)
+                if builtin:
+                    job.source = 'builtin'
+                    for q in builtin:
+                        job.emit('question', serializers.question_fragment(_save_question(q, q['topic'], q['difficulty'])))
+                        sent += 1
+
+            if not sent and existing:
+                job.source = 'db'
+                for q in existing:
+                    job.emit('question', serializers.question_fragment(q))
+            elif not sent:
+                job.source = None
+
+            job.finish('done')
+        except Exception as e:
+            db.session.rollback()
+            print(f"Practice job {job.id} failed: {e}")
+            job.emit('error', {'message': 'Question generation failed'})
+            job.finish('failed')
+        finally:
+            db.session.remove()
+
+
+def _sse(event_id, event, data):
+    payload = data.decode('utf-8') if isinstance(data, bytes) else json.dumps(data)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+def sse_stream(job, last_event_id=0):
+    """Yield SSE frames for a job, resuming after last_event_id on reconnect."""
+    sent = last_event_id
+    while True:
+        events, finished = job.wait_for_events(sent, KEEPALIVE_INTERVAL)
+        for event, data in events:
+            sent += 1
+            yield _sse(sent, event, data)
+        if finished and not events:
+            questions = sum(1 for event, _ in job.events if event == 'question')
+            yield _sse(sent + 1, 'done', {'status': job.status, 'source': job.source, 'count': questions})
+            return
+        if not events:
+            yield ": keepalive\n\n"
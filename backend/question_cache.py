@@ -0,0 +1,271 @@
+"""
+Read-through cache of Question rows.
+
+Questions are never edited after insert, so grading, sprint assembly and
+practice generation read them from this per-process cache instead of the DB:
+
+  get_many(ids)               by id; misses are loaded in one IN query and kept
+  pool(topic, difficulty)     every question of a (topic, difficulty), loaded
+                              whole on first use off idx_question_topic_difficulty
+  sample(topic, difficulty)   random picks from the pool, replacing ORDER BY random()
+
+Rows are held as CachedQuestion, a __slots__ object with the same attributes
+and to_dict() as Question, so callers and serializers take either. It costs
+no per-instance dict and no ORM state.
+
+Questions are only ever added. An insert in this process (an ORM commit, or
+importer.py calling notify_inserted()) makes the next read sync. Other
+processes are picked up at most every QUESTION_CACHE_SYNC_SECONDS: rows not
+cached yet are appended to the pools that are loaded. A deleted question is
+dropped when the delete is flushed in this process.
+
+Ids are allocated at insert, not at commit, so a slow transaction can commit
+a lower id after a sync has already read past it. Each sync therefore re-reads
+from the settled watermark: the highest id seen by a sync at least
+QUESTION_CACHE_SETTLE_SECONDS ago (the same settle rule as
+learning_events.py). settled_id() exposes it for offline_packs.py.
+
+Pools are evicted least recently used once more than QUESTION_CACHE_MAX_ROWS
+questions are cached. Empty pools are not cached, so unknown topics cost a
+query each time rather than an entry that never gets evicted. warm() preloads the pools of every active goal; app.py
+runs it at startup when asked to (create_app(warm_caches=True)).
+"""
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from config import Config
+from models import User, UserGoal, Question
+
+COLUMNS = (Question.id, Question.topic, Question.difficulty, Question.question_text,
+           Question.options, Question.correct_option, Question.explanation)
+
+
+class CachedQuestion:
+    __slots__ = ('id', 'topic', 'difficulty', 'question_text', 'options', 'correct_option', 'explanation')
+
+    def __init__(self, id, topic, difficulty, question_text, options, correct_option, explanation):
+        self.id = id
+        self.topic = topic
+        self.difficulty = difficulty
+        self.question_text = question_text
+        self.options = options
+        self.correct_option = correct_option
+        self.explanation = explanation
+
+    to_dict = Question.to_dict
+
+
+_lock = threading.Lock()
+_pools = OrderedDict()  # (topic, difficulty) -> list of CachedQuestion, least recently used first
+_loose = OrderedDict()  # id -> CachedQuestion read by id whose pool isn't loaded, LRU
+_by_id = {}  # id -> CachedQuestion, for every cached question
+_pooled = 0  # questions held in _pools
+STARTUP_RESCAN_IDS = 1000  # ids below the first sync's MAX(id) still re-read while it settles
+
+_max_id = None  # highest question id seen by the last sync; None until the first one
+_watermarks = deque()  # (monotonic time, highest id seen) per sync, oldest first
+_synced_at = 0.0
+_sync_lock = threading.Lock()
+
+
+def _row(r):
+    return CachedQuestion(*r)
+
+
+def _evict():
+    """Drop least recently used pools, then loose rows, until under QUESTION_CACHE_MAX_ROWS. Hold _lock."""
+    global _pooled
+    limit = Config.QUESTION_CACHE_MAX_ROWS
+    while _pooled + len(_loose) > limit and len(_pools) > 1:
+        _, rows = _pools.popitem(last=False)
+        _pooled -= len(rows)
+        for q in rows:
+            _by_id.pop(q.id, None)
+    while _loose and _pooled + len(_loose) > limit:
+        qid, _ = _loose.popitem(last=False)
+        _by_id.pop(qid, None)
+
+
+# --- SYNC ---
+def _sync():
+    """Append questions inserted since the last sync (by any process) to their loaded pools."""
+    global _pooled, _max_id, _synced_at
+    if time.monotonic() - _synced_at < Config.QUESTION_CACHE_SYNC_SECONDS:
+        return
+    if not _sync_lock.acquire(blocking=False):
+        return  # another thread is on it; serve what's cached
+    try:
+        now = time.monotonic()
+        if _max_id is None:
+            # First sync: pools loaded from now on are current, except for
+            # transactions still open now; re-read just below MAX(id) for those
+            _max_id = db.session.query(func.max(Question.id)).scalar() or 0
+            _watermarks.append((now, max(0, _max_id - STARTUP_RESCAN_IDS)))
+        else:
+            new_rows = [_row(r) for r in db.session.query(*COLUMNS).filter(
+                Question.id > _settled_id(now)).order_by(Question.id)]
+            with _lock:
+                for q in new_rows:
+                    rows = _pools.get((q.topic, q.difficulty))
+                    if rows is not None and q.id not in _by_id:
+                        rows.append(q)
+                        _by_id[q.id] = q
+                        _pooled += 1
+                _evict()
+            if new_rows:
+                _max_id = max(_max_id, new_rows[-1].id)
+        _watermarks.append((now, _max_id))
+        # Keep the newest settled watermark and everything after it
+        settle = Config.QUESTION_CACHE_SETTLE_SECONDS
+        while len(_watermarks) > 1 and _watermarks[1][0] <= now - settle:
+            _watermarks.popleft()
+        _synced_at = now
+    finally:
+        _sync_lock.release()
+
+
+def _settled_id(now):
+    """Every question with an id up to this was committed before a sync read past it."""
+    settle = Config.QUESTION_CACHE_SETTLE_SECONDS
+    settled = _watermarks[0][1] if _watermarks else 0
+    for synced_at, seen in list(_watermarks):
+        if synced_at > now - settle:
+            break
+        settled = seen
+    return settled
+
+
+def settled_id():
+    """Highest question id below which this process's pools can't gain rows anymore."""
+    _sync()
+    return _settled_id(time.monotonic())
+
+
+def notify_inserted():
+    """Questions were inserted outside the ORM (bulk insert): sync on the next read."""
+    global _synced_at
+    _synced_at = 0.0
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_changes(session, flush_context):
+    if any(isinstance(obj, Question) for obj in session.new):
+        session.info['questions_inserted'] = True
+    for obj in session.deleted:
+        if isinstance(obj, Question):
+            forget(obj.id, obj.topic, obj.difficulty)
+
+
+@event.listens_for(Session, 'after_commit')
+def _sync_after_commit(session):
+    if session.info.pop('questions_inserted', False):
+        notify_inserted()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('questions_inserted', None)
+
+
+# --- READS ---
+def get_many(ids):
+    """{id: CachedQuestion} for the ids that exist, loading misses in one query."""
+    ids = set(ids)
+    with _lock:
+        found = {i: _by_id[i] for i in ids if i in _by_id}
+    missing = ids - found.keys()
+    if missing:
+        rows = [_row(r) for r in db.session.query(*COLUMNS).filter(Question.id.in_(missing))]
+        with _lock:
+            for q in rows:
+                found[q.id] = _by_id.setdefault(q.id, q)
+                if found[q.id] is q:
+                    _loose[q.id] = q
+            _evict()
+    return found
+
+
+def get(question_id):
+    return get_many([question_id]).get(question_id)
+
+
+def pool(topic, difficulty):
+    """Every question of (topic, difficulty), in the order they were cached. Treat the list as read-only."""
+    global _pooled
+    _sync()
+    key = (topic, difficulty)
+    with _lock:
+        rows = _pools.get(key)
+        if rows is not None:
+            _pools.move_to_end(key)
+            return rows
+    rows = [_row(r) for r in db.session.query(*COLUMNS).filter(
+        Question.topic == topic, Question.difficulty == difficulty)]
+    if not rows:
+        return rows  # not cached: any topic string can be asked for, and eviction only counts rows
+    with _lock:
+        if key in _pools:
+            return _pools[key]  # another thread loaded it meanwhile
+        rows = [_by_id.get(q.id, q) for q in rows]
+        for q in rows:
+            _loose.pop(q.id, None)
+            _by_id[q.id] = q
+        _pools[key] = rows
+        _pooled += len(rows)
+        _evict()
+    return rows
+
+
+def sample(topic, difficulty, count):
+    """Up to count distinct random questions of (topic, difficulty)."""
+    rows = pool(topic, difficulty)
+    return random.sample(rows, min(count, len(rows)))
+
+
+def forget(question_id, topic, difficulty):
+    """Drop a deleted question."""
+    global _pooled
+    with _lock:
+        _by_id.pop(question_id, None)
+        _loose.pop(question_id, None)
+        rows = _pools.get((topic, difficulty))
+        if rows is not None:
+            kept = [r for r in rows if r.id != question_id]
+            _pooled -= len(rows) - len(kept)
+            _pools[(topic, difficulty)] = kept
+
+
+def clear():
+    global _pooled, _max_id, _synced_at
+    with _lock:
+        _pools.clear()
+        _loose.clear()
+        _by_id.clear()
+        _pooled = 0
+        _max_id = None
+        _watermarks.clear()
+        _synced_at = 0.0
+
+
+def stats():
+    with _lock:
+        return {'pools': len(_pools), 'pooled': _pooled, 'loose': len(_loose)}
+
+
+def warm():
+    """Load the pool of every (topic, difficulty) an active user has as their goal."""
+    started = time.perf_counter()
+    keys = db.session.query(UserGoal.topic, UserGoal.difficulty) \
+        .join(User, User.id == UserGoal.user_id) \
+        .filter(User.deleted_at.is_(None)).distinct().all()
+    for topic, difficulty in keys:
+        pool(topic, difficulty)
+    s = stats()
+    print(f"Question cache warmed: {s['pools']} pools, {s['pooled']} questions "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,292 @@
+"""
+Generation quotas and the global Gemini concurrency cap.
+
+Every request that may call Gemini first takes one token from two buckets:
+the user's own bucket and a bucket shared by the user's whole tier
+(free/pro, from User.is_pro). A request is allowed only when both buckets
+have a token. When one is empty the caller gets the number of seconds until
+a token is available, which the routes send as Retry-After.
+
+Separately, llm_slot() caps Gemini calls in flight across the service
+(GEMINI_MAX_IN_FLIGHT). Callers over the cap queue for up to
+GEMINI_QUEUE_TIMEOUT seconds before being refused.
+
+RATE_LIMIT_BACKEND picks where bucket, slot and metric state lives:
+  memory  per process (default; fine for a single worker)
+  redis   shared through REDIS_URL, so limits hold across workers and hosts
+"""
+import math
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from config import Config
+
+TIERS = {
+    # tier: (per-user tokens per hour, per-user burst, whole-tier tokens per minute)
+    'free': (Config.GENERATE_FREE_PER_HOUR, Config.GENERATE_FREE_BURST, Config.GENERATE_FREE_TIER_PER_MINUTE),
+    'pro': (Config.GENERATE_PRO_PER_HOUR, Config.GENERATE_PRO_BURST, Config.GENERATE_PRO_TIER_PER_MINUTE),
+}
+
+METRICS = ('allowed', 'rejected_user', 'rejected_tier', 'llm_started', 'llm_queued', 'llm_rejected')
+
+
+class LLMSaturated(Exception):
+    """No Gemini slot became free within GEMINI_QUEUE_TIMEOUT."""
+
+
+def tier_of(user):
+    return 'pro' if user.is_pro else 'free'
+
+
+def _buckets(user):
+    tier = tier_of(user)
+    per_hour, burst, tier_per_minute = TIERS[tier]
+    # (key, capacity, refill per second, metric if this bucket is the one that's empty)
+    return [
+        (f'user:{user.id}', burst, per_hour / 3600.0, 'rejected_user'),
+        (f'tier:{tier}', tier_per_minute, tier_per_minute / 60.0, 'rejected_tier'),
+    ]
+
+
+# --- IN-PROCESS BACKEND ---
+class MemoryBackend:
+    MAX_BUCKETS = 50000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, updated_at)
+        self._slots = threading.BoundedSemaphore(Config.GEMINI_MAX_IN_FLIGHT)
+        self._in_flight = 0
+        self._metrics = dict.fromkeys(METRICS, 0)
+
+    def take(self, buckets, cost=1):
+        """Take cost from every bucket or none. Returns (allowed, retry_after seconds, metric)."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, rate, _ in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+            blocked = next((i for i, tokens in enumerate(levels) if tokens < cost), None)
+            for (key, _, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens if blocked is not None else tokens - cost, now)
+            if len(self._buckets) > self.MAX_BUCKETS:
+                self._prune(now)
+        if blocked is not None:
+            _, _, rate, metric = buckets[blocked]
+            return False, (cost - levels[blocked]) / rate, metric
+        return True, 0, 'allowed'
+
+    def peek(self, buckets):
+        """Tokens now in each bucket, without taking any."""
+        now = time.monotonic()
+        with self._lock:
+            levels = []
+            for key, capacity, rate, _ in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels.append(min(capacity, tokens + (now - updated) * rate))
+        return levels
+
+    def _prune(self, now):
+        # Buckets idle long enough to be full again carry no state
+        idle = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for k in idle:
+            del self._buckets[k]
+
+    def acquire_slot(self, timeout):
+        if not self._slots.acquire(timeout=timeout):
+            return None
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release_slot(self, token):
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    def incr(self, metric, n=1):
+        with self._lock:
+            self._metrics[metric] += n
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._metrics, llm_in_flight=self._in_flight)
+
+
+# --- SHARED (REDIS) BACKEND ---
+# KEYS = bucket keys; ARGV = cost, then capacity and rate per key. Uses the
+# server clock so every app host agrees on time.
+_TAKE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local cost = tonumber(ARGV[1])
+local levels = {}
+for i, key in ipairs(KEYS) do
+  local cap = tonumber(ARGV[i * 2])
+  local rate = tonumber(ARGV[i * 2 + 1])
+  local state = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(state[1]) or cap
+  local ts = tonumber(state[2]) or now
+  levels[i] = math.min(cap, tokens + (now - ts) * rate)
+end
+local blocked = 0
+for i, key in ipairs(KEYS) do
+  if levels[i] < cost then blocked = i break end
+end
+for i, key in ipairs(KEYS) do
+  local cap = tonumber(ARGV[i * 2])
+  local rate = tonumber(ARGV[i * 2 + 1])
+  local left = levels[i]
+  if blocked == 0 then left = left - cost end
+  redis.call('HSET', key, 'tokens', tostring(left), 'ts', tostring(now))
+  redis.call('PEXPIRE', key, math.ceil((cap - left) / rate * 1000) + 1000)
+end
+if blocked == 0 then return {0, '0'} end
+local rate = tonumber(ARGV[blocked * 2 + 1])
+return {blocked, tostring((cost - levels[blocked]) / rate)}
+"""
+
+# KEYS[1] = lease zset; ARGV = cap, lease id, lease seconds. Expired leases
+# (a worker that died holding a slot) are dropped before counting.
+_ACQUIRE_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+  redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[2])
+  return 1
+end
+return 0
+"""
+
+
+class RedisBackend:
+    PREFIX = 'skillsprint:rl:'
+    POLL_INTERVAL = 0.05
+
+    def __init__(self, url):
+        import redis  # only needed for the shared backend
+        self._redis = redis.Redis.from_url(url)
+        self._take = self._redis.register_script(_TAKE_LUA)
+        self._acquire = self._redis.register_script(_ACQUIRE_LUA)
+        self._slots_key = self.PREFIX + 'llm:leases'
+        self._metrics_key = self.PREFIX + 'metrics'
+        # A lease outlives the Gemini timeout so a live call is never double-counted
+        self._lease_seconds = Config.GEMINI_TIMEOUT * 2 + 10
+
+    def take(self, buckets, cost=1):
+        args = [cost]
+        for _, capacity, rate, _ in buckets:
+            args += [capacity, rate]
+        blocked, retry_after = self._take(keys=[self.PREFIX + key for key, _, _, _ in buckets], args=args)
+        if not blocked:
+            return True, 0, 'allowed'
+        return False, float(retry_after), buckets[int(blocked) - 1][3]
+
+    def peek(self, buckets):
+        seconds, micros = self._redis.time()
+        now = seconds + micros / 1000000
+        levels = []
+        for key, capacity, rate, _ in buckets:
+            tokens, ts = self._redis.hmget(self.PREFIX + key, 'tokens', 'ts')
+            levels.append(capacity if tokens is None else min(capacity, float(tokens) + (now - float(ts)) * rate))
+        return levels
+
+    def acquire_slot(self, timeout):
+        lease = str(uuid.uuid4())
+        deadline = time.monotonic() + timeout
+        while True:
+            if self._acquire(keys=[self._slots_key], args=[Config.GEMINI_MAX_IN_FLIGHT, lease, self._lease_seconds]):
+                return lease
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def release_slot(self, lease):
+        self._redis.zrem(self._slots_key, lease)
+
+    def incr(self, metric, n=1):
+        self._redis.hincrby(self._metrics_key, metric, n)
+
+    def metrics(self):
+        raw = self._redis.hgetall(self._metrics_key)
+        result = dict.fromkeys(METRICS, 0)
+        result.update({k.decode(): int(v) for k, v in raw.items()})
+        result['llm_in_flight'] = self._redis.zcount(self._slots_key, time.time(), '+inf')
+        return result
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = RedisBackend(Config.REDIS_URL) if Config.RATE_LIMIT_BACKEND == 'redis' else MemoryBackend()
+    return _backend
+
+
+# --- PUBLIC API ---
+def check_generation(user, cost=1):
+    """
+    Charge one generation to the user's and tier's buckets.
+    Returns (allowed, retry_after_seconds).
+    """
+    allowed, retry_after, metric = backend().take(_buckets(user), cost)
+    backend().incr(metric)
+    return allowed, retry_after
+
+
+def remaining(user):
+    """The user's own generation bucket, without charging it."""
+    per_hour, burst, _ = TIERS[tier_of(user)]
+    user_bucket = _buckets(user)[0]
+    tokens = backend().peek([user_bucket])[0]
+    return {
+        'tier': tier_of(user),
+        'remaining': int(tokens),
+        'burst': burst,
+        'per_hour': per_hour,
+        'retry_after': 0 if tokens >= 1 else math.ceil((1 - tokens) / user_bucket[2]),
+    }
+
+
+def acquire_llm_slot(timeout=None):
+    """
+    Reserve one Gemini call, queueing up to `timeout` seconds. Returns a
+    token for release_llm_slot(); raises LLMSaturated if none came free.
+    """
+    timeout = Config.GEMINI_QUEUE_TIMEOUT if timeout is None else timeout
+    b = backend()
+    token = b.acquire_slot(0)
+    if token is None:
+        b.incr('llm_queued')
+        token = b.acquire_slot(timeout)
+        if token is None:
+            b.incr('llm_rejected')
+            raise LLMSaturated(f'{Config.GEMINI_MAX_IN_FLIGHT} Gemini calls already in flight')
+    b.incr('llm_started')
+    return token
+
+
+def release_llm_slot(token):
+    backend().release_slot(token)
+
+
+@contextmanager
+def llm_slot(timeout=None):
+    token = acquire_llm_slot(timeout)
+    try:
+        yield
+    finally:
+        release_llm_slot(token)
+
+
+def metrics():
+    return dict(backend().metrics(), backend=Config.RATE_LIMIT_BACKEND)
@@ -1,17 +1,38 @@
-from flask import Blueprint, jsonify, request
-from models import db, User, UserGoal, Question, DailyLog, Habit, HabitLog, Skill, Topic, UserSkillProgress, UserAttempt
+from flask import Blueprint, jsonify, request, Response, current_app, stream_with_context
+from models import db, User, UserGoal, Question, DailyLog, Habit, HabitLog, Skill, Topic, UserSkillProgress, UserAttempt, UserTopicMastery, QuestionStat
 from question_bank import get_builtin_questions
 import jwt
 from datetime import datetime, timedelta, timezone
 from config import Config
-import google.generativeai as genai
+import gemini
+import practice_jobs
+import passwords
+import stripe_inbox
+import serializers
+import daily_counters
+import streaks
+import search
+import skill_progress
+import rate_limits
+import sprint_packs
+import deletions
+import cohort_analytics
+import leaderboard
+import live_updates
+import learning_events
+import question_cache
+import offline_packs
+import streak_segments
 import json
+import math
 import stripe
 from functools import wraps
+from sqlalchemy.exc import IntegrityError
 
 api_bp = Blueprint('api', __name__)
 
-# Simple in-memory cache for dashboard stats (TTL: 5 minutes)
+# Simple in-memory cache for dashboard stats (TTL: 5 minutes). Per worker:
+# invalidate_stats only clears the worker it runs in (see gunicorn.conf.py)
 _stats_cache = {}
 
 def cache_stats(timeout=300):
@@ -33,6 +54,9 @@ def cache_stats(timeout=300):
         return decorated_function
     return decorator
 
+def invalidate_stats(user_id):
+    _stats_cache.pop(f"stats_{user_id}", None)
+
 @api_bp.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "message": "SkillSprint API is running"}), 200
@@ -40,25 +64,50 @@ def health_check():
 from functools import wraps
 
 # --- AUTH MIDDLEWARE ---
-def token_required(f):
+def _authenticated(f, allow_query_token):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
         if 'Authorization' in request.headers:
             token = request.headers['Authorization'].split(" ")[1]
+        elif allow_query_token and request.args.get('token'):
+            token = request.args.get('token')
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
             data = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=["HS256"])
-            current_user = User.query.filter_by(id=data['user_id']).first()
+            current_user = User.query.filter_by(id=data['user_id'], deleted_at=None).first()
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
+        if not current_user:
+            return jsonify({'message': 'Token is invalid!'}), 401
+
+        return f(current_user, *args, **kwargs)
+    return decorated
+
+def token_required(f):
+    return _authenticated(f, allow_query_token=False)
 
+def stream_token_required(f):
+    """For SSE endpoints only: EventSource can't set headers, so the token may come as ?token="""
+    return _authenticated(f, allow_query_token=True)
+
+def admin_required(f):
+    """Goes under @token_required; admins are listed in Config.ADMIN_EMAILS"""
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if (current_user.email or '').lower() not in Config.ADMIN_EMAILS:
+            return jsonify({'message': 'Admin access required'}), 403
         return f(current_user, *args, **kwargs)
     return decorated
 
 # --- AUTH ROUTES ---
+def _hasher_busy():
+    response = jsonify({'message': 'Too many login attempts right now, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 429
+
 @api_bp.route('/auth/register', methods=['POST'])
 def register():
     data = request.get_json()
@@ -69,7 +118,10 @@ def register():
         return jsonify({'message': 'User already exists'}), 400
 
     new_user = User(email=data['email'])
-    new_user.set_password(data['password'])
+    try:
+        new_user.set_password(data['password'])
+    except passwords.PasswordHasherBusy:
+        return _hasher_busy()
     db.session.add(new_user)
     db.session.commit()
     
@@ -81,9 +133,20 @@ def login():
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'message': 'Could not verify'}), 401
 
-    user = User.query.filter_by(email=data['email']).first()
-    if not user or not user.check_password(data['password']):
-        return jsonify({'message': 'Login failed!'}), 401
+    user = User.query.filter_by(email=data['email'], deleted_at=None).first()
+    try:
+        if not user or not user.check_password(data['password']):
+            return jsonify({'message': 'Login failed!'}), 401
+    except passwords.PasswordHasherBusy:
+        return _hasher_busy()
+
+    # Transparently upgrade hashes made with older parameters
+    if passwords.needs_rehash(user.password_hash):
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except passwords.PasswordHasherBusy:
+            pass  # upgrade on a later login instead
 
     token = jwt.encode({
         'user_id': user.id,
@@ -99,6 +162,14 @@ def get_me(current_user):
     goals = [g.to_dict() for g in current_user.goals]
     return jsonify({'user': current_user.to_dict(), 'goals': goals}), 200
 
+@api_bp.route('/users/me', methods=['DELETE'])
+@token_required
+def delete_me(current_user):
+    # Marked now, rows removed in the background (deletions.py)
+    deletions.delete_later(current_app._get_current_object(), current_user, 'user')
+    leaderboard.forget([current_user.id])
+    return jsonify({'message': 'Account deleted'}), 202
+
 @api_bp.route('/users/goals', methods=['POST', 'PUT'])
 @token_required
 def set_goal(current_user):
@@ -118,78 +189,94 @@ def set_goal(current_user):
         goal = UserGoal(user_id=current_user.id, topic=data['topic'], difficulty=data['difficulty'], daily_question_target=question_count)
         db.session.add(goal)
         
+    # Packs built for the old goal (today's and any prebuilt for tomorrow) no longer apply
+    sprint_packs.discard_packs(current_user.id, streaks.local_today(current_user.timezone))
     db.session.commit()
+    leaderboard.set_topic(current_user.id, goal.topic)
     return jsonify({'message': 'Goal updated', 'goal': goal.to_dict()}), 200
 
 # --- PRACTICE ROUTES ---
+def _save_generated_questions(topic, difficulty, q_data):
+    new_questions = []
+    for q in q_data:
+        new_q = Question(
+            topic=topic,
+            difficulty=difficulty,
+            question_text=q['question_text'],
+            options=q['options'],
+            correct_option=q['correct_option'],
+            explanation=q['explanation']
+        )
+        db.session.add(new_q)
+        new_questions.append(new_q)
+        
+    db.session.commit()
+    return [q.id for q in new_questions]
+
+def _generation_quota_response(current_user):
+    """429 with Retry-After if the user or their tier is out of generation tokens, else None."""
+    if not gemini.is_configured():
+        return None  # nothing paid to protect; requests fall through to the built-in bank
+    allowed, retry_after = rate_limits.check_generation(current_user)
+    if allowed:
+        return None
+    response = jsonify({
+        'message': 'Question generation limit reached, please retry later',
+        'tier': rate_limits.tier_of(current_user)
+    })
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response, 429
+
 def generate_gemini_questions(topic, difficulty, count):
-    if not Config.GEMINI_API_KEY or Config.GEMINI_API_KEY == 'your_api_key_here':
+    if not gemini.is_configured():
         print("No GEMINI_API_KEY configured.")
         return []
         
-    genai.configure(api_key=Config.GEMINI_API_KEY)
-    
-    prompt = f"""Generate {count} multiple choice questions about {topic} at a {difficulty} level.
-Return ONLY a raw JSON array of objects. No markdown formatting, no code blocks, just the JSON.
-Each object must have exactly these keys:
-- "question_text": The question string
-- "options": An object with exactly 4 string keys "A", "B", "C", "D" mapping to the 4 choices
-- "correct_option": A string "A", "B", "C", or "D"
-- "explanation": A brief string explaining why the answer is correct
-"""
+    # Concurrent requests for the same prompt share one generation; followers
+    # (and repeats within GEMINI_CACHE_TTL) get the leader's saved question ids.
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        text = response.text.strip()
-        if text.startswith('```json'): text = text[7:]
-        if text.startswith('```'): text = text[3:]
-        if text.endswith('```'): text = text[:-3]
-            
-        q_data = json.loads(text.strip())
-        
-        new_questions = []
-        for q in q_data:
-            new_q = Question(
-                topic=topic,
-                difficulty=difficulty,
-                question_text=q['question_text'],
-                options=q['options'],
-                correct_option=q['correct_option'],
-                explanation=q['explanation']
-            )
-            db.session.add(new_q)
-            new_questions.append(new_q)
-            
-        db.session.commit()
-        return new_questions
+        ids = gemini.coalesced(
+            gemini.build_prompt(topic, difficulty, count),
+            lambda: _save_generated_questions(topic, difficulty, gemini.generate_questions(topic, difficulty, count))
+        )
     except Exception as e:
+        db.session.rollback()
         print(f"Gemini generation failed: {e}")
         return []
+    if not ids:
+        return []
+    by_id = question_cache.get_many(ids)
+    return [by_id[i] for i in ids if i in by_id]
 
 @api_bp.route('/practice/daily', methods=['GET'])
 @token_required
 def get_daily_practice(current_user):
-    goal = UserGoal.query.filter_by(user_id=current_user.id).first()
-    if not goal:
-        return jsonify({'message': 'Please set a learning goal first'}), 400
-        
-    target_count = goal.daily_question_target
-    questions = Question.query.filter_by(topic=goal.topic, difficulty=goal.difficulty).order_by(db.func.random()).limit(target_count).all()
-    
-    # If we don't have enough questions, generate them with Gemini!
-    if len(questions) < target_count:
-        needed = target_count - len(questions)
-        print(f"Generating {needed} more questions using Gemini...")
-        generated = generate_gemini_questions(goal.topic, goal.difficulty, needed)
-        # If generation succeeded, add them to our current pool
-        if generated:
-            questions.extend(generated)
-    
-    # Final fallback if Gemini also failed or key not set
-    if not questions:
-        questions = Question.query.order_by(db.func.random()).limit(5).all()
-        
-    return jsonify({'questions': [q.to_dict() for q in questions]}), 200
+    # Today's pack is built ahead of time by cron (see sprint_packs.py) and stays the same all day
+    today = streaks.local_today(current_user.timezone)
+    pack = sprint_packs.get_pack(current_user.id, today)
+    if pack is None:
+        goal = UserGoal.query.filter_by(user_id=current_user.id).first()
+        if not goal:
+            return jsonify({'message': 'Please set a learning goal first'}), 400
+        # Not prebuilt (new or inactive user, or the goal just changed): build it now.
+        # Gemini top-ups are charged to the quota; out of quota we serve what the DB has.
+        pack = sprint_packs.build_pack(
+            current_user.id, goal, today,
+            allow_generation=lambda: rate_limits.check_generation(current_user)[0]
+        )
+    if pack is None:
+        return serializers.questions_response([])
+    return sprint_packs.pack_response(pack)
+
+@api_bp.route('/practice/pack', methods=['GET'])
+@token_required
+def get_practice_pack(current_user):
+    # All questions of a topic and difficulty for offline practice, or those added since ?since=<version> (offline_packs.py)
+    topic = request.args.get('topic')
+    difficulty = request.args.get('difficulty')
+    if not topic or not difficulty:
+        return jsonify({'message': 'topic and difficulty are required'}), 400
+    return offline_packs.pack_response(request, topic, difficulty, since=request.args.get('since', type=int))
 
 @api_bp.route('/practice/generate', methods=['POST'])
 @token_required
@@ -200,15 +287,28 @@ def generate_practice(current_user):
     difficulty = data.get('difficulty', 'beginner')
     count = min(data.get('count', 5), 10)
     
+    # Async mode: return a job id now and stream questions over SSE
+    # (charged to the generation quota only if the job falls through to Gemini; see practice_jobs.py)
+    if data.get('async'):
+        job = practice_jobs.start_job(current_app._get_current_object(), current_user.id, topic, difficulty, count)
+        return jsonify({
+            'job_id': job.id,
+            'status': job.status,
+            'stream_url': f'/api/v1/practice/jobs/{job.id}/stream'
+        }), 202
+    
     # 1. Try existing DB questions
-    existing = Question.query.filter_by(topic=topic, difficulty=difficulty).order_by(db.func.random()).limit(count).all()
+    existing = question_cache.sample(topic, difficulty, count)
     if len(existing) >= count:
-        return jsonify({'questions': [q.to_dict() for q in existing]}), 200
+        return serializers.questions_response(existing)
     
-    # 2. Try Gemini API
+    # 2. Try Gemini API (charged to the user's generation quota)
+    limited = _generation_quota_response(current_user)
+    if limited:
+        return limited
     generated = generate_gemini_questions(topic, difficulty, count)
     if generated:
-        return jsonify({'questions': [q.to_dict() for q in generated]}), 200
+        return serializers.questions_response(generated)
     
     # 3. Fallback: built-in question bank (no API needed)
     builtin = get_builtin_questions(topic, difficulty, count)
@@ -224,13 +324,40 @@ def generate_practice(current_user):
             db.session.add(new_q)
             saved.append(new_q)
         db.session.commit()
-        return jsonify({'questions': [q.to_dict() for q in saved]}), 200
+        return serializers.questions_response(saved)
     
     # 4. Any existing in DB at all
     if existing:
-        return jsonify({'questions': [q.to_dict() for q in existing]}), 200
+        return serializers.questions_response(existing)
     
-    return jsonify({'message': f'No questions available for {topic}/{difficulty}.', 'questions': []}), 200
+    return serializers.questions_response([], message=f'No questions available for {topic}/{difficulty}.')
+
+@api_bp.route('/practice/limits', methods=['GET'])
+@token_required
+def generation_limits(current_user):
+    # The caller's own generation bucket; service-wide counters are at /admin/rate-limits
+    return jsonify(rate_limits.remaining(current_user)), 200
+
+@api_bp.route('/practice/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_practice_job(current_user, job_id):
+    job = practice_jobs.get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    return jsonify(job.to_dict()), 200
+
+@api_bp.route('/practice/jobs/<job_id>/stream', methods=['GET'])
+@stream_token_required
+def stream_practice_job(current_user, job_id):
+    job = practice_jobs.get_job(job_id, current_user.id)
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    last_event_id = request.headers.get('Last-Event-ID', type=int, default=0)
+    return Response(
+        stream_with_context(practice_jobs.sse_stream(job, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @api_bp.route('/practice/submit', methods=['POST'])
 @token_required
@@ -243,9 +370,11 @@ def submit_practice(current_user):
         
     correct_count = 0
     results = []
+    graded = []
+    by_id = question_cache.get_many(ans['question_id'] for ans in answers)
     
     for ans in answers:
-        q = Question.query.get(ans['question_id'])
+        q = by_id.get(ans['question_id'])
         if q:
             is_correct = ans['selected_option'] == q.correct_option
             if is_correct: correct_count += 1
@@ -263,46 +392,70 @@ def submit_practice(current_user):
                 time_taken=ans.get('time_taken', 0)
             )
             db.session.add(attempt)
+            graded.append((q.id, is_correct, attempt.time_taken))
             
-    # Update Daily Log
-    today = datetime.now(timezone.utc).date()
-    log = DailyLog.query.filter_by(user_id=current_user.id, date=today).first()
+    # Update Daily Log (atomic upsert; see daily_counters.py), dated in the user's timezone
+    today = streaks.local_today(current_user.timezone)
     
     goal = UserGoal.query.filter_by(user_id=current_user.id).first()
     target = goal.daily_question_target if goal else 5
     
-    if not log:
-        log = DailyLog(user_id=current_user.id, date=today, questions_attempted=0, questions_correct=0, streak_maintained=False)
-        db.session.add(log)
-        
-    log.questions_attempted += len(answers)
-    log.questions_correct += correct_count
-    
-    streak_was_maintained = log.streak_maintained
-    if log.questions_attempted >= target:
-        log.streak_maintained = True
+    log = daily_counters.record_daily_progress(current_user.id, today, len(answers), correct_count, target)
         
     # Update user streak if this submission newly achieved the daily goal
-    if not streak_was_maintained and log.streak_maintained:
-        current_user.current_streak += 1
-        if current_user.current_streak > current_user.longest_streak:
-            current_user.longest_streak = current_user.current_streak
+    if log['newly_maintained']:
+        daily_counters.increment_streak(current_user.id)
+        streak_segments.add_day(current_user.id, today)
+
+    # Skill progress and other derived views follow from the event log (learning_events.py)
+    learning_events.attempts_graded(current_user.id, today, graded)
+    if log['newly_maintained']:
+        learning_events.goal_met(current_user.id, today)
             
     db.session.commit()
+    if log['newly_maintained']:
+        leaderboard.record_streak(current_user.id, current_user.current_streak, goal.topic if goal else None)
+    invalidate_stats(current_user.id)
+    live_updates.publish(current_user.id, 'practice', {
+        'date': today.isoformat(),
+        'questions_attempted': log['questions_attempted'],
+        'questions_correct': log['questions_correct'],
+        'streak_maintained': log['streak_maintained'],
+    })
+    if log['newly_maintained']:
+        live_updates.publish(current_user.id, 'streak', {
+            'current_streak': current_user.current_streak,
+            'longest_streak': current_user.longest_streak,
+        })
     
     return jsonify({
         'score': f"{correct_count}/{len(answers)}",
-        'streak_maintained': log.streak_maintained,
+        'streak_maintained': log['streak_maintained'],
         'current_streak': current_user.current_streak,
         'results': results
     }), 200
 
+@api_bp.route('/questions/search', methods=['GET'])
+@token_required
+def search_questions(current_user):
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'q is required'}), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    questions = search.search_questions(
+        query, limit=limit,
+        topic=request.args.get('topic') or None,
+        difficulty=request.args.get('difficulty') or None
+    )
+    return serializers.questions_response(questions, query=query, backend=search.backend())
+
 # --- DASHBOARD ROUTES ---
 @api_bp.route('/dashboard/stats', methods=['GET'])
 @token_required
 @cache_stats(timeout=300)  # Cache for 5 minutes
 def get_dashboard_stats(current_user):
-    thirty_days_ago = datetime.now(timezone.utc).date() - timedelta(days=30)
+    today = streaks.local_today(current_user.timezone)
+    thirty_days_ago = today - timedelta(days=30)
     logs = DailyLog.query.filter(
         DailyLog.user_id == current_user.id, 
         DailyLog.date >= thirty_days_ago
@@ -322,7 +475,7 @@ def get_dashboard_stats(current_user):
     # Weekly breakdown for chart
     weekly = []
     for i in range(7):
-        day = datetime.now(timezone.utc).date() - timedelta(days=6 - i)
+        day = today - timedelta(days=6 - i)
         day_log = next((l for l in logs if l.date == day), None)
         weekly.append({
             'day': day.strftime('%a'),
@@ -340,8 +493,45 @@ def get_dashboard_stats(current_user):
         'is_pro': current_user.is_pro
     }), 200
 
+@api_bp.route('/live', methods=['GET'])
+@stream_token_required
+def live_updates_stream(current_user):
+    """SSE stream of dashboard and habit deltas (see live_updates.py) for the Dashboard and HabitTracker views."""
+    user_id = current_user.id
+    # Subscribe before reading the snapshot so an event published in between isn't lost
+    sub = live_updates.subscribe(user_id)
+    try:
+        db.session.commit()  # end the auth lookup's transaction: read the snapshot as of now
+        today = streaks.local_today(current_user.timezone)
+        log = DailyLog.query.filter_by(user_id=user_id, date=today).first()
+        habits_done = HabitLog.query.filter_by(
+            user_id=user_id, date=datetime.now(timezone.utc).date(), completed=True
+        ).with_entities(HabitLog.habit_id).all()
+        snapshot = {
+            'date': today.isoformat(),
+            'current_streak': current_user.current_streak,
+            'longest_streak': current_user.longest_streak,
+            'questions_attempted': log.questions_attempted if log else 0,
+            'questions_correct': log.questions_correct if log else 0,
+            'streak_maintained': bool(log and log.streak_maintained),
+            'habits_completed_today': [habit_id for (habit_id,) in habits_done],
+        }
+    except Exception:
+        sub.close()
+        raise
+    db.session.remove()  # don't hold a pooled connection for the life of the stream
+    response = Response(
+        stream_with_context(live_updates.sse_stream(sub, snapshot)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(sub.close)  # also when the stream is never started
+    return response
+
 # --- PAYMENTS ROUTES (STRIPE) ---
 stripe.api_key = Config.STRIPE_SECRET_KEY
+if Config.STRIPE_API_BASE:
+    stripe.api_base = Config.STRIPE_API_BASE
 
 @api_bp.route('/payments/create-checkout-session', methods=['POST'])
 @token_required
@@ -371,34 +561,55 @@ def create_checkout_session(current_user):
 
 @api_bp.route('/payments/webhook', methods=['POST'])
 def stripe_webhook():
+    """Verify and store the event; stripe_inbox.py applies it asynchronously."""
     payload = request.get_data()
     sig_header = request.headers.get('Stripe-Signature')
     
-    event = None
     try:
-        event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
-    except ValueError as e:
+        if Config.STRIPE_WEBHOOK_SECRET:
+            # Raises if the signature doesn't match; the raw payload is what gets stored
+            stripe.Webhook.construct_event(payload, sig_header, Config.STRIPE_WEBHOOK_SECRET)
+        event = json.loads(payload)
+        if not event.get('id') or not event.get('type'):
+            raise ValueError('Missing event id or type')
+    except (ValueError, AttributeError, stripe.SignatureVerificationError) as e:
         return jsonify(error=str(e)), 400
 
-    # Handle the checkout.session.completed event
-    if event.type == 'checkout.session.completed':
-        session = event.data.object
-        user_id = session.client_reference_id
-        if user_id:
-            user = User.query.get(user_id)
-            if user:
-                user.is_pro = True
-                user.stripe_customer_id = session.customer
-                db.session.commit()
-                print(f"User {user.email} upgraded to PRO!")
-
+    if not stripe_inbox.store_event(event):
+        return jsonify(success=True, duplicate=True), 200
     return jsonify(success=True), 200
 
+# --- LEADERBOARD ROUTES ---
+def _display_name(email):
+    local = (email or '').split('@')[0]
+    return local[:2] + '***' if len(local) > 2 else local + '***'
+
+@api_bp.route('/leaderboard', methods=['GET'])
+@token_required
+def get_leaderboard(current_user):
+    # Current streaks, all users or one goal topic (leaderboard.py)
+    topic = request.args.get('topic') or None
+    limit = min(request.args.get('limit', 20, type=int), Config.LEADERBOARD_MAX_LIMIT)
+    entries, (my_rank, my_streak), size = leaderboard.standings(current_user.id, topic, max(limit, 1))
+    emails = dict(db.session.query(User.id, User.email).filter(User.id.in_([e[1] for e in entries])).all()) \
+        if entries else {}
+    return jsonify({
+        'topic': topic,
+        'size': size,
+        'entries': [{
+            'rank': rank,
+            'name': _display_name(emails.get(user_id)),
+            'streak': streak,
+            'is_me': user_id == current_user.id
+        } for rank, user_id, streak in entries],
+        'me': {'rank': my_rank, 'streak': my_streak} if my_rank else None
+    }), 200
+
 # --- HABIT ROUTES ---
 @api_bp.route('/habits', methods=['GET'])
 @token_required
 def get_habits(current_user):
-    habits = Habit.query.filter_by(user_id=current_user.id).all()
+    habits = Habit.query.filter_by(user_id=current_user.id, deleted_at=None).all()
     result = []
     today = datetime.now(timezone.utc).date()
     for h in habits:
@@ -438,7 +649,7 @@ def create_habit(current_user):
 @api_bp.route('/habits/<int:habit_id>', methods=['PUT'])
 @token_required
 def update_habit(current_user, habit_id):
-    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id, deleted_at=None).first()
     if not habit:
         return jsonify({'message': 'Habit not found'}), 404
     data = request.get_json()
@@ -452,17 +663,16 @@ def update_habit(current_user, habit_id):
 @api_bp.route('/habits/<int:habit_id>', methods=['DELETE'])
 @token_required
 def delete_habit(current_user, habit_id):
-    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id, deleted_at=None).first()
     if not habit:
         return jsonify({'message': 'Habit not found'}), 404
-    db.session.delete(habit)
-    db.session.commit()
+    deletions.delete_later(current_app._get_current_object(), habit, 'habit')
     return jsonify({'message': 'Habit deleted'}), 200
 
 @api_bp.route('/habits/<int:habit_id>/log', methods=['POST'])
 @token_required
 def log_habit(current_user, habit_id):
-    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id, deleted_at=None).first()
     if not habit:
         return jsonify({'message': 'Habit not found'}), 404
     today = datetime.now(timezone.utc).date()
@@ -470,19 +680,33 @@ def log_habit(current_user, habit_id):
     if existing:
         # Toggle off
         db.session.delete(existing)
+        learning_events.habit_toggled(current_user.id, habit_id, today, False)
         db.session.commit()
+        _publish_habit(current_user.id, habit_id, today, False)
         return jsonify({'message': 'Habit unchecked', 'completed': False}), 200
     log = HabitLog(habit_id=habit_id, user_id=current_user.id, date=today, completed=True)
     db.session.add(log)
-    db.session.commit()
+    learning_events.habit_toggled(current_user.id, habit_id, today, True)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request logged it first (uq_habit_log_habit_user_date)
+        db.session.rollback()
+        return jsonify({'message': 'Habit logged', 'completed': True}), 200
+    _publish_habit(current_user.id, habit_id, today, True)
     return jsonify({'message': 'Habit logged', 'completed': True}), 200
 
+def _publish_habit(user_id, habit_id, day, completed):
+    invalidate_stats(user_id)
+    live_updates.publish(user_id, 'habit', {'habit_id': habit_id, 'date': day.isoformat(), 'completed': completed})
+
 @api_bp.route('/habits/heatmap', methods=['GET'])
 @token_required
 def habit_heatmap(current_user):
     # Last 365 days of habit completions across all habits
     start_date = datetime.now(timezone.utc).date() - timedelta(days=365)
-    logs = HabitLog.query.filter(
+    logs = HabitLog.query.join(Habit, Habit.id == HabitLog.habit_id).filter(
+        Habit.deleted_at.is_(None),
         HabitLog.user_id == current_user.id,
         HabitLog.date >= start_date,
         HabitLog.completed == True
@@ -497,12 +721,17 @@ def habit_heatmap(current_user):
 @api_bp.route('/skills', methods=['GET'])
 @token_required
 def get_skills(current_user):
-    skills = Skill.query.all()
+    skills = Skill.query.filter_by(deleted_at=None).all()
+    progress_by_skill = {p.skill_id: p for p in UserSkillProgress.query.filter_by(user_id=current_user.id).all()}
+    mastery_by_skill = {}
+    for m in UserTopicMastery.query.filter_by(user_id=current_user.id).all():
+        mastery_by_skill.setdefault(m.skill_id, []).append(m.to_dict())
     result = []
     for s in skills:
         sd = s.to_dict()
-        progress = UserSkillProgress.query.filter_by(user_id=current_user.id, skill_id=s.id).first()
+        progress = progress_by_skill.get(s.id)
         sd['progress'] = progress.to_dict() if progress else {'completion_pct': 0, 'topics_done': 0}
+        sd['progress']['topics'] = mastery_by_skill.get(s.id, [])
         result.append(sd)
     return jsonify({'skills': result}), 200
 
@@ -516,6 +745,8 @@ def create_skill(current_user):
     
     # Check for duplicates (case-insensitive)
     existing = Skill.query.filter(db.func.lower(Skill.name) == name.lower()).first()
+    if existing and existing.deleted_at:
+        return jsonify({'message': 'A skill with this name is still being deleted, try again shortly'}), 409
     if existing:
         return jsonify({'message': 'Skill already exists', 'skill': existing.to_dict()}), 200
     
@@ -535,26 +766,25 @@ def create_skill(current_user):
             topic = Topic(skill_id=skill.id, name=topic_name.strip(), order=i + 1)
             db.session.add(topic)
     db.session.commit()
+    skill_progress.invalidate()
     
     return jsonify({'skill': skill.to_dict()}), 201
 
 @api_bp.route('/skills/<int:skill_id>', methods=['DELETE'])
 @token_required
 def delete_skill(current_user, skill_id):
-    skill = Skill.query.get(skill_id)
+    skill = Skill.query.filter_by(id=skill_id, deleted_at=None).first()
     if not skill:
         return jsonify({'message': 'Skill not found'}), 404
-    # Delete related topics and progress
-    Topic.query.filter_by(skill_id=skill_id).delete()
-    UserSkillProgress.query.filter_by(skill_id=skill_id).delete()
-    db.session.delete(skill)
-    db.session.commit()
+    # Topics and every user's progress are removed in the background (deletions.py)
+    deletions.delete_later(current_app._get_current_object(), skill, 'skill')
+    skill_progress.invalidate()
     return jsonify({'message': 'Skill deleted'}), 200
 
 @api_bp.route('/skills/<int:skill_id>/topics', methods=['POST'])
 @token_required
 def add_topic(current_user, skill_id):
-    skill = Skill.query.get(skill_id)
+    skill = Skill.query.filter_by(id=skill_id, deleted_at=None).first()
     if not skill:
         return jsonify({'message': 'Skill not found'}), 404
     data = request.get_json()
@@ -564,41 +794,44 @@ def add_topic(current_user, skill_id):
     max_order = db.session.query(db.func.max(Topic.order)).filter_by(skill_id=skill_id).scalar() or 0
     topic = Topic(skill_id=skill_id, name=name, description=data.get('description', ''), order=max_order + 1)
     db.session.add(topic)
+    db.session.flush()
+    # One more topic to master: existing percentages shrink
+    skill_progress.refresh_completion(skill_id)
     db.session.commit()
+    skill_progress.invalidate()
     return jsonify({'topic': topic.to_dict()}), 201
 
 @api_bp.route('/skills/<int:skill_id>/progress', methods=['GET'])
 @token_required
 def get_skill_progress(current_user, skill_id):
-    skill = Skill.query.get(skill_id)
+    skill = Skill.query.filter_by(id=skill_id, deleted_at=None).first()
     if not skill:
         return jsonify({'message': 'Skill not found'}), 404
     progress = UserSkillProgress.query.filter_by(user_id=current_user.id, skill_id=skill_id).first()
+    mastery = UserTopicMastery.query.filter_by(user_id=current_user.id, skill_id=skill_id).all()
+    progress_dict = progress.to_dict() if progress else {'completion_pct': 0, 'topics_done': 0}
+    progress_dict['topics'] = [m.to_dict() for m in mastery]
     return jsonify({
         'skill': skill.to_dict(),
-        'progress': progress.to_dict() if progress else {'completion_pct': 0, 'topics_done': 0}
+        'progress': progress_dict
     }), 200
 
 @api_bp.route('/skills/<int:skill_id>/progress', methods=['PUT'])
 @token_required
 def update_skill_progress(current_user, skill_id):
-    data = request.get_json()
+    # Progress is derived from practice attempts (skill_progress.py) and can no longer be set by clients
     progress = UserSkillProgress.query.filter_by(user_id=current_user.id, skill_id=skill_id).first()
-    if not progress:
-        progress = UserSkillProgress(user_id=current_user.id, skill_id=skill_id)
-        db.session.add(progress)
-    if 'completion_pct' in data:
-        progress.completion_pct = data['completion_pct']
-    if 'topics_done' in data:
-        progress.topics_done = data['topics_done']
-    db.session.commit()
-    return jsonify({'progress': progress.to_dict()}), 200
+    return jsonify({
+        'message': 'Skill progress is calculated from practice results and cannot be set',
+        'progress': progress.to_dict() if progress else {'completion_pct': 0, 'topics_done': 0}
+    }), 410
 
 # --- ANALYTICS ROUTES ---
 @api_bp.route('/analytics/summary', methods=['GET'])
 @token_required
 def analytics_summary(current_user):
-    thirty_days_ago = datetime.now(timezone.utc).date() - timedelta(days=30)
+    today = streaks.local_today(current_user.timezone)
+    thirty_days_ago = today - timedelta(days=30)
     logs = DailyLog.query.filter(DailyLog.user_id == current_user.id, DailyLog.date >= thirty_days_ago).order_by(DailyLog.date).all()
     
     total_attempted = sum(l.questions_attempted for l in logs)
@@ -609,7 +842,7 @@ def analytics_summary(current_user):
     # Weekly breakdown (last 4 weeks)
     weekly_data = []
     for week in range(4):
-        week_start = datetime.now(timezone.utc).date() - timedelta(days=(3 - week) * 7 + 6)
+        week_start = today - timedelta(days=(3 - week) * 7 + 6)
         week_end = week_start + timedelta(days=6)
         week_logs = [l for l in logs if week_start <= l.date <= week_end]
         wa = sum(l.questions_attempted for l in week_logs)
@@ -625,7 +858,7 @@ def analytics_summary(current_user):
     # Daily trend (last 14 days)
     daily_trend = []
     for i in range(14):
-        day = datetime.now(timezone.utc).date() - timedelta(days=13 - i)
+        day = today - timedelta(days=13 - i)
         day_log = next((l for l in logs if l.date == day), None)
         daily_trend.append({
             'date': day.isoformat(),
@@ -652,3 +885,39 @@ def analytics_summary(current_user):
         'weekly': weekly_data,
         'daily_trend': daily_trend
     }), 200
+
+# --- ADMIN ROUTES ---
+@api_bp.route('/admin/analytics/<name>', methods=['GET'])
+@token_required
+@admin_required
+def admin_analytics(current_user, name):
+    # retention, topics or streaks over all users; computed once per UTC day (cohort_analytics.py)
+    if name not in cohort_analytics.REPORTS:
+        return jsonify({'message': f"Unknown report, expected one of {', '.join(cohort_analytics.REPORTS)}"}), 404
+    report = cohort_analytics.get_report(name, refresh=request.args.get('refresh') == '1')
+    return cohort_analytics.report_response(report)
+
+@api_bp.route('/admin/rate-limits', methods=['GET'])
+@token_required
+@admin_required
+def admin_rate_limits(current_user):
+    # Generation quota and Gemini concurrency counters across all users
+    return jsonify({'metrics': rate_limits.metrics()}), 200
+
+@api_bp.route('/admin/events', methods=['GET'])
+@token_required
+@admin_required
+def admin_event_consumers(current_user):
+    # How far each learning_events consumer has got
+    return jsonify({'consumers': learning_events.status()}), 200
+
+@api_bp.route('/admin/questions/stats', methods=['GET'])
+@token_required
+@admin_required
+def admin_question_stats(current_user):
+    # Hardest questions first, from the question_stats consumer
+    min_attempts = request.args.get('min_attempts', 20, type=int)
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+    rows = QuestionStat.query.filter(QuestionStat.attempts >= min_attempts) \
+        .order_by((QuestionStat.correct * 1.0 / QuestionStat.attempts).asc()).limit(limit).all()
+    return jsonify({'questions': [r.to_dict() for r in rows]}), 200
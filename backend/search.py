@@ -0,0 +1,232 @@
+"""
+Ranked full-text search over questions.
+
+Every inserted Question gets a question_search_docs row (question text,
+option texts and explanation flattened into one body) from an after_insert
+hook, so Gemini, built-in and imported questions are searchable as soon as
+they are committed. Ranking uses whatever the database offers:
+
+- MySQL: FULLTEXT index on question_search_docs.body, MATCH ... AGAINST
+- SQLite: an FTS5 table over the same docs, ranked with bm25()
+- anything else (or SEARCH_BACKEND=memory): an in-process BM25 inverted
+  index, built from question_search_docs and topped up from the DB on
+  every search so inserts made by other processes are picked up too
+
+    python search.py rebuild   # backfill docs for questions inserted before this existed
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event, insert, text
+from sqlalchemy.dialects.mysql import match
+
+from app import db
+from config import Config
+from models import Question, QuestionSearchDoc
+
+TOKEN_RE = re.compile(r'[a-z0-9_]+')
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or that the this to what which with'.split())
+
+_backend = None
+
+
+def document_body(question_text, options, explanation):
+    option_text = ' '.join(str(v) for v in (options or {}).values()) if isinstance(options, dict) else ''
+    return ' '.join(p for p in (question_text, option_text, explanation or '') if p)
+
+
+def tokenize(s):
+    return [t for t in TOKEN_RE.findall(s.lower()) if t not in STOPWORDS]
+
+
+# --- IN-PROCESS BM25 ---
+class BM25Index:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_len = {}
+        self.meta = {}  # doc_id -> (topic, difficulty)
+        self.total_len = 0
+        self.max_id = 0
+        self._lock = threading.RLock()
+
+    def add(self, doc_id, body, topic, difficulty):
+        terms = tokenize(body)
+        with self._lock:
+            if doc_id in self.doc_len:
+                return
+            for t in terms:
+                tf = self.postings[t]
+                tf[doc_id] = tf.get(doc_id, 0) + 1
+            self.doc_len[doc_id] = len(terms)
+            self.meta[doc_id] = (topic, difficulty)
+            self.total_len += len(terms)
+            self.max_id = max(self.max_id, doc_id)
+
+    def search(self, query, limit=20, topic=None, difficulty=None):
+        """Return [(doc_id, score)] best first."""
+        with self._lock:
+            n = len(self.doc_len)
+            if not n:
+                return []
+            avg_len = self.total_len / n
+            scores = defaultdict(float)
+            for t in set(tokenize(query)):
+                docs = self.postings.get(t)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for doc_id, tf in docs.items():
+                    dl = self.doc_len[doc_id]
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / avg_len))
+            if topic or difficulty:
+                scores = {d: s for d, s in scores.items()
+                          if (not topic or self.meta[d][0] == topic) and (not difficulty or self.meta[d][1] == difficulty)}
+        return sorted(scores.items(), key=lambda kv: -kv[1])[:limit]
+
+
+_memory_index = BM25Index()
+
+
+def _sync_memory_index(batch_size=2000):
+    """Pull docs newer than what this process has indexed."""
+    while True:
+        docs = QuestionSearchDoc.query.filter(QuestionSearchDoc.question_id > _memory_index.max_id) \
+            .order_by(QuestionSearchDoc.question_id).limit(batch_size).all()
+        for d in docs:
+            _memory_index.add(d.question_id, d.body, d.topic, d.difficulty)
+        if len(docs) < batch_size:
+            return
+
+
+# --- BACKEND SETUP ---
+def _fts5_available(conn):
+    try:
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)"))
+        conn.execute(text("DROP TABLE temp._fts5_probe"))
+        return True
+    except Exception:
+        return False
+
+
+def ensure_index():
+    """Pick the search backend for this database and create the FTS5 table if needed."""
+    global _backend
+    dialect = db.engine.dialect.name
+    if Config.SEARCH_BACKEND == 'memory':
+        _backend = 'memory'
+    elif dialect == 'mysql':
+        _backend = 'mysql'
+    elif dialect == 'sqlite':
+        with db.engine.begin() as conn:
+            if _fts5_available(conn):
+                conn.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS question_fts USING fts5("
+                    "body, content='question_search_docs', content_rowid='question_id')"
+                ))
+                _backend = 'sqlite_fts5'
+            else:
+                _backend = 'memory'
+    else:
+        _backend = 'memory'
+    return _backend
+
+
+def backend():
+    return _backend or ensure_index()
+
+
+@event.listens_for(Question, 'after_insert')
+def _index_new_question(mapper, connection, q):
+    """Runs inside the inserting flush, so the doc commits or rolls back with the question."""
+    body = document_body(q.question_text, q.options, q.explanation)
+    connection.execute(insert(QuestionSearchDoc.__table__).values(
+        question_id=q.id, topic=q.topic, difficulty=q.difficulty, body=body
+    ))
+    if _backend == 'sqlite_fts5':
+        connection.execute(text("INSERT INTO question_fts(rowid, body) VALUES (:id, :body)"), {'id': q.id, 'body': body})
+
+
+# --- QUERYING ---
+def _fts5_query(query):
+    # Quote every token so user input can't inject FTS5 syntax; match any term
+    return ' OR '.join(f'"{t}"' for t in tokenize(query))
+
+
+def search_question_ids(query, limit=20, topic=None, difficulty=None):
+    """Ranked question ids for a free-text query, best first."""
+    if not tokenize(query):
+        return []
+    mode = backend()
+
+    if mode == 'mysql':
+        score = match(QuestionSearchDoc.body, against=query).in_natural_language_mode()
+        q = db.session.query(QuestionSearchDoc.question_id).filter(score > 0)
+        if topic:
+            q = q.filter(QuestionSearchDoc.topic == topic)
+        if difficulty:
+            q = q.filter(QuestionSearchDoc.difficulty == difficulty)
+        return [qid for (qid,) in q.order_by(score.desc()).limit(limit)]
+
+    if mode == 'sqlite_fts5':
+        sql = ("SELECT question_fts.rowid FROM question_fts "
+               "JOIN question_search_docs d ON d.question_id = question_fts.rowid "
+               "WHERE question_fts MATCH :q")
+        params = {'q': _fts5_query(query), 'limit': limit}
+        if topic:
+            sql += " AND d.topic = :topic"
+            params['topic'] = topic
+        if difficulty:
+            sql += " AND d.difficulty = :difficulty"
+            params['difficulty'] = difficulty
+        sql += " ORDER BY bm25(question_fts) LIMIT :limit"
+        return [row[0] for row in db.session.execute(text(sql), params)]
+
+    _sync_memory_index()
+    return [doc_id for doc_id, _ in _memory_index.search(query, limit, topic, difficulty)]
+
+
+def search_questions(query, limit=20, topic=None, difficulty=None):
+    ids = search_question_ids(query, limit, topic, difficulty)
+    if not ids:
+        return []
+    by_id = {q.id: q for q in Question.query.filter(Question.id.in_(ids)).all()}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def rebuild(batch_size=1000):
+    """Backfill docs (and the FTS5 table) for questions that have none. Safe to re-run."""
+    mode = backend()
+    added = 0
+    last_id = 0
+    while True:
+        rows = Question.query.outerjoin(QuestionSearchDoc, QuestionSearchDoc.question_id == Question.id) \
+            .filter(QuestionSearchDoc.question_id.is_(None), Question.id > last_id) \
+            .order_by(Question.id).limit(batch_size).all()
+        if not rows:
+            break
+        for q in rows:
+            body = document_body(q.question_text, q.options, q.explanation)
+            db.session.add(QuestionSearchDoc(question_id=q.id, topic=q.topic, difficulty=q.difficulty, body=body))
+            if mode == 'sqlite_fts5':
+                db.session.execute(text("INSERT INTO question_fts(rowid, body) VALUES (:id, :body)"), {'id': q.id, 'body': body})
+        db.session.commit()
+        added += len(rows)
+        last_id = rows[-1].id
+    print(f"Indexed {added} questions for search ({mode})")
+    return added
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+            rebuild()
+        else:
+            print(f"Search backend: {backend()}")
@@ -2,7 +2,8 @@
 Seed the database with default skills and their topics
 """
 from app import create_app, db
-from models import Skill, Topic
+from models import Skill
+from importer import import_records
 
 DEFAULT_SKILLS = [
     {
@@ -54,34 +55,15 @@ def seed_skills():
             print(f"✓ Database already has {existing_count} skills. Skipping seed.")
             return
         
-        try:
-            for skill_data in DEFAULT_SKILLS:
-                skill = Skill(
-                    name=skill_data['name'],
-                    icon=skill_data['icon'],
-                    description=skill_data['description']
-                )
-                db.session.add(skill)
-                db.session.flush()  # Flush to get the skill ID
-                
-                # Add topics
-                for idx, topic_name in enumerate(skill_data['topics'], 1):
-                    topic = Topic(
-                        name=topic_name,
-                        skill_id=skill.id,
-                        order=idx
-                    )
-                    db.session.add(topic)
-                
-                print(f"✓ Added {skill_data['name']} with {len(skill_data['topics'])} topics")
-            
-            db.session.commit()
-            print(f"\n✓ Successfully seeded {len(DEFAULT_SKILLS)} skills!")
-            
-        except Exception as e:
-            db.session.rollback()
-            print(f"✗ Error seeding skills: {e}")
-            raise
+        records = []
+        for skill_data in DEFAULT_SKILLS:
+            records.append({'kind': 'skill', 'name': skill_data['name'],
+                            'icon': skill_data['icon'], 'description': skill_data['description']})
+            records.extend({'kind': 'topic', 'skill': skill_data['name'], 'name': topic_name, 'order': idx}
+                           for idx, topic_name in enumerate(skill_data['topics'], 1))
+
+        stats = import_records(records)
+        print(f"\n✓ Successfully seeded {stats['skills']} skills with {stats['topics']} topics!")
 
 if __name__ == '__main__':
     seed_skills()
@@ -0,0 +1,72 @@
+"""
+Pre-encoded JSON for question payloads.
+
+A Question never changes after insert, so its public JSON (Question.to_dict(),
+no answer or explanation) is encoded once and kept in a bounded LRU keyed by
+id. List responses are assembled by joining those byte fragments instead of
+rebuilding and re-encoding every dict. orjson is used when installed.
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response
+from config import Config
+
+try:
+    import orjson
+    ENCODER = 'orjson'
+
+    def dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    ENCODER = 'json'
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+_fragments = OrderedDict()
+_lock = threading.Lock()
+
+
+def question_fragment(q):
+    """Encoded public JSON of one question, cached by id."""
+    with _lock:
+        frag = _fragments.get(q.id)
+        if frag is not None:
+            _fragments.move_to_end(q.id)
+            return frag
+
+    frag = dumps(q.to_dict())
+    if q.id is not None:
+        with _lock:
+            _fragments[q.id] = frag
+            if len(_fragments) > Config.QUESTION_FRAGMENT_CACHE_SIZE:
+                _fragments.popitem(last=False)
+    return frag
+
+
+def questions_array(questions):
+    return b'[' + b','.join(question_fragment(q) for q in questions) + b']'
+
+
+def questions_response(questions, status=200, **extra):
+    """
+    Drop-in for jsonify({'questions': [q.to_dict() ...], **extra}), status.
+    """
+    body = b'{"questions":' + questions_array(questions)
+    if extra:
+        body += b',' + dumps(extra)[1:-1]
+    body += b'}'
+    return Response(body, status=status, mimetype='application/json')
+
+
+def forget(question_id):
+    """Drop a cached fragment (only needed if a question is edited or deleted)."""
+    with _lock:
+        _fragments.pop(question_id, None)
+
+
+def clear():
+    with _lock:
+        _fragments.clear()
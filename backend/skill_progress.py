@@ -0,0 +1,266 @@
+"""
+Server-side skill progress.
+
+Practice topics are the strings the Sprint page sends, "Skill" or
+"Skill - Topic", and end up in Question.topic. resolve_topic() maps a
+question to a (skill_id, topic_id) pair. It matches the skill by name, then
+the topic by name, and otherwise looks for a topic name in the question
+text. record_attempts() is applied by the skill_progress consumer of the
+learning event log (learning_events.py), off the request path, and does two
+things:
+
+- bumps user_topic_mastery counters (attempts, correct) with one upsert per topic
+- applies the resulting change to user_skill_progress
+
+A topic is done once it has SKILL_MASTERY_CORRECT correct answers.
+mastery_points adds up min(correct, SKILL_MASTERY_CORRECT) over the
+skill's topics, and completion_pct is mastery_points over
+(SKILL_MASTERY_CORRECT * topic count). The skill routes only read these
+rows.
+
+    python skill_progress.py rebuild   # recompute everything from user_attempts + attempt_rollups
+"""
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import update, func
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from app import db
+from config import Config
+from models import Skill, Topic, Question, UserAttempt, AttemptRollup, UserTopicMastery, UserSkillProgress
+
+CATALOG_TTL = 60  # seconds; other processes' skill/topic edits show up within this
+
+_lock = threading.Lock()
+_catalog = None  # {skill name lower: (skill_id, [(topic_id, topic name lower)] in order)}
+_catalog_loaded_at = 0.0
+_topic_counts = {}  # skill_id -> number of topics
+_resolved = {}  # question_id -> (skill_id, topic_id) or None
+
+
+def invalidate():
+    """Forget the skill/topic catalog; call after creating or deleting skills or topics."""
+    global _catalog
+    with _lock:
+        _catalog = None
+        _resolved.clear()
+
+
+def _load_catalog():
+    global _catalog, _catalog_loaded_at, _topic_counts
+    with _lock:
+        if _catalog is not None and time.monotonic() - _catalog_loaded_at < CATALOG_TTL:
+            return _catalog
+    catalog = {s.name.lower(): (s.id, []) for s in Skill.query.filter_by(deleted_at=None).all()}
+    by_id = {skill_id: topics for skill_id, topics in catalog.values()}
+    for t in Topic.query.order_by(Topic.skill_id, Topic.order, Topic.id).all():
+        if t.skill_id in by_id:
+            by_id[t.skill_id].append((t.id, t.name.lower()))
+    with _lock:
+        if _catalog is not None and _catalog != catalog:
+            _resolved.clear()
+        _catalog = catalog
+        _catalog_loaded_at = time.monotonic()
+        _topic_counts = {skill_id: len(topics) for skill_id, topics in catalog.values()}
+    return catalog
+
+
+def topic_count(skill_id):
+    _load_catalog()
+    return _topic_counts.get(skill_id, 0)
+
+
+def resolve_topic(q):
+    """(skill_id, topic_id) a question counts toward, or None if it maps to no topic."""
+    with _lock:
+        if q.id in _resolved:
+            return _resolved[q.id]
+    catalog = _load_catalog()
+
+    skill_name, _, sub = (q.topic or '').partition(' - ')
+    entry = catalog.get(skill_name.strip().lower())
+    result = None
+    if entry:
+        skill_id, topics = entry
+        sub = sub.strip().lower()
+        topic_id = next((tid for tid, name in topics if name == sub), None) if sub else None
+        if topic_id is None:
+            # "Python" or an unknown subtopic: first topic named in the question itself
+            text = f"{sub} {q.question_text}".lower()
+            topic_id = next((tid for tid, name in topics
+                             if re.search(r'(?<!\w)' + re.escape(name) + r'(?!\w)', text)), None)
+        if topic_id is not None:
+            result = (skill_id, topic_id)
+
+    with _lock:
+        _resolved[q.id] = result
+    return result
+
+
+def upsert_add(model, keys, increments, index_elements, returning):
+    """
+    INSERT keys+increments, or add increments to the existing row on the
+    unique key. Returns the row's `returning` columns after the update.
+    """
+    dialect = db.session.get_bind().dialect.name
+    values = {**keys, **increments}
+    cols = [getattr(model, c) for c in returning]
+
+    if dialect == 'mysql':
+        stmt = mysql.insert(model).values(**values)
+        stmt = stmt.on_duplicate_key_update(**{
+            c: getattr(model, c) + getattr(stmt.inserted, c) for c in increments
+        })
+        db.session.execute(stmt)
+        return db.session.execute(
+            db.select(*cols).filter_by(**keys)
+        ).one()
+
+    if dialect in ('sqlite', 'postgresql'):
+        insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        stmt = insert(model).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=index_elements,
+            set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in increments}
+        ).returning(*cols)
+        return db.session.execute(stmt).one()
+
+    row = model.query.filter_by(**keys).with_for_update().first()
+    if not row:
+        row = model(**values)
+        db.session.add(row)
+    else:
+        for c, v in increments.items():
+            setattr(row, c, (getattr(row, c) or 0) + v)
+    db.session.flush()
+    return tuple(getattr(row, c) for c in returning)
+
+
+def _completion_pct(points, n_topics):
+    if not n_topics:
+        return 0.0
+    return round(min(100.0, points * 100.0 / (Config.SKILL_MASTERY_CORRECT * n_topics)), 1)
+
+
+def record_attempts(user_id, graded):
+    """
+    Fold a submission into topic mastery and skill progress.
+    graded: iterable of (Question, is_correct). The caller commits.
+    """
+    target = Config.SKILL_MASTERY_CORRECT
+    per_topic = defaultdict(lambda: [0, 0])
+    for q, is_correct in graded:
+        mapped = resolve_topic(q)
+        if mapped:
+            per_topic[mapped][0] += 1
+            per_topic[mapped][1] += int(bool(is_correct))
+
+    per_skill = defaultdict(lambda: [0, 0])  # skill_id -> [points gained, topics newly done]
+    # Sorted so concurrent submits lock rows in the same order
+    for (skill_id, topic_id), (attempted, correct) in sorted(per_topic.items()):
+        _, total_correct = upsert_add(
+            UserTopicMastery,
+            keys={'user_id': user_id, 'topic_id': topic_id, 'skill_id': skill_id},
+            increments={'attempts': attempted, 'correct': correct},
+            index_elements=['user_id', 'topic_id'],
+            returning=('attempts', 'correct')
+        )
+        before = total_correct - correct
+        per_skill[skill_id][0] += min(total_correct, target) - min(before, target)
+        per_skill[skill_id][1] += int(before < target <= total_correct)
+
+    for skill_id, (gained, newly_done) in sorted(per_skill.items()):
+        if not gained:
+            continue
+        (points,) = upsert_add(
+            UserSkillProgress,
+            keys={'user_id': user_id, 'skill_id': skill_id},
+            increments={'mastery_points': gained, 'topics_done': newly_done},
+            index_elements=['user_id', 'skill_id'],
+            returning=('mastery_points',)
+        )
+        db.session.execute(
+            update(UserSkillProgress)
+            .where(UserSkillProgress.user_id == user_id, UserSkillProgress.skill_id == skill_id)
+            .values(completion_pct=_completion_pct(points, topic_count(skill_id)))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def refresh_completion(skill_id):
+    """Re-derive completion_pct for every user of a skill after its topic count changed."""
+    n_topics = Topic.query.filter_by(skill_id=skill_id).count()
+    denominator = Config.SKILL_MASTERY_CORRECT * n_topics
+    db.session.execute(
+        update(UserSkillProgress)
+        .where(UserSkillProgress.skill_id == skill_id)
+        .values(completion_pct=(
+            db.case((UserSkillProgress.mastery_points * 100.0 / denominator > 100, 100.0),
+                    else_=func.round(UserSkillProgress.mastery_points * 100.0 / denominator, 1))
+            if denominator else 0.0
+        ))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def rebuild(batch_size=1000):
+    """Recompute all mastery and progress rows from attempts (hot and archived)."""
+    invalidate()
+    target = Config.SKILL_MASTERY_CORRECT
+    counts = defaultdict(lambda: [0, 0])  # (user_id, question_id) -> [attempts, correct]
+    for user_id, question_id, attempts, correct in db.session.query(
+        UserAttempt.user_id, UserAttempt.question_id,
+        func.count(UserAttempt.id), func.sum(db.case((UserAttempt.is_correct == True, 1), else_=0))
+    ).group_by(UserAttempt.user_id, UserAttempt.question_id).yield_per(batch_size):
+        counts[(user_id, question_id)][0] += attempts
+        counts[(user_id, question_id)][1] += int(correct or 0)
+    for ru in AttemptRollup.query.yield_per(batch_size):
+        counts[(ru.user_id, ru.question_id)][0] += ru.attempts or 0
+        counts[(ru.user_id, ru.question_id)][1] += ru.correct or 0
+
+    question_ids = list({qid for _, qid in counts})
+    mapping = {}
+    for i in range(0, len(question_ids), batch_size):
+        for q in Question.query.filter(Question.id.in_(question_ids[i:i + batch_size])).all():
+            mapping[q.id] = resolve_topic(q)
+
+    mastery = defaultdict(lambda: [0, 0])  # (user_id, skill_id, topic_id) -> [attempts, correct]
+    for (user_id, question_id), (attempts, correct) in counts.items():
+        mapped = mapping.get(question_id)
+        if mapped:
+            mastery[(user_id, *mapped)][0] += attempts
+            mastery[(user_id, *mapped)][1] += correct
+
+    progress = defaultdict(lambda: [0, 0])  # (user_id, skill_id) -> [points, topics done]
+    for (user_id, skill_id, _), (_, correct) in mastery.items():
+        progress[(user_id, skill_id)][0] += min(correct, target)
+        progress[(user_id, skill_id)][1] += int(correct >= target)
+
+    UserTopicMastery.query.delete()
+    UserSkillProgress.query.delete()
+    db.session.bulk_insert_mappings(UserTopicMastery, [
+        {'user_id': u, 'skill_id': s, 'topic_id': t, 'attempts': a, 'correct': c}
+        for (u, s, t), (a, c) in mastery.items()
+    ])
+    db.session.bulk_insert_mappings(UserSkillProgress, [
+        {'user_id': u, 'skill_id': s, 'mastery_points': p, 'topics_done': d,
+         'completion_pct': _completion_pct(p, topic_count(s))}
+        for (u, s), (p, d) in progress.items()
+    ])
+    db.session.commit()
+    print(f"Rebuilt {len(mastery)} topic mastery rows and {len(progress)} skill progress rows")
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+            rebuild()
+        else:
+            print("Usage: python skill_progress.py rebuild")
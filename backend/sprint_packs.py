@@ -0,0 +1,188 @@
+"""
+Precomputed daily sprint packs.
+
+A pack is one user's practice set for one local date. It stores the chosen
+question ids and their encoded JSON, so /practice/daily is a single keyed
+read and refreshing the page returns the same set all day. Changing the
+goal discards the user's current and upcoming packs.
+
+build_upcoming_packs() runs hourly from cron. For each recently active user
+with a goal, it builds the pack for the user's local date SPRINT_PACK_LEAD_HOURS
+from now, i.e. tomorrow's pack from 18:00 local onwards. Timezones spread the
+work across the night. SPRINT_PACK_MAX_GENERATIONS caps Gemini calls per run;
+users over the cap are picked up by the next run. A user without a pack (new,
+or inactive) gets one built on their first request of the day.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from flask import Response
+from sqlalchemy.exc import IntegrityError
+
+import gemini
+import question_cache
+import serializers
+from app import db
+from config import Config
+from models import User, UserGoal, Question, DailyLog, SprintPack, JobRun
+from streaks import user_zone
+
+
+def get_pack(user_id, day):
+    return SprintPack.query.filter_by(user_id=user_id, date=day).first()
+
+
+def discard_packs(user_id, from_day):
+    """Drop packs dated from_day onwards; the caller commits."""
+    SprintPack.query.filter(SprintPack.user_id == user_id, SprintPack.date >= from_day) \
+        .delete(synchronize_session=False)
+
+
+def matches_goal(pack, goal):
+    return (pack.topic == goal.topic and pack.difficulty == goal.difficulty
+            and pack.question_count == goal.daily_question_target)
+
+
+def pack_response(pack):
+    body = b'{"questions":' + pack.payload.encode('utf-8') + b',"date":"' + pack.date.isoformat().encode() + b'"}'
+    return Response(body, status=200, mimetype='application/json')
+
+
+def _generate(topic, difficulty, count):
+    """Gemini questions saved to the DB; shares the route's single-flight cache key."""
+    def save():
+        new_questions = [
+            Question(topic=topic, difficulty=difficulty, question_text=q['question_text'], options=q['options'],
+                     correct_option=q['correct_option'], explanation=q['explanation'])
+            for q in gemini.generate_questions(topic, difficulty, count)
+        ]
+        db.session.add_all(new_questions)
+        db.session.commit()
+        return [q.id for q in new_questions]
+
+    try:
+        ids = gemini.coalesced(gemini.build_prompt(topic, difficulty, count), save)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Gemini generation for sprint pack failed: {e}")
+        return []
+    by_id = question_cache.get_many(ids) if ids else {}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+def _select_questions(goal, allow_generation):
+    """Same choice as the old inline /practice/daily: goal's DB questions, topped up by Gemini, else anything."""
+    count = goal.daily_question_target
+    questions = question_cache.sample(goal.topic, goal.difficulty, count)
+    source = 'db'
+    if len(questions) < count and gemini.is_configured() and allow_generation():
+        generated = _generate(goal.topic, goal.difficulty, count - len(questions))
+        if generated:
+            source = 'mixed' if questions else 'gemini'
+            questions.extend(generated)
+    if not questions:
+        questions = Question.query.order_by(db.func.random()).limit(5).all()
+    return questions, source
+
+
+def build_pack(user_id, goal, day, allow_generation=lambda: True):
+    """
+    Build and store the pack for (user, day), replacing one built for an
+    older goal. allow_generation is only called if Gemini would be needed.
+    Returns the pack, or None if there are no questions at all.
+    """
+    stale = get_pack(user_id, day)
+    if stale is not None:
+        if matches_goal(stale, goal):
+            return stale
+        db.session.delete(stale)
+        db.session.flush()
+
+    questions, source = _select_questions(goal, allow_generation)
+    if not questions:
+        db.session.rollback()
+        return None
+    pack = SprintPack(
+        user_id=user_id, date=day, topic=goal.topic, difficulty=goal.difficulty,
+        question_count=goal.daily_question_target, question_ids=[q.id for q in questions],
+        payload=serializers.questions_array(questions).decode('utf-8'), source=source
+    )
+    db.session.add(pack)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # A concurrent request built it first; everyone serves that one
+        db.session.rollback()
+        return get_pack(user_id, day)
+    return pack
+
+
+def _active_users_with_goals(after_id, chunk_size, since):
+    recently_practiced = db.session.query(DailyLog.id).filter(
+        DailyLog.user_id == User.id, DailyLog.date >= since.date()
+    ).exists()
+    return db.session.query(User.id, User.timezone, UserGoal).join(UserGoal, UserGoal.user_id == User.id) \
+        .filter(User.id > after_id, User.deleted_at.is_(None), db.or_(recently_practiced, User.created_at >= since)) \
+        .order_by(User.id).limit(chunk_size).all()
+
+
+def build_upcoming_packs(chunk_size=500, now=None):
+    """Hourly job: build packs for each active user's upcoming local day. Records a JobRun."""
+    now = now or datetime.now(timezone.utc)
+    run = JobRun(job_name='sprint_packs', started_at=now, status='running')
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    examined = built = deferred = 0
+    budget = [Config.SPRINT_PACK_MAX_GENERATIONS]
+
+    def spend_generation():
+        if budget[0] <= 0:
+            return False
+        budget[0] -= 1
+        return True
+
+    try:
+        since = now - timedelta(days=Config.SPRINT_PACK_ACTIVE_DAYS)
+        after_id = ''
+        while True:
+            rows = _active_users_with_goals(after_id, chunk_size, since)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+            targets = {uid: (now + timedelta(hours=Config.SPRINT_PACK_LEAD_HOURS)).astimezone(user_zone(tz)).date()
+                       for uid, tz, _ in rows}
+            existing = {(p.user_id, p.date): p for p in SprintPack.query.filter(
+                SprintPack.user_id.in_(list(targets)), SprintPack.date.in_(set(targets.values()))
+            ).all()}
+            for user_id, tz_name, goal in rows:
+                examined += 1
+                day = targets[user_id]
+                pack = existing.get((user_id, day))
+                if pack is not None and matches_goal(pack, goal):
+                    continue
+                local_today = now.astimezone(user_zone(tz_name)).date()
+                if budget[0] <= 0 and day > local_today:
+                    # Out of Gemini budget and not needed yet: leave it for the next run
+                    available = len(question_cache.pool(goal.topic, goal.difficulty))
+                    if available < goal.daily_question_target:
+                        deferred += 1
+                        continue
+                if build_pack(user_id, goal, day, allow_generation=spend_generation) is not None:
+                    built += 1
+        run.status = 'success'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        raise
+    finally:
+        run.rows_examined = examined
+        run.rows_affected = built
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.now(timezone.utc)
+        db.session.add(run)
+        db.session.commit()
+        print(f"Sprint packs: examined {examined}, built {built}, deferred {deferred} in {run.duration_ms} ms")
+    return run
@@ -0,0 +1,267 @@
+"""
+Streak segments: each user's goal-met days stored as run-length segments.
+
+A segment is one run of consecutive local dates with a goal-met DailyLog,
+stored as (start_date, end_date). Runs never overlap or touch, so a day is
+placed with a few seeks on uq_streak_segment_user_start and
+idx_streak_segment_user_end, and one or two segment rows change:
+
+    add_day     extend the run ending the day before and/or the one starting
+                the day after (merging them), or start a new one-day run
+    remove_day  shrink a run at either end, delete a one-day run, or split it in two
+    move_day    remove_day + add_day, e.g. after a log is re-dated
+
+Each call locks the user's row first, so concurrent edits of one user's days
+apply one after another. submit_practice calls add_day in the same
+transaction that bumps the counters.
+
+Both streaks follow exactly from the segments. The current streak is the
+length of the user's latest run if it ends on their local today or
+yesterday (the rule rollover_streaks applies), else 0. The longest streak
+is the longest run. verify_streaks() is the nightly audit. It compares
+users.current_streak and longest_streak with the segments in keyset chunks
+and, with fix=True, rewrites the counters that drifted. rebuild() backfills
+segments from daily_logs; counters are only fixed once a rebuild has
+succeeded.
+
+    python streak_segments.py rebuild        # (re)build every user's segments from daily_logs
+    python streak_segments.py verify [--fix]
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, update
+
+from app import db
+from models import User, UserGoal, DailyLog, StreakSegment, JobRun
+from streaks import local_today
+import leaderboard
+
+ONE_DAY = timedelta(days=1)
+
+
+def _lock_user(user_id):
+    db.session.query(User.id).filter(User.id == user_id).with_for_update().first()
+
+
+def _containing(user_id, day):
+    """The segment covering `day`, or None: the last one starting on or before it."""
+    seg = StreakSegment.query.filter(StreakSegment.user_id == user_id, StreakSegment.start_date <= day) \
+        .order_by(StreakSegment.start_date.desc()).first()
+    return seg if seg is not None and seg.end_date >= day else None
+
+
+# --- INCREMENTAL UPDATES ---
+def add_day(user_id, day):
+    """Record a goal-met day. Returns the segment now covering it. The caller commits."""
+    _lock_user(user_id)
+    seg = _containing(user_id, day)
+    if seg is not None:
+        return seg  # already counted
+    left = StreakSegment.query.filter_by(user_id=user_id, end_date=day - ONE_DAY).first()
+    right = StreakSegment.query.filter_by(user_id=user_id, start_date=day + ONE_DAY).first()
+    if left is not None and right is not None:
+        left.end_date = right.end_date
+        db.session.delete(right)
+        seg = left
+    elif left is not None:
+        left.end_date = day
+        seg = left
+    elif right is not None:
+        right.start_date = day
+        seg = right
+    else:
+        seg = StreakSegment(user_id=user_id, start_date=day, end_date=day)
+        db.session.add(seg)
+    db.session.flush()
+    return seg
+
+
+def remove_day(user_id, day):
+    """Forget a goal-met day (e.g. a log was deleted or un-maintained). The caller commits."""
+    _lock_user(user_id)
+    seg = _containing(user_id, day)
+    if seg is None:
+        return
+    if seg.start_date == seg.end_date:
+        db.session.delete(seg)
+    elif day == seg.start_date:
+        seg.start_date = day + ONE_DAY
+    elif day == seg.end_date:
+        seg.end_date = day - ONE_DAY
+    else:
+        db.session.add(StreakSegment(user_id=user_id, start_date=day + ONE_DAY, end_date=seg.end_date))
+        seg.end_date = day - ONE_DAY
+    db.session.flush()
+
+
+def move_day(user_id, old_day, new_day):
+    """A goal-met log was re-dated. The caller commits."""
+    if old_day != new_day:
+        remove_day(user_id, old_day)
+        add_day(user_id, new_day)
+
+
+# --- DERIVED STREAKS ---
+def streaks_from(segments, today):
+    """(current, longest) from one user's segments (any order), as of their local `today`."""
+    latest = max(segments, key=lambda s: s.start_date, default=None)
+    current = latest.length if latest is not None and latest.end_date >= today - ONE_DAY else 0
+    longest = max((s.length for s in segments), default=0)
+    return current, longest
+
+
+def user_streaks(user_id, tz_name):
+    return streaks_from(StreakSegment.query.filter_by(user_id=user_id).all(), local_today(tz_name))
+
+
+# --- BULK JOBS ---
+def _segments_of(user_ids):
+    by_user = {uid: [] for uid in user_ids}
+    for seg in StreakSegment.query.filter(StreakSegment.user_id.in_(user_ids)):
+        by_user[seg.user_id].append(seg)
+    return by_user
+
+
+def _rebuild_chunk(user_ids):
+    """Replace the segments of these users with runs read from their goal-met daily_logs."""
+    user_ids = [uid for (uid,) in db.session.query(User.id).filter(
+        User.id.in_(user_ids), User.deleted_at.is_(None)
+    ).with_for_update()]
+    if not user_ids:
+        db.session.commit()
+        return 0
+    StreakSegment.query.filter(StreakSegment.user_id.in_(user_ids)).delete(synchronize_session=False)
+    rows = []
+    user_id = start = end = None
+    for uid, day in db.session.query(DailyLog.user_id, DailyLog.date).filter(
+        DailyLog.user_id.in_(user_ids), DailyLog.streak_maintained == True
+    ).order_by(DailyLog.user_id, DailyLog.date):
+        if uid == user_id and day == end + ONE_DAY:
+            end = day
+            continue
+        if user_id is not None:
+            rows.append({'user_id': user_id, 'start_date': start, 'end_date': end})
+        user_id, start, end = uid, day, day
+    if user_id is not None:
+        rows.append({'user_id': user_id, 'start_date': start, 'end_date': end})
+    if rows:
+        db.session.bulk_insert_mappings(StreakSegment, rows)
+    db.session.commit()
+    return len(rows)
+
+
+def _run_job(job_name, chunk_fn, chunk_size):
+    """Keyset pass over users, chunk_fn(ids) -> rows affected per chunk, recorded as a JobRun."""
+    run = JobRun(job_name=job_name, started_at=datetime.now(timezone.utc), status='running')
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    examined = affected = 0
+    try:
+        after_id = ''
+        while True:
+            # On the primary key alone so it's a range scan; chunk_fn skips deleted users
+            ids = [uid for (uid,) in db.session.query(User.id).filter(
+                User.id > after_id
+            ).order_by(User.id).limit(chunk_size)]
+            if not ids:
+                break
+            after_id = ids[-1]
+            examined += len(ids)
+            affected += chunk_fn(ids)
+        run.status = 'success'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        raise
+    finally:
+        run.rows_examined = examined
+        run.rows_affected = affected
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.now(timezone.utc)
+        db.session.add(run)
+        db.session.commit()
+    return run
+
+
+def rebuild(chunk_size=1000):
+    """Backfill or repair every user's segments from daily_logs. Records a JobRun."""
+    run = _run_job('streak_segments_rebuild', _rebuild_chunk, chunk_size)
+    print(f"Streak segments: rebuilt {run.rows_affected} segments for {run.rows_examined} users "
+          f"in {run.duration_ms} ms")
+    return run
+
+
+def _rebuilt():
+    return db.session.query(JobRun.id).filter_by(job_name='streak_segments_rebuild', status='success').first() is not None
+
+
+def verify_streaks(fix=False, chunk_size=1000, now=None):
+    """
+    Nightly audit: compare every user's streak counters with their segments.
+    With fix=True (and segments backfilled by rebuild()), rewrite the drifted
+    counters and update the leaderboard. Records a JobRun; rows_affected is
+    the number of users that drifted.
+    """
+    now = now or datetime.now(timezone.utc)
+    fix = fix and _rebuilt()
+    fixed = []  # (user_id, current streak) changed, for the leaderboard after commit
+
+    def check(user_ids):
+        # Counters first, then segments: a submit committing in between leaves the
+        # segments ahead of the counters read, and the compare-and-set below misses
+        users = db.session.query(
+            User.id, User.timezone, User.current_streak, User.longest_streak
+        ).filter(User.id.in_(user_ids), User.deleted_at.is_(None)).all()
+        segments = _segments_of(user_ids)
+        drifted = []
+        for uid, tz_name, current, longest in users:
+            expected = streaks_from(segments[uid], local_today(tz_name, now))
+            if (current or 0, longest or 0) != expected:
+                drifted.append((uid, current, longest, *expected))
+        for uid, current, longest, exp_current, exp_longest in drifted[:5]:
+            print(f"  streak drift {uid}: counters {current}/{longest}, segments {exp_current}/{exp_longest}")
+        if fix and drifted:
+            for uid, current, longest, exp_current, exp_longest in drifted:
+                # Only if the counters still hold what was read, so a concurrent submit isn't overwritten
+                result = db.session.execute(
+                    update(User)
+                    .where(User.id == uid,
+                           func.coalesce(User.current_streak, 0) == (current or 0),
+                           func.coalesce(User.longest_streak, 0) == (longest or 0))
+                    .values(current_streak=exp_current, longest_streak=exp_longest)
+                    .execution_options(synchronize_session=False)
+                )
+                if result.rowcount:
+                    fixed.append((uid, exp_current))
+            db.session.commit()
+        return len(drifted)
+
+    run = _run_job('streak_verify', check, chunk_size)
+    if fixed:
+        topics = dict(db.session.query(UserGoal.user_id, UserGoal.topic)
+                      .filter(UserGoal.user_id.in_([uid for uid, _ in fixed])))
+        for uid, streak in fixed:
+            if streak:
+                leaderboard.record_streak(uid, streak, topics.get(uid))
+        leaderboard.forget([uid for uid, streak in fixed if not streak])
+    print(f"Streak verify: {run.rows_affected} of {run.rows_examined} users drifted"
+          + (f", {len(fixed)} fixed" if fix else '') + f" in {run.duration_ms} ms")
+    return run
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+            rebuild()
+        elif len(sys.argv) > 1 and sys.argv[1] == 'verify':
+            verify_streaks(fix='--fix' in sys.argv)
+        else:
+            print(__doc__)
@@ -0,0 +1,105 @@
+"""
+Streak bookkeeping.
+
+DailyLog rows are dated in the user's own timezone (User.timezone), so
+"missed a day" means a local calendar day went by without the daily goal.
+rollover_streaks() is the nightly job that resets current_streak for those
+users. It runs per timezone and in keyset chunks of user ids, using one
+set-based UPDATE per chunk. Re-running it, including after a crash halfway
+through, is harmless: a reset streak just no longer matches.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import update, exists, and_
+
+from app import db
+from models import User, DailyLog, JobRun
+import leaderboard
+import live_updates
+
+
+def user_zone(tz_name):
+    try:
+        return ZoneInfo(tz_name) if tz_name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def local_today(tz_name, now=None):
+    """Calendar date right now in the given IANA timezone (UTC if unknown)."""
+    now = now or datetime.now(timezone.utc)
+    return now.astimezone(user_zone(tz_name)).date()
+
+
+def _reset_chunk(tz_name, after_id, chunk_size, keep_dates):
+    """Reset one keyset chunk of users in tz_name. Returns (last id, examined, reset)."""
+    tz_filter = User.timezone == tz_name if tz_name is not None else User.timezone.is_(None)
+    ids = [uid for (uid,) in db.session.query(User.id).filter(
+        tz_filter, User.current_streak > 0, User.id > after_id
+    ).order_by(User.id).limit(chunk_size)]
+    if not ids:
+        return None, 0, 0
+
+    # Anti-join: no goal-met log on local yesterday or today
+    maintained_recently = exists().where(and_(
+        DailyLog.user_id == User.id,
+        DailyLog.date.in_(keep_dates),
+        DailyLog.streak_maintained == True
+    ))
+    to_reset = [uid for (uid,) in db.session.query(User.id).filter(
+        User.id.in_(ids), User.current_streak > 0, ~maintained_recently
+    )]
+    if to_reset:
+        db.session.execute(
+            update(User)
+            .where(User.id.in_(to_reset), User.current_streak > 0, ~maintained_recently)
+            .values(current_streak=0)
+            .execution_options(synchronize_session=False)
+        )
+    db.session.commit()
+    leaderboard.forget(to_reset)
+    live_updates.publish_streak_resets(to_reset)
+    return ids[-1], len(ids), len(to_reset)
+
+
+def rollover_streaks(chunk_size=1000, now=None):
+    """
+    Reset current_streak to 0 for every user whose local yesterday passed
+    without a goal-met DailyLog (today's log also keeps the streak, so a user
+    who already practiced today is never reset). Records a JobRun.
+    Must be called inside an app context.
+    """
+    now = now or datetime.now(timezone.utc)
+    run = JobRun(job_name='streak_rollover', started_at=now, status='running')
+    db.session.add(run)
+    db.session.commit()
+
+    started = time.perf_counter()
+    examined = reset = 0
+    try:
+        zones = [tz for (tz,) in db.session.query(User.timezone).filter(User.current_streak > 0).distinct()]
+        for tz_name in zones:
+            today = local_today(tz_name, now)
+            keep_dates = [today - timedelta(days=1), today]
+            after_id = ''
+            while after_id is not None:
+                after_id, n_examined, n_reset = _reset_chunk(tz_name, after_id, chunk_size, keep_dates)
+                examined += n_examined
+                reset += n_reset
+        run.status = 'success'
+    except Exception as e:
+        db.session.rollback()
+        run.status = 'failed'
+        run.error = str(e)
+        raise
+    finally:
+        run.rows_examined = examined
+        run.rows_affected = reset
+        run.duration_ms = int((time.perf_counter() - started) * 1000)
+        run.finished_at = datetime.now(timezone.utc)
+        db.session.add(run)
+        db.session.commit()
+        print(f"Streak rollover: examined {examined}, reset {reset} in {run.duration_ms} ms")
+    return run
@@ -0,0 +1,221 @@
+"""
+Stripe webhook inbox.
+
+The webhook route only verifies the event and stores it in stripe_events
+(keyed by event id, so Stripe retries are dropped). This module processes
+the inbox in batches, off the request path:
+
+    python stripe_inbox.py                       # run the worker loop
+    python stripe_inbox.py replay events/*.json  # feed recorded events, then process them
+
+Several workers may run at once: each batch is claimed with a token first.
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from models import StripeEvent, User
+
+MAX_ATTEMPTS = 5
+CLAIM_TIMEOUT = timedelta(minutes=5)  # a claim older than this belongs to a dead worker
+
+ACTIVE_SUBSCRIPTION_STATUSES = ('active', 'trialing')
+ENDED_SUBSCRIPTION_STATUSES = ('canceled', 'unpaid', 'incomplete_expired')
+
+
+def store_event(event):
+    """
+    Insert a parsed event dict into the inbox. Returns False if this event id
+    was already received.
+    """
+    row = StripeEvent(
+        id=event['id'],
+        type=event['type'],
+        payload=json.dumps(event),
+        stripe_created=event.get('created'),
+        status='pending'
+    )
+    db.session.add(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    return True
+
+
+# --- HANDLERS ---
+# Each handler gets the event's data.object dict and a user lookup for the
+# batch; it mutates User rows and the batch is committed once.
+
+def _handle_checkout_completed(obj, users):
+    user = users.by_id(obj.get('client_reference_id'))
+    if user:
+        user.is_pro = True
+        user.stripe_customer_id = obj.get('customer') or user.stripe_customer_id
+        print(f"User {user.email} upgraded to PRO!")
+
+
+def _handle_subscription_updated(obj, users):
+    user = users.by_customer(obj.get('customer'))
+    if not user:
+        return
+    status = obj.get('status')
+    if status in ACTIVE_SUBSCRIPTION_STATUSES:
+        user.is_pro = True
+    elif status in ENDED_SUBSCRIPTION_STATUSES:
+        user.is_pro = False
+    # past_due/incomplete: keep access while Stripe retries the payment
+
+
+def _handle_subscription_deleted(obj, users):
+    user = users.by_customer(obj.get('customer'))
+    if user:
+        user.is_pro = False
+        print(f"User {user.email} subscription cancelled")
+
+
+def _handle_invoice_paid(obj, users):
+    # Subscription renewal
+    user = users.by_customer(obj.get('customer'))
+    if user:
+        user.is_pro = True
+
+
+def _handle_invoice_payment_failed(obj, users):
+    user = users.by_customer(obj.get('customer'))
+    if user:
+        print(f"Payment failed for {user.email}; waiting for Stripe retries")
+
+
+HANDLERS = {
+    'checkout.session.completed': _handle_checkout_completed,
+    'customer.subscription.created': _handle_subscription_updated,
+    'customer.subscription.updated': _handle_subscription_updated,
+    'customer.subscription.deleted': _handle_subscription_deleted,
+    'invoice.paid': _handle_invoice_paid,
+    'invoice.payment_succeeded': _handle_invoice_paid,
+    'invoice.payment_failed': _handle_invoice_payment_failed,
+}
+
+
+class _BatchUsers:
+    """Users referenced by a batch, loaded with two queries instead of one per event."""
+
+    def __init__(self, objects):
+        user_ids = {o.get('client_reference_id') for o in objects} - {None}
+        customers = {o.get('customer') for o in objects} - {None}
+        self._by_id = {u.id: u for u in User.query.filter(User.id.in_(user_ids)).all()} if user_ids else {}
+        self._by_customer = {
+            u.stripe_customer_id: u
+            for u in User.query.filter(User.stripe_customer_id.in_(customers)).all()
+        } if customers else {}
+
+    def by_id(self, user_id):
+        return self._by_id.get(user_id)
+
+    def by_customer(self, customer_id):
+        user = self._by_customer.get(customer_id)
+        if user is None:
+            # May have been linked by a checkout event earlier in this batch
+            user = next((u for u in self._by_id.values() if u.stripe_customer_id == customer_id), None)
+        return user
+
+
+def _claim_batch(batch_size):
+    now = datetime.now(timezone.utc)
+    token = str(uuid.uuid4())
+    candidates = [eid for (eid,) in db.session.query(StripeEvent.id).filter(
+        db.or_(
+            StripeEvent.status == 'pending',
+            db.and_(StripeEvent.status == 'processing', StripeEvent.claimed_at < now - CLAIM_TIMEOUT)
+        )
+    ).order_by(StripeEvent.stripe_created).limit(batch_size)]
+    if not candidates:
+        return []
+
+    StripeEvent.query.filter(
+        StripeEvent.id.in_(candidates),
+        db.or_(
+            StripeEvent.status == 'pending',
+            db.and_(StripeEvent.status == 'processing', StripeEvent.claimed_at < now - CLAIM_TIMEOUT)
+        )
+    ).update({'status': 'processing', 'claimed_by': token, 'claimed_at': now}, synchronize_session=False)
+    db.session.commit()
+    return StripeEvent.query.filter_by(claimed_by=token, status='processing') \
+        .order_by(StripeEvent.stripe_created).all()
+
+
+def process_pending(batch_size=100):
+    """Process one batch of inbox events in Stripe creation order. Returns the batch size."""
+    rows = _claim_batch(batch_size)
+    if not rows:
+        return 0
+
+    events = [json.loads(r.payload) for r in rows]
+    users = _BatchUsers([e['data']['object'] for e in events])
+    now = datetime.now(timezone.utc)
+
+    for row, event in zip(rows, events):
+        row.attempts += 1
+        handler = HANDLERS.get(event['type'])
+        try:
+            if handler:
+                handler(event['data']['object'], users)
+            row.status = 'processed'
+            row.processed_at = now
+            row.last_error = None
+        except Exception as e:
+            row.last_error = str(e)
+            row.status = 'failed' if row.attempts >= MAX_ATTEMPTS else 'pending'
+            print(f"Stripe event {row.id} ({row.type}) failed: {e}")
+    db.session.commit()
+    return len(rows)
+
+
+def drain(batch_size=100):
+    """Process batches until the inbox is empty. Returns the number of events handled."""
+    total = 0
+    while True:
+        n = process_pending(batch_size)
+        if not n:
+            return total
+        total += n
+
+
+def run_worker(poll_interval=2.0, batch_size=100):
+    print("Stripe inbox worker started. Press Ctrl+C to exit.")
+    while True:
+        try:
+            if not process_pending(batch_size):
+                time.sleep(poll_interval)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Stripe inbox worker error: {e}")
+            time.sleep(poll_interval)
+
+
+def replay(paths):
+    """Load recorded event JSON files into the inbox and process them."""
+    stored = 0
+    for path in paths:
+        with open(path) as f:
+            if store_event(json.load(f)):
+                stored += 1
+    print(f"Stored {stored} new events, processed {drain()}")
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    app = create_app()
+    with app.app_context():
+        if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+            replay(sys.argv[2:])
+        else:
+            run_worker()
@@ -0,0 +1,77 @@
+"""
+Production entry point:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+gunicorn.conf.py preloads this module in the master, so the app is built and
+its caches (question pools, leaderboard) are warmed once before any worker
+forks; workers inherit them copy-on-write. Each worker then drops the
+master's DB connections and opens its own pool before it accepts requests
+(init_worker, run from post_fork).
+
+The DB pool is sized to the worker's concurrency: one connection per thread
+for gthread workers, capped at 20 for gevent, where most concurrent requests
+are waiting on Gemini, Stripe or an SSE stream rather than on the DB.
+"""
+import os
+import time
+
+from app import create_app, db
+from config import Config
+
+
+def concurrency(worker_class=None):
+    """Requests one worker serves at once."""
+    worker_class = worker_class or Config.GUNICORN_WORKER_CLASS
+    if worker_class == 'gthread':
+        return Config.GUNICORN_THREADS
+    if worker_class == 'gevent':
+        return Config.GUNICORN_WORKER_CONNECTIONS
+    return 1
+
+
+def pool_size():
+    return Config.DB_POOL_SIZE or min(concurrency(), 20)
+
+
+def engine_options(uri):
+    if uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': pool_size(),
+        'max_overflow': 10,  # background threads (practice jobs, purges) on top of requests
+        'pool_pre_ping': True,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+    }
+
+
+class ServerConfig(Config):
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(Config.SQLALCHEMY_DATABASE_URI)
+
+
+def warm_up(app):
+    """Caches worth building once in the master rather than on each worker's first requests."""
+    import leaderboard
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            leaderboard.backend().ensure_fresh()
+        except Exception as e:
+            print(f"Warning: leaderboard warm-up failed: {e}")
+        print(f"Leaderboard warmed in {(time.perf_counter() - started) * 1000:.0f} ms")
+        db.session.remove()
+
+
+def init_worker():
+    """After fork: replace the master's connections with this worker's own pool, opened up front."""
+    with app.app_context():
+        db.engine.dispose(close=False)  # the master's sockets stay with the master
+        n = pool_size() if not Config.SQLALCHEMY_DATABASE_URI.startswith('sqlite') else 1
+        conns = [db.engine.connect() for _ in range(n)]
+        for conn in conns:
+            conn.close()  # back to the pool, connected
+    print(f"Worker {os.getpid()}: {n} DB connections ready")
+
+
+app = create_app(ServerConfig, warm_caches=True)
+warm_up(app)
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { dashboardService, authService, paymentService } from '../services/api';
+import { dashboardService, authService, paymentService, liveService } from '../services/api';
 import { Flame, Trophy, Target, Star, Zap, ArrowRight, TrendingUp } from 'lucide-react';
 import { AreaChart, Area, XAxis, YAxis, Tooltip, ResponsiveContainer } from 'recharts';
 import { motion } from 'framer-motion';
@@ -21,6 +21,24 @@ const StatCard = ({ icon: Icon, color, bgColor, label, value, suffix = '' }) =>
     </motion.div>
 );
 
+// Today's counters from a live `snapshot` or `practice` event (see backend/live_updates.py)
+const applyToday = (stats, today) => {
+    if (!today.questions_attempted) return stats;
+    return {
+        ...stats,
+        heatmap: { ...stats.heatmap, [today.date]: today.streak_maintained ? 1 : 0 },
+        weekly: (stats.weekly || []).map((d) => d.date === today.date
+            ? { ...d, attempted: today.questions_attempted, correct: today.questions_correct }
+            : d),
+    };
+};
+
+const applyStreak = (stats, streak) => ({
+    ...stats,
+    current_streak: streak.current_streak,
+    longest_streak: streak.longest_streak ?? stats.longest_streak,
+});
+
 const Dashboard = () => {
     const [stats, setStats] = useState(null);
     const [user, setUser] = useState(null);
@@ -47,6 +65,12 @@ const Dashboard = () => {
         fetchData();
     }, [navigate]);
 
+    useEffect(() => liveService.subscribe({
+        snapshot: (data) => setStats((s) => s && applyStreak(applyToday(s, data), data)),
+        practice: (data) => setStats((s) => s && applyToday(s, data)),
+        streak: (data) => setStats((s) => s && applyStreak(s, data)),
+    }), []);
+
     if (!stats) return (
         <div className="flex h-[60vh] items-center justify-center">
             <div className="flex flex-col items-center gap-3">
@@ -1,5 +1,5 @@
-import React, { useState, useEffect } from 'react';
-import { habitService } from '../services/api';
+import React, { useState, useEffect, useRef } from 'react';
+import { habitService, liveService } from '../services/api';
 import { Plus, Trash2, CheckCircle2, Circle, Flame, X, Edit2, BarChart3 } from 'lucide-react';
 import { motion, AnimatePresence } from 'framer-motion';
 
@@ -35,6 +35,30 @@ const HabitTracker = () => {
 
     useEffect(() => { fetchData(); }, []);
 
+    // Live `habit` deltas (and the `snapshot` on every (re)connect) carry whether a
+    // habit is done today; only a change from what's shown moves the streak and heatmap
+    const habitsRef = useRef([]);
+    useEffect(() => { habitsRef.current = habits; }, [habits]);
+
+    const setDoneToday = (habitId, date, completed) => {
+        const habit = habitsRef.current.find((h) => h.id === habitId);
+        if (!habit || habit.done_today === completed) return;
+        const updated = { ...habit, done_today: completed, streak: Math.max(0, (habit.streak || 0) + (completed ? 1 : -1)) };
+        habitsRef.current = habitsRef.current.map((h) => h.id === habitId ? updated : h);
+        setHabits(habitsRef.current);
+        setHeatmap((hm) => ({ ...hm, [date]: Math.max(0, (hm[date] || 0) + (completed ? 1 : -1)) }));
+    };
+
+    useEffect(() => liveService.subscribe({
+        habit: (data) => {
+            if (data.date === new Date().toISOString().split('T')[0]) setDoneToday(data.habit_id, data.date, data.completed);
+        },
+        snapshot: (data) => {
+            const date = new Date().toISOString().split('T')[0];
+            habitsRef.current.forEach((h) => setDoneToday(h.id, date, data.habits_completed_today.includes(h.id)));
+        },
+    }), []);
+
     const handleCreate = async () => {
         if (!newName.trim()) return;
         try {
@@ -43,25 +43,6 @@ const LearningProgress = () => {
         fetchSkills();
     }, []);
 
-    const handleTopicToggle = async (skill, topicId) => {
-        const progress = skill.progress || { completion_pct: 0, topics_done: 0 };
-        const totalTopics = skill.topics?.length || 1;
-        const currentDone = progress.topics_done || 0;
-        const isCompleting = true; // toggling on
-        const newDone = Math.min(currentDone + 1, totalTopics);
-        const newPct = Math.round((newDone / totalTopics) * 100);
-
-        try {
-            await skillService.updateProgress(skill.id, {
-                topics_done: newDone,
-                completion_pct: newPct
-            });
-            // Refresh
-            const res = await skillService.getAll();
-            setSkills(res.skills);
-        } catch (err) { console.error(err); }
-    };
-
     if (loading) return (
         <div className="flex h-[60vh] items-center justify-center">
             <div className="w-8 h-8 border-3 border-orange-500 border-t-transparent rounded-full animate-spin"></div>
@@ -72,7 +53,7 @@ const LearningProgress = () => {
         <div className="max-w-6xl mx-auto space-y-6">
             <div>
                 <h2 className="page-title">Learning Progress</h2>
-                <p className="page-subtitle mt-1">Track your skill development journey</p>
+                <p className="page-subtitle mt-1">Track your skill development journey: topics complete as you practice them</p>
             </div>
 
             {skills.length === 0 ? (
@@ -132,9 +113,7 @@ const LearningProgress = () => {
                                                             {isDone ? (
                                                                 <CheckCircle2 size={18} className="text-emerald-500 shrink-0" />
                                                             ) : (
-                                                                <button onClick={(e) => { e.stopPropagation(); handleTopicToggle(skill, topic.id); }}>
-                                                                    <Circle size={18} className="text-slate-300 hover:text-indigo-400 shrink-0 transition-colors" />
-                                                                </button>
+                                                                <Circle size={18} className="text-slate-300 shrink-0" />
                                                             )}
                                                             <div className="min-w-0">
                                                                 <p className={`text-sm font-medium ${isDone ? 'text-slate-400 line-through' : 'text-slate-700'}`}>{topic.name}</p>
@@ -117,10 +117,20 @@ export const skillService = {
     getProgress: async (skillId) => {
         const response = await api.get(`/skills/${skillId}/progress`);
         return response.data;
-    },
-    updateProgress: async (skillId, data) => {
-        const response = await api.put(`/skills/${skillId}/progress`, data);
-        return response.data;
+    }
+};
+
+export const liveService = {
+    // Server-Sent Events from /live: a `snapshot`, then `practice`, `streak` and `habit` deltas.
+    // EventSource can't send headers, so the token goes in the query string.
+    subscribe: (handlers) => {
+        const token = localStorage.getItem('token');
+        if (!token || typeof EventSource === 'undefined') return () => {};
+        const source = new EventSource(`${API_URL}/live?token=${encodeURIComponent(token)}`);
+        Object.entries(handlers).forEach(([event, handler]) => {
+            source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+        });
+        return () => source.close();
     }
 };
 
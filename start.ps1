@@ -6,6 +6,12 @@ Start-Process powershell -ArgumentList "-NoExit -Command `"cd d:\Dev\habit\backe
 # Start Cron Job Worker in a new window
 Start-Process powershell -ArgumentList "-NoExit -Command `"cd d:\Dev\habit\backend; .\venv\Scripts\Activate.ps1; python cron.py`""
 
+# Start Stripe webhook inbox worker in a new window
+Start-Process powershell -ArgumentList "-NoExit -Command `"cd d:\Dev\habit\backend; .\venv\Scripts\Activate.ps1; python stripe_inbox.py`""
+
+# Start learning event consumers (skill progress, question stats) in a new window
+Start-Process powershell -ArgumentList "-NoExit -Command `"cd d:\Dev\habit\backend; .\venv\Scripts\Activate.ps1; python learning_events.py`""
+
 # Start Frontend in current window
 Write-Host "Starting Vite frontend server... (Press Ctrl+C to stop this window)" -ForegroundColor Green
 cd d:\Dev\habit\frontend